@@ -1,57 +1,410 @@
 from PIL import Image
-from typing import Tuple
-import random
+from typing import Optional, Tuple
+import numpy as np
+import os
+import struct
+import sys
+import tempfile
+import time
+
+import CanvasInit
+import weakref
+import zlib
 
 RGB = Tuple[int, int, int]
 Pos = Tuple[int, int]
 
+# Spare back buffers kept for reuse; more retired buffers are left to the GC.
+MAX_SPARE_BUFFERS = 2
+# Side (pixels) of the blocks in which writes are tracked for incremental export.
+DIRTY_BLOCK = 64
+DIRTY_SHIFT = DIRTY_BLOCK.bit_length() - 1
+assert 1 << DIRTY_SHIFT == DIRTY_BLOCK, "DIRTY_BLOCK must be a power of two"
+
+
+def _dirty_grid(width: int, height: int) -> np.ndarray:
+    """All-dirty block grid for a new (or fully replaced) canvas."""
+    return np.ones((-(-height // DIRTY_BLOCK), -(-width // DIRTY_BLOCK)), dtype=bool)
+
+
+def _mark_dirty(dirty: np.ndarray, xs: np.ndarray, ys: np.ndarray):
+    """Flag the blocks of intp pixel coordinates xs, ys in a dirty grid.
+    Shifts and one flat index keep this a small fraction of write_many."""
+    dirty.reshape(-1)[(ys >> DIRTY_SHIFT) * dirty.shape[1] + (xs >> DIRTY_SHIFT)] = True
+
+
+def resolution_stages(width: int, height: int, count: int, min_side: int = 16):
+    """Coarse-to-fine sizes [(w, h), ...], smallest first and ending at
+    (width, height): each stage halves the next one's sides, stopping early
+    rather than going below min_side."""
+    stages = [(width, height)]
+    while len(stages) < count:
+        w, h = stages[0]
+        if min(w, h) // 2 < min_side:
+            break
+        stages.insert(0, (-(-w // 2), -(-h // 2)))
+    return stages
+
+
+class CanvasSnapshot:
+    """An immutable published canvas: read-only pixels at a known age.
+
+    Readers keep the snapshot (or views into it) for as long as they need;
+    the merge thread never writes to a published buffer.
+    """
+
+    __slots__ = ("pixels", "age")
+
+    def __init__(self, pixels: np.ndarray, age: int):
+        self.pixels = pixels
+        self.age = age
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    def read(self, startX, startY, width, height) -> np.ndarray:
+        """(h, w, 3) read-only view of a region, clipped to the canvas."""
+        x0, y0 = max(0, startX), max(0, startY)
+        x1, y1 = min(self.width, startX + width), min(self.height, startY + height)
+        if x1 <= x0 or y1 <= y0:
+            return self.pixels[0:0, 0:0]
+        return self.pixels[y0:y1, x0:x1]
+
+
 class Canvas:
-    def __init__(self, x, y):
+    """Double-buffered RGB canvas with one writer and lock-free readers.
+
+    The merge thread write()s into a private back buffer; increment_age()
+    publishes it as the next CanvasSnapshot with a single attribute store.
+    Readers call snapshot() (or read()) and always see a complete merge at
+    a known age, never a half-applied one, without taking a lock.
+
+    Retired front buffers are recycled as back buffers once no reader holds
+    them (checked by reference count), so steady state allocates nothing.
+    """
+
+    def __init__(self, x, y, init=None, seed=None):
+        """
+        Args:
+            x, y: Canvas width and height
+            init: Initializer name ("noise", "value-noise", "gradient"),
+                "image:PATH" or a factory (see CanvasInit.py); None = noise
+            seed: Seed of the numpy Generator the initializer draws from
+                (None = fresh entropy)
+        """
         # self.pixels[y, x] = pixel at y, x
         # |---------------------> + x
         # |
         # v
         # + y
-        self.pixels = [
-            [
-                (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
-                for _ in range(x)
-            ]
-            for _ in range(y)
-        ]
-        self.age = 0
+        rows = CanvasInit.resolve(init)(x, y, np.random.default_rng(seed))
+        pixels = np.array(rows(0, y), dtype=np.uint8)
+        pixels.setflags(write=False)
+        self._snapshot = CanvasSnapshot(pixels, 0)
+        self._back = None
+        self._spare = []
+        self._dirty = _dirty_grid(x, y)
+
+    # ------------------------------------------------------------ readers
+
+    def snapshot(self) -> CanvasSnapshot:
+        """The current published snapshot (safe from any thread)."""
+        return self._snapshot
+
+    @property
+    def pixels(self) -> np.ndarray:
+        """Published (height, width, 3) pixels, read-only."""
+        return self._snapshot.pixels
+
+    @property
+    def width(self) -> int:
+        return self._snapshot.width
+
+    @property
+    def height(self) -> int:
+        return self._snapshot.height
+
+    @property
+    def age(self) -> int:
+        return self._snapshot.age
+
+    @age.setter
+    def age(self, value: int):
+        self._snapshot = CanvasSnapshot(self._snapshot.pixels, int(value))
 
     def read(self, startX, startY, width, height):
-        result = []
+        return self._snapshot.read(startX, startY, width, height)
+
+    def read_versioned(self, startX, startY, width, height):
+        """(region, age): a region and the age it was published at."""
+        snapshot = self._snapshot
+        return snapshot.read(startX, startY, width, height), snapshot.age
+
+    def getAge(self):
+        return self._snapshot.age
+
+    # ------------------------------------------------------------ writer (merge thread)
+
+    def _acquire_back(self) -> np.ndarray:
+        front = self._snapshot.pixels
+        spare = self._spare
+        back = None
+        for i in range(len(spare)):
+            # Referenced only by the spare list and getrefcount's argument:
+            # no reader (snapshot or view) still points at it.
+            if sys.getrefcount(spare[i]) == 2 and spare[i].shape == front.shape:
+                back = spare.pop(i)
+                break
+        if back is None:
+            back = np.empty_like(front)
+        back.setflags(write=True)
+        np.copyto(back, front)
+        self._back = back
+        return back
+
+    def write(self, x, y, col: RGB):
+        back = self._back
+        if back is None:
+            back = self._acquire_back()
+        back[y, x] = col
+        self._dirty[y // DIRTY_BLOCK, x // DIRTY_BLOCK] = True
+
+    def write_many(self, xs, ys, cols):
+        """Write len(xs) pixels at once; cols is an (n, 3) array or list."""
+        back = self._back
+        if back is None:
+            back = self._acquire_back()
+        xs, ys = np.asarray(xs, dtype=np.intp), np.asarray(ys, dtype=np.intp)
+        back[ys, xs] = np.asarray(cols, dtype=np.uint8)
+        _mark_dirty(self._dirty, xs, ys)
+
+    def consume_dirty(self) -> np.ndarray:
+        """Boolean grid of DIRTY_BLOCK-sized blocks written since the last
+        call (all True the first time). Call on the merge thread."""
+        dirty = self._dirty
+        self._dirty = np.zeros_like(dirty)
+        return dirty
 
-        for y in range(startY, startY + height):
-            if y < 0 or y >= len(self.pixels):
+    def publish(self, age: int):
+        """Make pending writes visible as the snapshot for `age`."""
+        back = self._back
+        if back is None:
+            self._snapshot = CanvasSnapshot(self._snapshot.pixels, age)
+            return
+        retired = self._snapshot.pixels
+        back.setflags(write=False)
+        self._back = None
+        self._snapshot = CanvasSnapshot(back, age)
+        self._spare.append(retired)
+        if len(self._spare) > MAX_SPARE_BUFFERS:
+            self._spare.pop(0)
+
+    def increment_age(self):
+        self.publish(self._snapshot.age + 1)
+
+    # ------------------------------------------------------------ conversion
+
+    def export(self, path="output.png"):
+        snapshot = self._snapshot
+        print(f"canvas age: {snapshot.age}")
+        Image.fromarray(snapshot.pixels, mode="RGB").save(path)
+        print(f"image created: {path}")
+
+    def to_array(self) -> np.ndarray:
+        """Copy of the pixels as a (height, width, 3) uint8 array."""
+        return self._snapshot.pixels.copy()
+
+    def resize(self, width: int, height: int):
+        """Resample the published pixels to width x height (bicubic) and
+        publish them as the next age, so every version read before the
+        resize is older than the resized canvas. Merge thread, between
+        merges: unpublished writes are discarded."""
+        image = Image.fromarray(self._snapshot.pixels, mode="RGB")
+        self.load_array(
+            np.asarray(image.resize((width, height), resample=Image.BICUBIC)), self._snapshot.age + 1
+        )
+
+    def load_array(self, arr: np.ndarray, age: int = 0):
+        """Replace the pixels (and age) from a (height, width, 3) array."""
+        pixels = np.array(arr, dtype=np.uint8).reshape(len(arr), -1, 3)
+        pixels.setflags(write=False)
+        self._back = None
+        self._spare = []
+        self._dirty = _dirty_grid(pixels.shape[1], pixels.shape[0])
+        self._snapshot = CanvasSnapshot(pixels, int(age))
+
+
+# ---------------------------------------------------------------- memory-mapped backend
+
+# Rows encoded / initialized per band by MappedCanvas (bounds peak memory).
+BAND_ROWS = 256
+
+
+def _png_chunk(f, kind: bytes, data: bytes):
+    f.write(struct.pack(">I", len(data)))
+    f.write(kind)
+    f.write(data)
+    f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+
+def write_png_bands(path, pixels: np.ndarray, band_rows: int = BAND_ROWS, compress_level: int = 6):
+    """Encode a (H, W, 3) uint8 array (or memmap) as an RGB PNG, one band of
+    rows at a time, so memory stays O(band_rows * W) for any image size."""
+    height, width = pixels.shape[:2]
+    compressor = zlib.compressobj(compress_level)
+    filter_bytes = np.zeros((band_rows, 1), dtype=np.uint8)  # filter type 0 (None)
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        _png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        for y0 in range(0, height, band_rows):
+            band = np.asarray(pixels[y0:y0 + band_rows]).reshape(-1, width * 3)
+            rows = np.concatenate([filter_bytes[: len(band)], band], axis=1)
+            data = compressor.compress(rows.tobytes())
+            if data:
+                _png_chunk(f, b"IDAT", data)
+        _png_chunk(f, b"IDAT", compressor.flush())
+        _png_chunk(f, b"IEND", b"")
+
+
+class MappedSnapshot(CanvasSnapshot):
+    """Snapshot of a MappedCanvas: `pixels` is the live read-only mapping,
+    read() returns a copy validated against concurrent merges."""
+
+    __slots__ = ("canvas",)
+
+    def __init__(self, canvas: "MappedCanvas", age: int):
+        super().__init__(canvas._view, age)
+        self.canvas = canvas
+
+    def read(self, startX, startY, width, height) -> np.ndarray:
+        return self.canvas.read_versioned(startX, startY, width, height)[0]
+
+
+class MappedCanvas(Canvas):
+    """Canvas stored in a memory-mapped (H, W, 3) uint8 file.
+
+    Only the pages a read or merge touches are paged in, so the canvas can
+    be far larger than RAM. There is no second buffer: merges are queued by
+    write()/write_many() and applied in place by publish(). Readers stay
+    lock-free with a sequence counter (odd while a merge is being applied):
+    read_versioned() copies the region and retries if a merge overlapped the
+    copy, so a read is still a complete merge at a known age.
+
+    export() streams row bands of the mapping into the PNG encoder.
+    """
+
+    def __init__(self, x, y, path: Optional[str] = None, fill: bool = True, init=None, seed=None):
+        """
+        Args:
+            x, y: Canvas width and height
+            path: Backing file; None creates a temporary file (removed on
+                close() or when the canvas is garbage collected). An existing
+                non-empty file must hold exactly x * y * 3 bytes
+            fill: Run the initializer (False keeps the file's contents,
+                e.g. to reopen an existing canvas)
+            init, seed: As for Canvas; applied band by band
+        """
+        self._owns_file = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="plaice-canvas-", suffix=".u8")
+            os.close(fd)
+        self.path = path
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size and size != x * y * 3:
+            # Never truncate someone's canvas (e.g. a resume with the wrong size).
+            raise ValueError(
+                f"{path} holds {size} bytes, not a {x}x{y} canvas ({x * y * 3} bytes)"
+            )
+        self._map = np.memmap(path, dtype=np.uint8, mode="r+" if size else "w+", shape=(y, x, 3))
+        self._view = self._map.view(np.ndarray)
+        self._view.setflags(write=False)
+        if fill:
+            rows = CanvasInit.resolve(init)(x, y, np.random.default_rng(seed))
+            for y0 in range(0, y, BAND_ROWS):
+                y1 = min(y, y0 + BAND_ROWS)
+                self._map[y0:y1] = rows(y0, y1)
+        self._pending = []
+        self._seq = 0
+        self._dirty = _dirty_grid(x, y)
+        self._snapshot = MappedSnapshot(self, 0)
+        self._cleanup = weakref.finalize(self, os.remove, path) if self._owns_file else None
+
+    def read_versioned(self, startX, startY, width, height):
+        x0, y0 = max(0, startX), max(0, startY)
+        x1, y1 = min(self.width, startX + width), min(self.height, startY + height)
+        while True:
+            seq = self._seq
+            if seq & 1:
+                time.sleep(0)
                 continue
+            snapshot = self._snapshot
+            if x1 <= x0 or y1 <= y0:
+                region = np.empty((0, 0, 3), dtype=np.uint8)
+            else:
+                region = np.array(self._view[y0:y1, x0:x1])
+            if self._seq == seq:
+                return region, snapshot.age
 
-            row = []
-            for x in range(startX, startX + width):
-                if x < 0 or x >= len(self.pixels[0]):
-                    continue
-                row.append(self.pixels[y][x])
+    def read(self, startX, startY, width, height):
+        return self.read_versioned(startX, startY, width, height)[0]
 
-            if row:
-                result.append(row)
-        return result
+    @Canvas.age.setter
+    def age(self, value: int):
+        self._snapshot = MappedSnapshot(self, int(value))
 
     def write(self, x, y, col: RGB):
-        self.pixels[y][x] = col
+        self._pending.append(([x], [y], [col]))
+        self._dirty[y // DIRTY_BLOCK, x // DIRTY_BLOCK] = True
+
+    def write_many(self, xs, ys, cols):
+        xs, ys = np.asarray(xs, dtype=np.intp), np.asarray(ys, dtype=np.intp)
+        self._pending.append((xs, ys, cols))
+        _mark_dirty(self._dirty, xs, ys)
+
+    def publish(self, age: int):
+        pending, self._pending = self._pending, []
+        self._seq += 1
+        try:
+            for xs, ys, cols in pending:
+                self._map[ys, xs] = np.asarray(cols, dtype=np.uint8)
+            self._snapshot = MappedSnapshot(self, age)
+        finally:
+            self._seq += 1
+
+    def flush(self):
+        """Write dirty pages back to the file."""
+        self._map.flush()
+
+    def close(self):
+        self.flush()
+        if self._cleanup is not None:
+            self._cleanup()
 
     def export(self, path="output.png"):
-        height = len(self.pixels)
-        width = len(self.pixels[0])
         print(f"canvas age: {self.age}")
-        img = Image.new("RGB", (width, height))
-        img.putdata([pixel for row in self.pixels for pixel in row])
-        img.save(path)
+        write_png_bands(path, self._view)
         print(f"image created: {path}")
 
-    def getAge(self):
-        return self.age
+    def to_array(self) -> np.ndarray:
+        return self.read_versioned(0, 0, self.width, self.height)[0]
 
-    def increment_age(self):
-        self.age += 1
+    def resize(self, width: int, height: int):
+        raise ValueError("a memory-mapped canvas has a fixed size")
+
+    def load_array(self, arr: np.ndarray, age: int = 0):
+        arr = np.asarray(arr, dtype=np.uint8)
+        if arr.shape != self._map.shape:
+            raise ValueError(f"array shape {arr.shape} does not match mapped canvas {self._map.shape}")
+        self._pending = []
+        self._dirty[:] = True
+        self._seq += 1
+        try:
+            self._map[:] = arr
+            self._snapshot = MappedSnapshot(self, int(age))
+        finally:
+            self._seq += 1
@@ -0,0 +1,235 @@
+"""
+Periodic, atomic checkpoints of a PLAiCE run.
+
+A checkpoint is a single .npz file holding:
+- canvas:            (H, W, 3) uint8 pixels (in-memory Canvas only)
+- last_guess_<i>:    each agent's last generated image as a raw array
+- numpy_rng_keys:    MT19937 key of NumPy's global RNG
+- torch_rng:         torch CPU RNG state (only if torch is loaded)
+- meta:              JSON string with age, AgentState fields and the
+                     remaining RNG state (python `random`, NumPy pos/gauss)
+
+A MappedCanvas is not copied: it can be larger than RAM. It is flushed
+instead, and meta records its backing file and size (canvas_file,
+canvas_size). Resuming reopens that file, which by then may hold merges
+newer than the checkpoint's age; keep the file with the checkpoints (a
+temporary canvas file is removed when the run exits).
+
+State is captured on the merge thread between ages (the only writer of the
+canvas, so the copy is consistent) and written by a background thread to a
+temp file that is then os.replace()d into place: workers never pause and a
+crash mid-write never leaves a truncated checkpoint behind.
+"""
+
+import dataclasses
+import glob
+import json
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from Canvas import MappedCanvas
+
+FILE_PATTERN = re.compile(r"ckpt_(\d+)\.npz$")
+
+
+def capture_state(sync) -> dict:
+    """Snapshot everything needed to resume `sync`. Call on the merge thread."""
+    canvas = sync.canvas
+    arrays = {}
+    if isinstance(canvas, MappedCanvas):
+        # Between merges the file holds exactly the published age.
+        canvas.flush()
+    else:
+        arrays["canvas"] = canvas.to_array()
+    agents = []
+    for agent in sync.agents:
+        state = agent.state
+        fields = {
+            f.name: getattr(state, f.name)
+            for f in dataclasses.fields(state)
+            if f.name != "last_guess"
+        }
+        fields["slice_bounds"] = list(fields["slice_bounds"])
+        last_guess = state.last_guess
+        if last_guess is not None:
+            arrays[f"last_guess_{state.agent_id}"] = np.array(last_guess, dtype=np.uint8)
+        agents.append(fields)
+
+    py_version, py_internal, py_gauss = random.getstate()
+    np_name, np_keys, np_pos, np_has_gauss, np_gauss = np.random.get_state()
+    arrays["numpy_rng_keys"] = np_keys
+    if "torch" in sys.modules:
+        try:
+            arrays["torch_rng"] = sys.modules["torch"].get_rng_state().numpy()
+        except Exception:
+            pass
+
+    meta = {
+        "version": 1,
+        "created": time.time(),
+        "age": canvas.age,
+        "canvas_size": [canvas.width, canvas.height],
+        "num_agents": len(sync.agents),
+        "agents": agents,
+        "python_rng": [py_version, list(py_internal), py_gauss],
+        "numpy_rng": [np_name, int(np_pos), int(np_has_gauss), float(np_gauss)],
+    }
+    if isinstance(canvas, MappedCanvas):
+        meta["canvas_file"] = os.path.abspath(canvas.path)
+    return {"meta": meta, "arrays": arrays}
+
+
+def checkpoint_path(directory: str, age: int) -> str:
+    return os.path.join(directory, f"ckpt_{age:06d}.npz")
+
+
+def write_checkpoint(directory: str, state: dict, keep: int = 3) -> str:
+    """Atomically write `state` and prune all but the newest `keep` files."""
+    os.makedirs(directory, exist_ok=True)
+    path = checkpoint_path(directory, state["meta"]["age"])
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, meta=np.array(json.dumps(state["meta"])), **state["arrays"])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    if keep > 0:
+        for old in list_checkpoints(directory)[:-keep]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return path
+
+
+def list_checkpoints(directory: str):
+    """Checkpoint files in `directory`, oldest first."""
+    found = []
+    for path in glob.glob(os.path.join(directory, "ckpt_*.npz")):
+        match = FILE_PATTERN.search(path)
+        if match:
+            found.append((int(match.group(1)), path))
+    return [path for _, path in sorted(found)]
+
+
+def latest_checkpoint(directory: str) -> Optional[str]:
+    paths = list_checkpoints(directory)
+    return paths[-1] if paths else None
+
+
+def canvas_size(state: dict):
+    """(width, height) of the canvas in a loaded checkpoint."""
+    if "canvas" in state["arrays"]:
+        height, width = state["arrays"]["canvas"].shape[:2]
+        return width, height
+    width, height = state["meta"]["canvas_size"]
+    return width, height
+
+
+def load_checkpoint(path: str) -> dict:
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data["meta"]))
+        arrays = {key: data[key] for key in data.files if key != "meta"}
+    return {"meta": meta, "arrays": arrays}
+
+
+def restore_state(sync, state: dict):
+    """Apply a loaded checkpoint to `sync` (after initialize_agents)."""
+    meta, arrays = state["meta"], state["arrays"]
+    if "canvas" in arrays:
+        sync.canvas.load_array(arrays["canvas"], age=meta["age"])
+    else:
+        path = meta["canvas_file"]
+        canvas = sync.canvas
+        if not (
+            isinstance(canvas, MappedCanvas)
+            and os.path.exists(path)
+            and os.path.samefile(canvas.path, path)
+        ):
+            raise ValueError(f"checkpoint canvas is the mapped file {path}; open that file to resume")
+        if [canvas.width, canvas.height] != list(meta["canvas_size"]):
+            raise ValueError(f"{path} is not {meta['canvas_size'][0]}x{meta['canvas_size'][1]}")
+        canvas.age = meta["age"]
+
+    by_id = {agent.state.agent_id: agent for agent in sync.agents}
+    for fields in meta["agents"]:
+        agent = by_id.get(fields["agent_id"])
+        if agent is None:
+            continue
+        for name, value in fields.items():
+            if name == "slice_bounds":
+                value = tuple(value)
+            setattr(agent.state, name, value)
+        guess = arrays.get(f"last_guess_{fields['agent_id']}")
+        agent.state.last_guess = Image.fromarray(guess, mode="RGB") if guess is not None else None
+
+    py_version, py_internal, py_gauss = meta["python_rng"]
+    random.setstate((py_version, tuple(py_internal), py_gauss))
+    np_name, np_pos, np_has_gauss, np_gauss = meta["numpy_rng"]
+    np.random.set_state((np_name, arrays["numpy_rng_keys"], np_pos, np_has_gauss, np_gauss))
+    if "torch_rng" in arrays:
+        try:
+            import torch
+
+            torch.set_rng_state(torch.from_numpy(arrays["torch_rng"].copy()))
+        except Exception as exc:
+            print(f"[checkpoint] torch rng not restored: {exc}")
+
+
+class CheckpointWriter:
+    """Writes checkpoints on a background thread.
+
+    Holds at most one pending checkpoint: if the disk is slower than the
+    checkpoint interval, the older pending state is replaced by the newer one
+    instead of queueing up.
+    """
+
+    def __init__(self, directory: str, keep: int = 3):
+        self.directory = directory
+        self.keep = keep
+        self.last_path: Optional[str] = None
+        self._pending: "queue.Queue[dict]" = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._loop, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, state: dict):
+        try:
+            self._pending.get_nowait()
+            self._pending.task_done()
+        except queue.Empty:
+            pass
+        self._pending.put_nowait(state)
+
+    def _loop(self):
+        while True:
+            state = self._pending.get()
+            if state is None:
+                return
+            try:
+                self.last_path = write_checkpoint(self.directory, state, keep=self.keep)
+                print(f"[checkpoint] wrote {self.last_path}")
+            except Exception as exc:
+                print(f"[checkpoint] write failed: {exc}")
+            finally:
+                self._pending.task_done()
+
+    def flush(self, timeout: float = 10.0):
+        """Block until the pending checkpoint (if any) is on disk."""
+        deadline = time.time() + timeout
+        while self._pending.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def close(self, timeout: float = 10.0):
+        self.flush(timeout)
+        self.submit(None)
+        self._thread.join(timeout=1.0)
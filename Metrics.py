@@ -0,0 +1,187 @@
+"""
+Run-level counters and gauges for a PLAiCE process, plus a tiny HTTP
+endpoint (TCP or Unix socket) to scrape them.
+
+Counters are incremented from worker and merge threads under one lock;
+gauges are either set explicitly or computed on read from a callable, so
+values like queue depth are always current at scrape time.
+
+Endpoints:
+    /metrics       Prometheus text exposition format
+    /metrics.json  the same data as JSON (what Synchronizer.metrics_snapshot returns)
+    /healthz       "ok"
+"""
+
+import json
+import os
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in key) + "}"
+
+
+class Metrics:
+    """Thread-safe registry of labelled counters and gauges."""
+
+    def __init__(self, prefix: str = "plaice"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauge_fns: Dict[str, Callable[[], Dict[LabelKey, float]]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = float(value)
+
+    def register_gauge(self, name: str, fn: Callable[[], object], label: Optional[str] = None):
+        """Compute gauge `name` on every read.
+
+        fn returns a number, or with `label` set, a {label_value: number} dict.
+        """
+        if label is None:
+            self._gauge_fns[name] = lambda: {(): float(fn())}
+        else:
+            self._gauge_fns[name] = lambda: {
+                ((label, str(k)),): float(v) for k, v in fn().items()
+            }
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def _collect(self):
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+        for name, fn in list(self._gauge_fns.items()):
+            try:
+                gauges[name] = fn()
+            except Exception as exc:
+                print(f"[metrics] gauge {name} failed: {exc}")
+        return counters, gauges
+
+    def snapshot(self) -> dict:
+        """{"counters": {name: value | {labels: value}}, "gauges": {...}}"""
+
+        def _plain(series):
+            if set(series) == {()}:
+                return series[()]
+            return {",".join(f"{k}={v}" for k, v in key): value for key, value in series.items()}
+
+        counters, gauges = self._collect()
+        return {
+            "counters": {name: _plain(series) for name, series in counters.items()},
+            "gauges": {name: _plain(series) for name, series in gauges.items()},
+        }
+
+    def format_prometheus(self) -> str:
+        counters, gauges = self._collect()
+        lines = []
+        for kind, families in (("counter", counters), ("gauge", gauges)):
+            for name, series in sorted(families.items()):
+                full = f"{self.prefix}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} {kind}")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full}{_format_labels(key)} {value!r}")
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    # Set on the server: callables returning (text, json) payloads.
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body = self.server.text_fn().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body = json.dumps(self.server.json_fn(), indent=2).encode("utf-8")
+            content_type = "application/json"
+        elif path == "/healthz":
+            body = b"ok\n"
+            content_type = "text/plain"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) tuple.
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class MetricsServer:
+    """Serves metrics over HTTP on localhost TCP or a Unix domain socket."""
+
+    def __init__(
+        self,
+        text_fn: Callable[[], str],
+        json_fn: Callable[[], dict],
+        host: str = "127.0.0.1",
+        port: Optional[int] = None,
+        unix_socket: Optional[str] = None,
+    ):
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+            self.server = _UnixHTTPServer(unix_socket, _MetricsHandler)
+            self.address = unix_socket
+        else:
+            self.server = ThreadingHTTPServer((host, port or 0), _MetricsHandler)
+            self.server.daemon_threads = True
+            self.address = "http://%s:%d" % self.server.server_address[:2]
+        self.unix_socket = unix_socket
+        self.server.text_fn = text_fn
+        self.server.json_fn = json_fn
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="metrics-server", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+        print(f"[metrics] serving on {self.address}")
+        return self
+
+    def stop(self):
+        try:
+            self.server.shutdown()
+            self.server.server_close()
+        finally:
+            if self.unix_socket and os.path.exists(self.unix_socket):
+                os.unlink(self.unix_socket)
@@ -3,9 +3,16 @@ import argparse
 import threading
 import signal
 import os
+import random
 
-from Canvas import Canvas
+import numpy as np
+
+from Canvas import Canvas, MappedCanvas, resolution_stages
 from Synchronizer import Synchronizer
+from Profiler import SamplingProfiler
+from ThreadBudget import ThreadBudget
+from agents import tracing
+from agents.heuristic import HeuristicAgent
 
 
 def _start_parent_watcher(sync: Synchronizer, interval: float = 1.0):
@@ -65,45 +72,343 @@ def _register_signal_handlers(sync: Synchronizer):
             pass
 
 
+def _thread_budget(args, num_agents: int):
+    """ThreadBudget for the requested layout, or None with --no-thread-budget."""
+    if args.no_thread_budget:
+        return None
+    workers = 3 if args.staged else num_agents
+    return ThreadBudget.plan(
+        workers,
+        num_cores=args.cores,
+        core_offset=args.core_offset,
+        intra_op=args.intra_op_threads,
+        pin=args.pin,
+    )
+
+
+def _configure_sync(sync: Synchronizer, args):
+    """Apply command-line model and execution options to `sync`."""
+    sync.verbose = args.verbose
+    sync.staged = args.staged
+    sync.stage_queue_size = args.stage_queue_size
+    sync.adaptive_regions = args.adaptive_regions
+    sync.region_interval = args.region_interval
+    sync.max_age = args.max_age or None
+    sync.max_seconds = args.max_seconds or None
+    sync.stop_min_change = args.stop_change
+    sync.stop_min_touched = args.stop_touched
+    sync.convergence_window = args.convergence_window
+    sync.sleep_converged = not args.no_sleep
+    sync.probe_interval = args.probe_interval
+    sync.worker_sleep = args.worker_sleep
+    sync.budget_rate = args.budget
+    sync.budget_unit = args.budget_unit
+    sync.budget_burst = args.budget_burst
+    sync.thread_budget = _thread_budget(args, sync.numAgents)
+    if sync.thread_budget is not None:
+        sync.thread_budget.apply()
+    sync.pipeline_options["profile"] = args.diffusion_profile
+    if not args.no_embedding_cache:
+        sync.pipeline_options["prompt_embedding_cache"] = args.embedding_cache
+    if args.img2img:
+        sync.pipeline_options.update(
+            diffusion_mode="img2img",
+            img2img_strength=args.img2img_strength,
+            img2img_steps=args.img2img_steps,
+        )
+    if args.warm_start:
+        sync.pipeline_options.update(
+            warm_start=True,
+            warm_start_strength=args.warm_start_strength,
+        )
+
+
+def _autotune_agent_count(args, width: int, height: int) -> int:
+    """Measure agent steps/sec for each candidate count on a scratch canvas
+    and return the best one."""
+    from ThreadBudget import autotune_agents, measure_step_rate
+
+    def make_sync(n):
+        sync = Synchronizer(Canvas(width, height, seed=args.seed), n)
+        _configure_sync(sync, args)
+        if args.backend == "heuristic":
+            sync.initialize_agents(HeuristicAgent)
+        else:
+            sync.initialize_agents()
+            sync.preload_models(block=True)
+        return sync
+
+    candidates = [int(c) for c in args.autotune_candidates.split(",") if c.strip()]
+    best, rates = autotune_agents(
+        lambda n: measure_step_rate(make_sync, n, args.autotune_seconds), candidates
+    )
+    print(f"[autotune] using {best} agents ({rates[best]:.2f} steps/s)")
+    return best
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--verbose", action="store_true", help="Enable verbose agent pipeline logs")
-    parser.add_argument("--preload", action="store_true", help="Preload models before starting workers")
+    parser.add_argument("--preload", action="store_true", help="Block until models are loaded before starting the run")
+    parser.add_argument("--timings-interval", type=float, default=0.0,
+                        help="Print a per-stage latency summary every N seconds (0 = only at shutdown)")
+    parser.add_argument("--timings-file", default=None,
+                        help="Write per-agent stage histograms to this Prometheus text file")
+    parser.add_argument("--profile", action="store_true",
+                        help="Sample all threads during the run and write a flamegraph profile at shutdown")
+    parser.add_argument("--profile-out", default="profile", help="Directory for profile output")
+    parser.add_argument("--profile-interval", type=float, default=0.01, help="Seconds between profiler samples")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve run metrics over HTTP on 127.0.0.1:PORT (/metrics, /metrics.json)")
+    parser.add_argument("--metrics-socket", default=None,
+                        help="Serve run metrics over HTTP on this Unix domain socket instead")
+    parser.add_argument("--checkpoint-dir", default="checkpoints", help="Directory for run checkpoints")
+    parser.add_argument("--checkpoint-interval", type=float, default=60.0,
+                        help="Seconds between checkpoints (0 disables checkpointing)")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None,
+                        help="Resume from a checkpoint file, or the latest one in --checkpoint-dir")
+    parser.add_argument("--embedding-cache", default="cache/prompt_embeds",
+                        help="Directory of cached text-encoder embeddings for classifier labels")
+    parser.add_argument("--no-embedding-cache", action="store_true",
+                        help="Run the text encoder on every diffusion call")
+    parser.add_argument("--diffusion-profile", choices=("draft", "balanced", "quality"), default="quality",
+                        help="Diffusion steps/guidance/resolution preset (draft for CPU nodes)")
+    parser.add_argument("--img2img", action="store_true",
+                        help="Condition diffusion on each agent's field of view (aMUSEd img2img)")
+    parser.add_argument("--img2img-strength", type=float, default=0.6)
+    parser.add_argument("--img2img-steps", type=int, default=8)
+    parser.add_argument("--warm-start", action="store_true",
+                        help="Reuse each agent's previous token grid when its label repeats")
+    parser.add_argument("--warm-start-strength", type=float, default=0.35,
+                        help="Fraction of the diffusion schedule re-run on a warm start")
+    parser.add_argument("--backend", choices=("diffusion", "heuristic"), default="diffusion",
+                        help="Agent backend: ViT + aMUSEd diffusion, or the model-free local colour model "
+                             "(CPU only, for previews and stress tests)")
+    parser.add_argument("--worker-sleep", type=float, default=0.01,
+                        help="Seconds each agent worker pauses between steps")
+    parser.add_argument("--staged", action="store_true",
+                        help="Run classify/diffuse/evaluate on pipelined stage workers instead of one thread per agent")
+    parser.add_argument("--stage-queue-size", type=int, default=2,
+                        help="Capacity of each queue between stage workers (with --staged)")
+    parser.add_argument("--adaptive-regions", action="store_true",
+                        help="Periodically move agent windows to where merges change the canvas most")
+    parser.add_argument("--region-interval", type=int, default=16,
+                        help="Ages between region rebalances with --adaptive-regions")
+    parser.add_argument("--max-age", type=int, default=512,
+                        help="Stop at this canvas age even if not converged (0: no limit)")
+    parser.add_argument("--max-seconds", type=float, default=300.0,
+                        help="Stop after this many seconds even if not converged (0: no limit)")
+    parser.add_argument("--stop-change", type=float, default=0.5,
+                        help="Converged when the mean change per merged pixel and channel over the last "
+                             "--convergence-window ages drops below this (0: ignore)")
+    parser.add_argument("--stop-touched", type=float, default=0.01,
+                        help="... and less than this fraction of the canvas changed in that window (0: ignore)")
+    parser.add_argument("--convergence-window", type=int, default=32, help="Ages the convergence stats cover")
+    parser.add_argument("--no-sleep", action="store_true",
+                        help="Keep stepping agents whose region has converged")
+    parser.add_argument("--probe-interval", type=float, default=5.0,
+                        help="Seconds between the steps a sleeping agent takes to check its region")
+    parser.add_argument("--budget", type=float, default=0.0,
+                        help="Global agent step budget per second (0: every agent steps freely); "
+                             "the agent with the most expected gain runs next")
+    parser.add_argument("--budget-unit", choices=("calls", "seconds"), default="calls",
+                        help="Budget in agent steps per second, or in model seconds per second")
+    parser.add_argument("--budget-burst", type=float, default=None,
+                        help="Budget bucket capacity (default: one second's worth)")
+    parser.add_argument("--agents", default="4",
+                        help="Number of agents, or 'auto' to pick the count with the best measured throughput")
+    parser.add_argument("--autotune-candidates", default="1,2,4,8",
+                        help="Agent counts tried with --agents auto")
+    parser.add_argument("--autotune-seconds", type=float, default=10.0,
+                        help="Measurement time per candidate with --agents auto")
+    parser.add_argument("--cores", type=int, default=None,
+                        help="Cores this process may use (default: all available)")
+    parser.add_argument("--core-offset", type=int, default=0,
+                        help="First core of this process' range within the available cores")
+    parser.add_argument("--intra-op-threads", type=int, default=None,
+                        help="torch/BLAS threads per worker (default: cores // workers)")
+    parser.add_argument("--pin", choices=("threads", "process"), default=None,
+                        help="Pin each worker thread to its own cores, or the process to its core range")
+    parser.add_argument("--no-thread-budget", action="store_true",
+                        help="Leave torch/BLAS thread pools at their library defaults")
+    parser.add_argument("--record", default=None, metavar="ARCHIVE",
+                        help="Record every classifier/diffuser call of this run into a replay archive (.zip)")
+    parser.add_argument("--replay", default=None, metavar="ARCHIVE",
+                        help="Serve model calls from a recorded archive instead of loading models")
+    parser.add_argument("--replay-latency", type=float, default=0.0,
+                        help="With --replay, sleep this multiple of each recorded diffusion time")
+    parser.add_argument("--canvas-size", default="256x256", metavar="WxH", help="Canvas width x height in pixels")
+    parser.add_argument("--resolution-stages", type=int, default=1,
+                        help="Coarse-to-fine: start at 1/2^(N-1) of --canvas-size and double the resolution "
+                             "each time a stage converges")
+    parser.add_argument("--stage-max-age", type=int, default=64,
+                        help="With --resolution-stages, upsample after this many ages even if not converged (0: never)")
+    parser.add_argument("--canvas-file", default=None, metavar="PATH",
+                        help="Keep the canvas in this memory-mapped file (for canvases larger than RAM)")
+    parser.add_argument("--init", choices=("noise", "value-noise", "gradient", "image"), default="noise",
+                        help="Initial canvas content (image: use --init-image)")
+    parser.add_argument("--init-image", default=None, metavar="PATH", help="Image file to start the canvas from")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed for the canvas initializer and the random/NumPy RNGs (reproducible runs)")
+    parser.add_argument("--export", choices=("png", "tiles"), default="png",
+                        help="Per-age export: full PNG frames, or an incremental Deep Zoom tile pyramid")
+    parser.add_argument("--tile-size", type=int, default=256, help="Tile side in pixels with --export tiles")
+    parser.add_argument("--trace", nargs="?", const="trace.json", default=None, metavar="PATH",
+                        help="Record a timeline of stages, merges, exports and lock waits as Chrome trace JSON")
+    parser.add_argument("--trace-buffer", type=int, default=tracing.DEFAULT_CAPACITY,
+                        help="Most recent trace events kept in memory (older ones are dropped)")
     args = parser.parse_args()
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+    if args.backend == "heuristic" and (args.staged or args.record or args.replay):
+        parser.error("--backend heuristic has no model stages to pipeline, record or replay")
+    if args.budget and args.staged:
+        parser.error("--budget needs the per-agent workers and cannot be combined with --staged")
+    if args.init_image:
+        args.init = "image"
+    if args.init == "image" and not args.init_image:
+        parser.error("--init image requires --init-image PATH")
+    canvas_init = f"image:{args.init_image}" if args.init == "image" else args.init
+    if args.seed is not None:
+        random.seed(args.seed)
+        np.random.seed(args.seed)
 
-    width = 256
-    height = 256
+    try:
+        width, height = (int(v) for v in args.canvas_size.lower().split("x"))
+    except ValueError:
+        parser.error(f"--canvas-size must look like 256x256, got {args.canvas_size!r}")
+    if args.resolution_stages > 1 and args.canvas_file:
+        parser.error("--resolution-stages needs an in-memory canvas (drop --canvas-file)")
+    stages = resolution_stages(width, height, args.resolution_stages)
+    width, height = stages[0]
     num_agents = 4
 
-    canvas = Canvas(width, height)
+    resume_path = None
+    resume_state = None
+    resume_mapped = False
+    if args.resume is not None:
+        import Checkpoint
+
+        resume_path = args.resume
+        if resume_path == "latest":
+            resume_path = Checkpoint.latest_checkpoint(args.checkpoint_dir)
+        if resume_path is None:
+            print(f"[checkpoint] no checkpoint found in {args.checkpoint_dir}, starting fresh")
+        else:
+            # The checkpoint decides canvas size and agent count.
+            resume_state = Checkpoint.load_checkpoint(resume_path)
+            width, height = Checkpoint.canvas_size(resume_state)
+            num_agents = resume_state["meta"]["num_agents"]
+            if "canvas_file" in resume_state["meta"]:
+                # A mapped canvas resumes from its own file, as it is.
+                args.canvas_file = resume_state["meta"]["canvas_file"]
+                if not os.path.exists(args.canvas_file):
+                    parser.error(f"{resume_path} needs its canvas file {args.canvas_file}, which is missing")
+                resume_mapped = True
+
+    if resume_state is None and args.agents == "auto":
+        num_agents = _autotune_agent_count(args, width, height)
+    elif resume_state is None:
+        num_agents = int(args.agents)
+
+    if args.canvas_file:
+        try:
+            canvas = MappedCanvas(
+                width, height, path=args.canvas_file, fill=not resume_mapped, init=canvas_init, seed=args.seed
+            )
+        except ValueError as exc:
+            parser.error(str(exc))
+    else:
+        canvas = Canvas(width, height, init=canvas_init, seed=args.seed)
     sync = Synchronizer(canvas, num_agents)
-    sync.verbose = args.verbose
-    sync.initialize_agents()
-    if args.preload and sync.agents:
-        # Warm up shared diffuser and classifier once to avoid per-thread load.
-        agent0 = sync.agents[0]
-        _ = agent0.diffuser._get_diffuser()
-        _ = agent0.prompt_generator
+    _configure_sync(sync, args)
+    if len(stages) > 1:
+        sync.resolution_stages = stages
+        sync.stage_max_age = args.stage_max_age or None
+    sync.export_mode = args.export
+    sync.tile_size = args.tile_size
+    if args.checkpoint_interval > 0:
+        sync.checkpoint_dir = args.checkpoint_dir
+        sync.checkpoint_interval = args.checkpoint_interval
+    recorder = None
+    replay_archive = None
+    if args.replay:
+        from agents.replay import ReplayArchive, replay_agent_factory
+
+        replay_archive = ReplayArchive(args.replay)
+        sync.initialize_agents(replay_agent_factory(replay_archive, latency_scale=args.replay_latency))
+    elif args.record:
+        from agents.replay import ModelCallRecorder, recording_agent_factory
+
+        recorder = ModelCallRecorder(args.record)
+        sync.initialize_agents(recording_agent_factory(recorder))
+    elif args.backend == "heuristic":
+        sync.initialize_agents(HeuristicAgent)
+    else:
+        sync.initialize_agents()
+    if resume_path is not None:
+        sync.restore_checkpoint(resume_path, state=resume_state)
+    if args.trace:
+        tracing.enable(args.trace_buffer)
+    if replay_archive is None and args.backend == "diffusion":
+        # Load ViT and aMUSEd in parallel; workers start once they are ready.
+        sync.preload_models(block=args.preload)
+    profiler = None
+    if args.profile:
+        profiler = SamplingProfiler(interval=args.profile_interval)
+        profiler.start()
+    if args.metrics_port is not None or args.metrics_socket:
+        sync.serve_metrics(port=args.metrics_port, unix_socket=args.metrics_socket)
     sync.start()
     sync.start_run()
     # Start parent watcher and signal handlers so child threads stop when
     # the parent process (this script) is terminated.
     _register_signal_handlers(sync)
     _start_parent_watcher(sync)
-    max_seconds = 5 * 60
     start_time = time.time()
     last_log = start_time
-    while sync.running and (time.time() - start_time) < max_seconds:
+    last_timings = start_time
+    while sync.running:
         now = time.time()
         if now - last_log >= 1.0:
-            print(f"canvas age: {canvas.getAge()}")
+            convergence = sync.convergence
+            if convergence is not None:
+                print(
+                    f"canvas age: {canvas.getAge()} change={convergence.window_mean_change:.3f} "
+                    f"touched={100.0 * convergence.touched_fraction:.2f}%"
+                )
+            else:
+                print(f"canvas age: {canvas.getAge()}")
             last_log = now
+        if args.timings_interval > 0 and now - last_timings >= args.timings_interval:
+            print(sync.format_stage_summary())
+            if args.timings_file:
+                sync.write_stage_timings(args.timings_file)
+            last_timings = now
         time.sleep(0.05)
-    if sync.running:
-        sync.stop_run()
-    else:
-        sync.stop_run()
-    canvas.export()
+    sync.stop_run()
+    if sync.stop_reason:
+        print(f"[run] finished: {sync.stop_reason}")
+    with tracing.span("export", "export", age=canvas.age):
+        canvas.export()
+    if isinstance(canvas, MappedCanvas):
+        canvas.flush()
+    if profiler is not None:
+        profiler.stop()
+        print(profiler.write(args.profile_out))
+        print(f"[profiler] collapsed stacks: {os.path.join(args.profile_out, 'profile.collapsed')}")
+    print(sync.format_stage_summary())
+    if args.timings_file:
+        sync.write_stage_timings(args.timings_file)
+    sync.shutdown(timeout=2.0)
+    tracer = tracing.disable()
+    if tracer is not None:
+        tracer.write(args.trace)
+        print(f"[trace] {len(tracer.events)} events ({tracer.dropped} dropped) -> {args.trace}")
+    if recorder is not None:
+        recorder.save()
+    if replay_archive is not None:
+        print(replay_archive.summary())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+"""
+Low-overhead wall-clock sampling profiler for multithreaded PLAiCE runs.
+
+A background thread periodically snapshots the Python stack of every other
+thread via sys._current_frames(). Each sample is folded into a
+"collapsed stack" line (root first, `;`-separated), with two synthetic
+frames in front of the real ones:
+
+    <thread name>;[<stage>];module.py:func;...
+
+where <stage> is the Agent.step stage or merge phase active on that thread
+at sample time (see agents.timing.active_stage). The output can be fed
+straight into flamegraph.pl / speedscope / inferno.
+
+Unlike cProfile, nothing is instrumented: overhead is one stack walk per
+thread per interval and is reported in the summary.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from agents.timing import active_stage
+
+MAX_DEPTH = 64
+
+# Thread name prefixes that top_table() groups by: "<role>-<index or name>"
+# threads (agent-0, agent-1, stage-classify, ...) are summed under their role.
+# Longest match wins; other threads keep their full name.
+THREAD_ROLES = ("agent", "stage", "stage-feed", "merge", "startup", "checkpoint-writer", "metrics-server")
+
+
+def thread_role(name: str) -> str:
+    """Role of a thread for grouping, from its name (see THREAD_ROLES)."""
+    best = None
+    for role in THREAD_ROLES:
+        if (name == role or name.startswith(role + "-")) and (best is None or len(role) > len(best)):
+            best = role
+    return best if best is not None else name
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.01, max_depth: int = MAX_DEPTH):
+        """
+        Args:
+            interval: Seconds between samples (0.01 = 100 Hz)
+            max_depth: Innermost frames kept per stack
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sampling_seconds = 0.0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._labels: Dict[object, str] = {}
+        self._thread_names: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._loop, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self.stopped_at = time.perf_counter()
+
+    def _label(self, code) -> str:
+        # Cache per code object: building the label is the expensive part.
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = f"{os.path.basename(code.co_filename)}:{name}".replace(";", ",")
+            self._labels[code] = label
+        return label
+
+    def _refresh_thread_names(self):
+        self._thread_names = {t.ident: t.name for t in threading.enumerate()}
+
+    def _sample(self, own_ident: int):
+        frames = sys._current_frames()
+        for ident, frame in frames.items():
+            if ident == own_ident:
+                continue
+            name = self._thread_names.get(ident)
+            if name is None:
+                self._refresh_thread_names()
+                name = self._thread_names.get(ident, f"thread-{ident}")
+
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+
+            stage = active_stage(ident)
+            prefix = [name, f"[{stage}]"] if stage else [name]
+            self.stacks[";".join(prefix + stack)] += 1
+        self.samples += 1
+
+    def _loop(self):
+        own_ident = threading.get_ident()
+        self._refresh_thread_names()
+        next_refresh = time.perf_counter() + 1.0
+        while not self._stop.wait(self.interval):
+            t0 = time.perf_counter()
+            try:
+                self._sample(own_ident)
+            except Exception as exc:
+                print(f"[profiler] sample failed: {exc}")
+            if t0 >= next_refresh:
+                self._refresh_thread_names()
+                next_refresh = t0 + 1.0
+            self.sampling_seconds += time.perf_counter() - t0
+
+    # ------------------------------------------------------------------ output
+
+    def collapsed(self) -> str:
+        """Flamegraph-compatible collapsed stacks ("a;b;c count" per line)."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_table(self, top_n: int = 25) -> str:
+        total = sum(self.stacks.values()) or 1
+        self_counts: Counter = Counter()
+        inclusive: Counter = Counter()
+        stages: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            thread = thread_role(frames[0])
+            if len(frames) > 1 and frames[1].startswith("["):
+                stages[f"{thread} {frames[1]}"] += count
+                frames = frames[2:]
+            else:
+                frames = frames[1:]
+            if frames:
+                self_counts[frames[-1]] += count
+            for fn in set(frames):
+                inclusive[fn] += count
+
+        elapsed = (self.stopped_at or time.perf_counter()) - (self.started_at or 0.0)
+        overhead = 100.0 * self.sampling_seconds / elapsed if elapsed > 0 else 0.0
+        lines = [
+            f"[profiler] {self.samples} sampling rounds, {total} thread samples, "
+            f"interval={self.interval * 1000:.1f}ms, overhead={overhead:.2f}% of one core",
+            "",
+            "by stage (thread role [stage]):",
+        ]
+        for key, count in stages.most_common(top_n):
+            lines.append(f"  {100.0 * count / total:6.2f}%  {count:8d}  {key}")
+        lines += ["", "top self:"]
+        for fn, count in self_counts.most_common(top_n):
+            lines.append(f"  {100.0 * count / total:6.2f}%  {count:8d}  {fn}")
+        lines += ["", "top inclusive:"]
+        for fn, count in inclusive.most_common(top_n):
+            lines.append(f"  {100.0 * count / total:6.2f}%  {count:8d}  {fn}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, out_dir: str = "profile", top_n: int = 25) -> str:
+        """Write profile.collapsed and profile_top.txt; returns the table."""
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, "profile.collapsed"), "w") as f:
+            f.write(self.collapsed())
+        table = self.top_table(top_n)
+        with open(os.path.join(out_dir, "profile_top.txt"), "w") as f:
+            f.write(table)
+        return table
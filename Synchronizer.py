@@ -5,6 +5,35 @@ import time
 import os
 from typing import List, Dict
 
+import numpy as np
+
+from Metrics import Metrics, MetricsServer
+from agents import tracing
+from agents.proposal import ProposalBatch
+from agents.timing import (
+    StageTimings,
+    format_prometheus,
+    format_summary,
+    merge_snapshots,
+    summarize,
+    write_textfile,
+)
+
+def _proposal_weight(p) -> float:
+    # use proposal confidence as a weight; canvas_version can be 0
+    # which would otherwise zero-out contributions and prevent updates
+    weight = getattr(p, "confidence", None)
+    if weight is None:
+        # fallback to 1.0 for older proposals
+        return 1.0
+    try:
+        weight = float(weight)
+    except Exception:
+        return 1.0
+    # ensure non-zero small floor
+    return weight if weight > 0.0 else 0.01
+
+
 class Synchronizer:
 
     def __init__(self, canvas: Canvas, numAgents: int):
@@ -20,14 +49,91 @@ class Synchronizer:
         self.agent_bounds = {}
         self.verbose = False
         self.batch_index = 0
-
-    def initialize_agents(self):
+        self.frames_dir = "frames"
+        # "png": one full frame per age; "tiles": incremental Deep Zoom
+        # pyramid in frames_dir (see TilePyramid.py).
+        self.export_mode = "png"
+        self.tile_size = 256
+        self.tile_exporter = None
+        # Stop criteria (see agents/convergence.py): hard limits (None: no
+        # limit) and convergence thresholds over convergence_window ages.
+        # The age limit stays as a safety net for runs that never converge.
+        self.max_age = 512
+        self.max_seconds = None
+        self.stop_min_change = None
+        self.stop_min_touched = None
+        self.convergence_window = 32
+        self.convergence = None
+        self.stop_criteria = None
+        self.stop_reason = None
+        # Agents whose window converged sleep, stepping once every
+        # probe_interval seconds to check whether it is still quiet.
+        self.sleep_converged = True
+        self.probe_interval = 5.0
+        self._sleeping = {}  # agent_id -> bool
+        # Coarse-to-fine schedule: ascending [(width, height), ...] ending at
+        # the target size; the canvas starts at the first and is upsampled
+        # whenever a stage converges or runs stage_max_age ages.
+        self.resolution_stages = []
+        self.resolution_stage = 0
+        self.stage_max_age = None
+        self._stage_start_age = 0
+        # Extra PipelineConfig keyword arguments for every agent.
+        self.pipeline_options = {}
+        # Merge-loop phase histograms (wait/accumulate/apply/export); written
+        # only by the run thread.
+        self.merge_timings = StageTimings(owner="merge")
+        self.metrics = Metrics()
+        self.metrics_server = None
+        self._step_rates = {}  # agent_id -> smoothed steps/sec of wall time
+        self._last_step_done = {}  # agent_id -> perf_counter() of the last step
+        self._register_metrics()
+        # Periodic checkpoints (disabled while checkpoint_dir is None).
+        self.checkpoint_dir = None
+        self.checkpoint_interval = 60.0
+        self.checkpoint_keep = 3
+        self._checkpoint_writer = None
+        self._last_checkpoint = time.time()
+        # Pipelined stage workers instead of one thread per agent (see
+        # agents/staged.py); set before start().
+        self.staged = False
+        self.stage_queue_size = 2
+        self.executor = None
+        # Activity-driven agent placement (see agents/regions.py); when
+        # adaptive_regions is set, start() builds it and run() rebalances
+        # every region_interval ages.
+        self.adaptive_regions = False
+        self.region_interval = 16
+        self.regions = None
+        # Global step budget (see agents/scheduler.py): with budget_rate > 0,
+        # start() builds a BudgetScheduler and each worker waits for its turn
+        # instead of stepping as fast as it can. Not used with staged.
+        self.budget_rate = 0.0
+        self.budget_unit = "calls"
+        self.budget_burst = None
+        self.scheduler = None
+        # Pause of a free-running worker between steps (0: none, e.g. for
+        # the heuristic backend, whose steps take well under a millisecond).
+        self.worker_sleep = 0.01
+        # ThreadBudget.ThreadBudget applied by each worker thread, if set.
+        self.thread_budget = None
+        # Readiness barrier: run() starts workers only once this is set
+        # (cleared while preload_models() is loading weights).
+        self.ready = threading.Event()
+        self.ready.set()
+        self.startup_report = None
+
+    def initialize_agents(self, agent_factory=None):
         from agents.agent import Agent
         from agents.agent_state import AgentState
         from agents.model_interface import AgentModel
         from agents.pipeline import PipelineConfig
         import random
 
+        # agent_factory(state, model, pipeline_config=...) -> Agent; lets callers
+        # (e.g. the bench harness) swap in agents with fake model backends.
+        agent_factory = agent_factory or Agent
+
         self.agents = []
         self.threads = []
 
@@ -41,19 +147,196 @@ class Synchronizer:
                 verbose=self.verbose,
             )
             model = AgentModel()
-            pipeline_config = PipelineConfig(image_size=64)
-            self.agents.append(Agent(state, model, pipeline_config=pipeline_config))
+            pipeline_config = PipelineConfig(image_size=64, **self.pipeline_options)
+            self.agents.append(agent_factory(state, model, pipeline_config=pipeline_config))
             self.threads.append(None)
 
 
 
+    def preload_models(self, block: bool = False):
+        """Load the agents' models in parallel on a background thread.
+
+        Workers wait on `ready` until loading finishes; with block=True the
+        caller waits too.
+        """
+        from agents.startup import preload_models
+
+        if self.agents:
+            config = self.agents[0].pipeline_config
+        else:
+            from agents.pipeline import PipelineConfig
+
+            config = PipelineConfig(image_size=64, **self.pipeline_options)
+        self.ready.clear()
+
+        def _load():
+            try:
+                budget = self.thread_budget
+                self.startup_report = preload_models(
+                    config, on_torch_import=budget.apply_torch if budget is not None else None
+                )
+            except Exception as exc:
+                print(f"[startup] preload failed: {exc}")
+            finally:
+                self.ready.set()
+
+        threading.Thread(target=_load, name="startup", daemon=True).start()
+        if block:
+            self.ready.wait()
+
+    def _register_metrics(self):
+        m = self.metrics
+        m.describe("merges_total", "Merge batches applied (canvas age increments).")
+        m.describe("proposals_received_total", "Pixel proposals queued by agents.")
+        m.describe("proposals_applied_total", "Pixel proposals merged into the canvas.")
+        m.describe("proposals_dropped_total", "Pixel proposals discarded without merging.")
+        m.describe("agent_steps_total", "Agent.step calls completed.")
+        m.describe("frame_export_lag_seconds", "Time from merge completion to frame written.")
+        m.describe("tiles_written_total", "Pyramid tiles encoded by incremental tile export.")
+        m.describe("pixels_changed_total", "Merged pixels whose value actually changed.")
+        m.describe("region_rebalances_total", "Region scheduler passes over the agent windows.")
+        m.describe("checkpoints_total", "Run-state checkpoints handed to the checkpoint writer.")
+        m.describe("resolution_stages_total", "Coarse-to-fine upsampling steps of the canvas.")
+        m.describe("budget_wait_seconds_total", "Time agents spent waiting for a budget token.")
+        m.register_gauge(
+            "convergence_mean_change",
+            lambda: self.convergence.window_mean_change if self.convergence is not None else 0.0,
+        )
+        m.register_gauge(
+            "canvas_touched_fraction",
+            lambda: self.convergence.touched_fraction if self.convergence is not None else 0.0,
+        )
+        m.register_gauge(
+            "converged_regions_fraction",
+            lambda: self.convergence.converged_fraction() if self.convergence is not None else 0.0,
+        )
+        m.register_gauge("agents_sleeping", lambda: sum(self._sleeping.values()))
+        m.register_gauge("budget_tokens", lambda: self.scheduler.tokens if self.scheduler is not None else 0.0)
+        m.register_gauge("region_overlap", lambda: self.regions.overlap if self.regions is not None else 0.0)
+        m.register_gauge("queue_depth", lambda: len(self.proposals))
+        m.register_gauge("canvas_age", lambda: self.canvas.age)
+        m.register_gauge("running", lambda: 1 if self.running else 0)
+        m.describe(
+            "agent_step_rate",
+            "Steps per second of wall time per agent, including sleeps and budget waits.",
+        )
+        m.register_gauge("agent_step_rate", self._agent_step_rates, label="agent")
+        m.describe("startup_seconds", "Wall time of each model-loading startup phase.")
+        m.register_gauge(
+            "startup_seconds",
+            lambda: self.startup_report.phases if self.startup_report is not None else {},
+            label="phase",
+        )
+        m.describe("stage_utilization", "Busy fraction of each staged-executor worker.")
+        m.register_gauge(
+            "stage_utilization",
+            lambda: self.executor.utilization() if self.executor is not None else {},
+            label="stage",
+        )
+        m.describe("stage_queue_depth", "Items waiting in front of each staged-executor worker.")
+        m.register_gauge(
+            "stage_queue_depth",
+            lambda: self.executor.queue_depths() if self.executor is not None else {},
+            label="stage",
+        )
+
+    def _record_step(self, agent_id, num_proposals):
+        self.metrics.inc("agent_steps_total", agent=agent_id)
+        if num_proposals:
+            self.metrics.inc("proposals_received_total", num_proposals)
+        # Rate from the wall time between step completions, not from the
+        # step latency: sleeps and scheduler waits count against it.
+        now = time.perf_counter()
+        last = self._last_step_done.get(agent_id)
+        self._last_step_done[agent_id] = now
+        if last is not None and now > last:
+            rate = 1.0 / (now - last)
+            prev = self._step_rates.get(agent_id)
+            self._step_rates[agent_id] = rate if prev is None else 0.8 * prev + 0.2 * rate
+
+    def _agent_step_rates(self):
+        """Smoothed steps/sec per agent, decaying while an agent is idle:
+        never more than one step per second since its last one."""
+        now = time.perf_counter()
+        rates = {}
+        for agent_id, rate in list(self._step_rates.items()):
+            idle = now - self._last_step_done.get(agent_id, now)
+            rates[agent_id] = min(rate, 1.0 / idle) if idle > 0 else rate
+        return rates
+
+    def metrics_snapshot(self) -> dict:
+        """Counters, gauges and model-call latency summaries, in process."""
+        snap = self.metrics.snapshot()
+        stages = self.stage_summary()
+        snap["model_calls"] = {
+            stage: summarize(stages[stage]) for stage in ("classify", "diffuse") if stage in stages
+        }
+        snap["merge_phases"] = {
+            stage: summarize(hist) for stage, hist in self.merge_timings.snapshot().items()
+        }
+        if self.executor is not None:
+            snap["stage_utilization"] = self.executor.utilization()
+        return snap
+
+    def metrics_text(self) -> str:
+        """Prometheus text: run counters/gauges plus stage histograms."""
+        text = self.metrics.format_prometheus()
+        text += format_prometheus(self.stage_timings())
+        text += format_prometheus(
+            {"merge": self.merge_timings.snapshot()},
+            metric="plaice_merge_seconds",
+            owner_label="loop",
+        )
+        return text
+
+    def serve_metrics(self, port=None, unix_socket=None, host="127.0.0.1"):
+        """Start the metrics HTTP endpoint (TCP on host:port, or a Unix socket)."""
+        if self.metrics_server is None:
+            self.metrics_server = MetricsServer(
+                self.metrics_text,
+                self.metrics_snapshot,
+                host=host,
+                port=port,
+                unix_socket=unix_socket,
+            ).start()
+        return self.metrics_server
+
+    def stage_timings(self) -> Dict[int, Dict[str, dict]]:
+        """Per-agent stage histogram snapshots: {agent_id: {stage: snapshot}}."""
+        return {
+            agent.state.agent_id: agent.timings.snapshot()
+            for agent in self.agents
+            if hasattr(agent, "timings")
+        }
+
+    def stage_summary(self) -> Dict[str, dict]:
+        """Stage histograms merged across all agents: {stage: snapshot}."""
+        by_stage = {}
+        for stages in self.stage_timings().values():
+            for stage, snap in stages.items():
+                by_stage.setdefault(stage, []).append(snap)
+        return {stage: merge_snapshots(snaps) for stage, snaps in by_stage.items()}
+
+    def format_stage_summary(self) -> str:
+        parts = [
+            format_summary(self.stage_summary(), title=f"stage timings @ age {self.canvas.age}"),
+            format_summary(self.merge_timings.snapshot(), title="merge timings"),
+        ]
+        if self.executor is not None:
+            parts.append(self.executor.format_utilization())
+        return "\n".join(parts)
+
+    def write_stage_timings(self, path: str):
+        """Write run metrics and per-agent stage / merge-phase histograms as
+        a Prometheus text file."""
+        write_textfile(path, self.metrics_text())
+
     def propose(self, changes):
         # with self.lock:
             self.proposals.extend(changes)
 
     def _compute_slice_bounds(self, index, cols, rows, overlap_ratio=0.6):
-        height = len(self.canvas.pixels)
-        width = len(self.canvas.pixels[0]) if height > 0 else 0
+        width, height = self.canvas.width, self.canvas.height
         if width == 0 or height == 0:
             return (0, 0, 0, 0)
 
@@ -78,46 +361,97 @@ class Synchronizer:
 
         return (x0, x1, y0, y1)
 
+    def _read_fov(self, agent):
+        """(fov, fov_origin, canvas_version) for the agent's slice, or None."""
+        x0, x1, y0, y1 = self.agent_bounds[agent.state.agent_id]
+        if x1 <= x0 or y1 <= y0:
+            return None
+        fov, canvas_version = self.canvas.read_versioned(x0, y0, x1 - x0, y1 - y0)
+        return fov, (x0, y0), canvas_version
+
+    def _trace_args(self):
+        return {"age": self.canvas.age}
+
+    def _emit_proposals(self, agent, proposals, seconds):
+        # seconds (the step's latency) is part of the StagedExecutor emit
+        # contract; the step rate is measured over wall time instead.
+        self._record_step(agent.state.agent_id, len(proposals))
+        if len(proposals):
+            with tracing.traced_acquire(self.proposal_cv, "proposal_cv.acquire", self._trace_args):
+                if isinstance(proposals, ProposalBatch):
+                    self.proposals.append(proposals)
+                else:
+                    self.proposals.extend(proposals)
+                self.proposal_cv.notify()
+
     def worker(self, agent, bounds):
         import random
         import time
 
-        x0, x1, y0, y1 = bounds
+        agent_id = agent.state.agent_id
+        if self.thread_budget is not None:
+            self.thread_budget.enter_worker(agent_id)
+        last_step = time.monotonic()
 
         while self.running:
             try:
-                height = len(self.canvas.pixels)
-                width = len(self.canvas.pixels[0]) if height > 0 else 0
-                if width == 0 or height == 0:
+                # Re-read every step: the region scheduler may move the agent.
+                x0, x1, y0, y1 = self.agent_bounds.get(agent_id, bounds)
+                if self.canvas.width == 0 or self.canvas.height == 0:
                     time.sleep(0.01)
                     continue
                 if x1 <= x0 or y1 <= y0:
                     time.sleep(0.01)
                     continue
+                convergence = self.convergence
+                if (
+                    self.sleep_converged
+                    and convergence is not None
+                    and convergence.region_converged((x0, x1, y0, y1))
+                    and time.monotonic() - last_step < self.probe_interval
+                ):
+                    self._sleeping[agent_id] = True
+                    time.sleep(0.1)
+                    continue
+                self._sleeping[agent_id] = False
+                last_step = time.monotonic()
 
                 x = random.randrange(x0, x1)
                 y = random.randrange(y0, y1)
 
-                canvas_version = self.canvas.age
+                scheduler = self.scheduler
+                if scheduler is not None:
+                    wait_start = time.perf_counter()
+                    if not scheduler.acquire(agent_id, timeout=0.5):
+                        continue
+                    self.metrics.inc("budget_wait_seconds_total", time.perf_counter() - wait_start)
+                    # The window may have moved while waiting.
+                    x0, x1, y0, y1 = self.agent_bounds.get(agent_id, bounds)
 
-                fov = self.canvas.read(x0, y0, x1 - x0, y1 - y0)
-                proposals = agent.step(fov, (x0, y0), canvas_version)
-                if proposals:
-                    with self.proposal_cv:
-                        self.proposals.extend(proposals)
-                        self.proposal_cv.notify()
-                else:
+                step_start = time.perf_counter()
+                try:
+                    # The FOV is exactly the canvas as published at canvas_version.
+                    fov, canvas_version = self.canvas.read_versioned(x0, y0, x1 - x0, y1 - y0)
+                    proposals = agent.step(fov, (x0, y0), canvas_version)
+                finally:
+                    if scheduler is not None:
+                        scheduler.release(
+                            agent_id, time.perf_counter() - step_start, getattr(agent.state, "last_diff", None)
+                        )
+                self._emit_proposals(agent, proposals, time.perf_counter() - step_start)
+                if not proposals:
                     if self.verbose:
                         now = time.time()
                         last = getattr(agent, "_last_empty_log", 0.0)
                         if now - last >= 1.0:
                             print(
                                 f"[worker {agent.state.agent_id}] zero proposals; "
-                                f"fov={len(fov)}x{len(fov[0]) if fov else 0}"
+                                f"fov={fov.shape[0]}x{fov.shape[1]}"
                             )
                             agent._last_empty_log = now
 
-                time.sleep(0.01)
+                if scheduler is None and self.worker_sleep > 0:
+                    time.sleep(self.worker_sleep)
             except Exception as exc:
                 print(f"[worker {agent.state.agent_id}] exception: {exc}")
                 time.sleep(0.1)
@@ -125,7 +459,60 @@ class Synchronizer:
     def start(self):
         if self.numAgents <= 0:
             return
+        if self.budget_rate and self.staged:
+            raise ValueError("a step budget needs the per-agent workers (staged is set)")
+
+        if self.resolution_stages:
+            # Resumed runs continue at the stage matching the canvas size.
+            size = (self.canvas.width, self.canvas.height)
+            stages = [tuple(stage) for stage in self.resolution_stages]
+            self.resolution_stage = stages.index(size) if size in stages else len(stages) - 1
+            self._stage_start_age = self.canvas.age
+
+        self._layout_agents()
+        for i in range(self.numAgents):
+            if self.staged:
+                continue
+            t = threading.Thread(
+                target=self.worker,
+                args=(self.agents[i], self.agent_bounds[i]),
+                name=f"agent-{i}",
+            )
+            # Make worker threads daemon so they don't keep the process alive
+            # if the main thread exits unexpectedly.
+            t.daemon = True
+            self.threads[i] = t
+
+        self._build_trackers()
 
+        if self.budget_rate:
+            from agents.scheduler import BudgetScheduler
+
+            self.scheduler = BudgetScheduler(
+                self.canvas.width,
+                self.canvas.height,
+                self.agent_bounds,
+                self.budget_rate,
+                unit=self.budget_unit,
+                burst=self.budget_burst,
+            )
+
+        if self.staged:
+            from agents.staged import StagedExecutor
+
+            self.threads = []
+            self.executor = StagedExecutor(
+                self.agents,
+                self._read_fov,
+                self._emit_proposals,
+                queue_size=self.stage_queue_size,
+                on_thread_start=(
+                    self.thread_budget.enter_worker if self.thread_budget is not None else None
+                ),
+            )
+
+    def _layout_agents(self):
+        """Static grid of agent windows over the current canvas size."""
         cols = int(math.sqrt(self.numAgents))
         if cols * cols < self.numAgents:
             cols += 1
@@ -135,110 +522,318 @@ class Synchronizer:
             bounds = self._compute_slice_bounds(i, cols, rows, overlap_ratio=0.4)
             self.agent_bounds[i] = bounds
             self.agents[i].state.slice_bounds = bounds
-            t = threading.Thread(
-                target=self.worker,
-                args=(self.agents[i], bounds),
+
+    def _build_trackers(self):
+        """Region scheduler and convergence stats sized to the canvas."""
+        if self.adaptive_regions:
+            from agents.regions import RegionScheduler
+
+            self.regions = RegionScheduler(
+                self.canvas.width, self.canvas.height, self.numAgents, interval=self.region_interval
             )
-            # Make worker threads daemon so they don't keep the process alive
-            # if the main thread exits unexpectedly.
-            t.daemon = True
-            self.threads[i] = t
+            self.regions.note_bounds(self.agent_bounds.values(), self.canvas.age)
+
+        from agents.convergence import ConvergenceTracker
+
+        self.convergence = ConvergenceTracker(
+            self.canvas.width, self.canvas.height, window=self.convergence_window, start_age=self.canvas.age
+        )
+
+    def _next_resolution(self, reason):
+        """Move to the next resolution stage (merge thread); False at the last."""
+        if self.resolution_stage + 1 >= len(self.resolution_stages):
+            return False
+        self.resolution_stage += 1
+        width, height = self.resolution_stages[self.resolution_stage]
+        print(
+            f"[run] {reason}; upsampling {self.canvas.width}x{self.canvas.height} -> {width}x{height} "
+            f"(stage {self.resolution_stage + 1}/{len(self.resolution_stages)})"
+        )
+        # resize() publishes a new age: proposals computed against the old
+        # resolution have an older canvas_version and are dropped.
+        self.canvas.resize(width, height)
+        self._stage_start_age = self.canvas.age
+        self._layout_agents()
+        self._build_trackers()
+        if self.scheduler is not None:
+            self.scheduler.resize(width, height)
+        self._sleeping.clear()
+        self.metrics.inc("resolution_stages_total")
+        return True
+
+    def _take_batch(self):
+        """Wait for proposals and drain the queue; None if nothing arrived."""
+        with tracing.traced_acquire(self.proposal_cv, "proposal_cv.acquire", self._trace_args):
+            if not self.proposals:
+                with tracing.span("proposal_cv.wait", "wait", age=self.canvas.age):
+                    self.proposal_cv.wait(timeout=2)
+                return None
+
+            batch = self.proposals.copy()
+            self.proposals.clear()
+        return batch
+
+    def _batch_arrays(self, batch, min_version):
+        """(xs, ys, rgb, weight, stale) of a batch of Proposals and
+        ProposalBatches: one array entry per pixel proposal made at
+        canvas_version >= min_version, and the number of older ones."""
+        parts = []
+        singles = []
+        stale = 0
+        for item in batch:
+            if isinstance(item, ProposalBatch):
+                if item.canvas_version < min_version:
+                    stale += len(item)
+                elif len(item):
+                    confidence = np.asarray(item.confidence, dtype=np.float64)
+                    parts.append((
+                        np.asarray(item.xs, dtype=np.int64),
+                        np.asarray(item.ys, dtype=np.int64),
+                        np.asarray(item.rgb, dtype=np.uint8).reshape(-1, 3),
+                        # same floor as single proposals below
+                        np.where(confidence > 0.0, confidence, 0.01),
+                    ))
+            elif item.canvas_version < min_version:
+                stale += 1
+            else:
+                singles.append(item)
+        if singles:
+            parts.append((
+                np.fromiter((p.region_id[0] for p in singles), dtype=np.int64, count=len(singles)),
+                np.fromiter((p.region_id[1] for p in singles), dtype=np.int64, count=len(singles)),
+                np.array([p.rgb for p in singles], dtype=np.uint8).reshape(-1, 3),
+                np.fromiter((_proposal_weight(p) for p in singles), dtype=np.float64, count=len(singles)),
+            ))
+        if not parts:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros((0, 3), dtype=np.uint8), np.zeros(0), stale
+        if len(parts) == 1:
+            return parts[0] + (stale,)
+        return tuple(np.concatenate(column) for column in zip(*parts)) + (stale,)
+
+    def _accumulate_batch(self, batch):
+        """Per-pixel weighted colour sums of a batch: (xs, ys, sums, weights,
+        counts) over the distinct pixels proposed."""
+        xs, ys, rgb, weight, stale = self._batch_arrays(batch, self._stage_start_age)
+        width, height = self.canvas.width, self.canvas.height
+
+        # Negative coordinates wrap to huge unsigned values: one compare each.
+        inside = (xs.view(np.uint64) < width) & (ys.view(np.uint64) < height)
+        dropped = int(inside.size - np.count_nonzero(inside))
+        if dropped:
+            xs, ys, rgb, weight = xs[inside], ys[inside], rgb[inside], weight[inside]
+
+        # Weighted mean colour per pixel: sum(w * rgb) / sum(w) via bincount,
+        # over the whole canvas when the batch is dense (no sort), else over
+        # the distinct pixel indices.
+        index = ys * width + xs
+        if width * height <= 4 * index.size:
+            counts = np.bincount(index, minlength=width * height)
+            pixels = np.flatnonzero(counts)
+            counts = counts[pixels]
+            bins, size = index, width * height
+        else:
+            pixels, bins, counts = np.unique(index, return_inverse=True, return_counts=True)
+            size = pixels.size
+        weights = np.bincount(bins, weights=weight, minlength=size)
+        weighted = rgb.T * weight  # (3, n), one contiguous row per channel
+        sums = np.stack([np.bincount(bins, weights=row, minlength=size) for row in weighted], axis=1)
+        if size != pixels.size:
+            weights, sums = weights[pixels], sums[pixels]
+        if dropped:
+            self.metrics.inc("proposals_dropped_total", dropped, reason="out_of_bounds")
+        if stale:
+            self.metrics.inc("proposals_dropped_total", stale, reason="resolution")
+        self.metrics.inc("proposals_applied_total", int(index.size))
+        return pixels % width, pixels // width, sums, weights, counts
+
+    def _apply_merge(self, merged):
+        xs, ys, sums, weights, counts = merged
+        valid = weights > 0
+        if not valid.all():
+            xs, ys, sums, weights, counts = xs[valid], ys[valid], sums[valid], weights[valid], counts[valid]
+        if not xs.size:
+            return
+        # Truncates like int(): all values are non-negative.
+        cols = (sums / weights[:, None]).astype(np.int16)
+        duplicate = counts > 1
+
+        # log a few sample modifications when verbose
+        if self.verbose and (self.canvas.age % 10 == 0):
+            for x, y, col in zip(xs[:5], ys[:5], cols[:5]):
+                # previous value is the published pixel (writes are pending)
+                prev = tuple(int(v) for v in self.canvas.pixels[y, x])
+                print(f"[run] modify pos={(int(x), int(y))} prev={prev} -> new={tuple(int(v) for v in col)}")
+        # Published (pre-merge) pixels: how much this merge really changes.
+        delta = np.abs(cols - self.canvas.pixels[ys, xs]).sum(axis=1)
+        self.canvas.write_many(xs, ys, cols)
+        self.metrics.inc("pixels_changed_total", int(np.count_nonzero(delta)))
+        if self.regions is not None:
+            self.regions.observe_merge(xs, ys, delta, duplicate, self.canvas.age + 1)
+        if self.scheduler is not None:
+            self.scheduler.observe_merge(xs, ys, delta)
+        if self.convergence is not None:
+            self.convergence.observe_merge(xs, ys, delta, self.canvas.age + 1)
+
+    def _rebalance_regions(self):
+        """Move agent windows to where merges pay off (merge thread)."""
+        current = {i: self.agent_bounds[i] for i in range(self.numAgents)}
+        assigned = self.regions.assign(current)
+        for agent_id, bounds in assigned.items():
+            if bounds == current[agent_id]:
+                continue
+            state = self.agents[agent_id].state
+            state.slice_bounds = bounds
+            # The last guess belongs to the old region.
+            state.last_guess = None
+            self.agent_bounds[agent_id] = bounds
+        self.metrics.inc("region_rebalances_total")
+
+    def checkpoint(self):
+        """Capture run state and hand it to the background writer. Must run
+        on the merge thread (or while the run loop is stopped)."""
+        import Checkpoint
+
+        if self.checkpoint_dir is None:
+            return
+        if self._checkpoint_writer is None:
+            self._checkpoint_writer = Checkpoint.CheckpointWriter(
+                self.checkpoint_dir, keep=self.checkpoint_keep
+            )
+        self._checkpoint_writer.submit(Checkpoint.capture_state(self))
+        self._last_checkpoint = time.time()
+        self.metrics.inc("checkpoints_total")
+
+    def _maybe_checkpoint(self):
+        if self.checkpoint_dir is None or self.checkpoint_interval is None:
+            return
+        if time.time() - self._last_checkpoint >= self.checkpoint_interval:
+            with self.merge_timings.time("checkpoint", age=self.canvas.age):
+                self.checkpoint()
+
+    def restore_checkpoint(self, path, state=None):
+        """Load canvas, age, agent states and RNG state from `path` (or an
+        already loaded `state`). Call after initialize_agents() and before
+        start()."""
+        import Checkpoint
+
+        if state is None:
+            state = Checkpoint.load_checkpoint(path)
+        Checkpoint.restore_state(self, state)
+        print(f"[checkpoint] resumed from {path} at age {self.canvas.age}")
+        return state["meta"]
+
+    def _export_frame(self, frames_dir):
+        if self.export_mode == "tiles":
+            if self.tile_exporter is None:
+                from TilePyramid import TilePyramidExporter
+
+                self.tile_exporter = TilePyramidExporter(frames_dir, tile_size=self.tile_size)
+            stats = self.tile_exporter.export(self.canvas)
+            self.metrics.inc("tiles_written_total", stats["tiles_written"])
+            return
+        frame_path = os.path.join(frames_dir, f"frame_{self.canvas.age:04d}.png")
+        self.canvas.export(frame_path)
 
     def run(self):
         print("[run] started")
-        frames_dir = "frames"
+        frames_dir = self.frames_dir
         os.makedirs(frames_dir, exist_ok=True)
+        waited = time.perf_counter()
+        while self.running and not self.ready.wait(timeout=0.1):
+            pass
+        if not self.ready.is_set():
+            print("[run] stopped before models were ready")
+            return
+        self.metrics.set_gauge("ready_wait_seconds", time.perf_counter() - waited)
+        from agents.convergence import StopCriteria
+
+        # Created here so max_seconds counts from when the agents start.
+        self.stop_criteria = StopCriteria(
+            max_age=self.max_age,
+            max_seconds=self.max_seconds,
+            min_change=self.stop_min_change,
+            min_touched=self.stop_min_touched,
+            stop_when_idle=self.sleep_converged and not self.staged,
+        )
+        self.stop_reason = None
         # start spinning agents
         for thread in self.threads:
             thread.start()
+        if self.executor is not None:
+            self.executor.start()
 
+        timings = self.merge_timings
         while self.running:
-            if self.canvas.getAge() >= 512:
-                print("[run] age limit reached, stopping")
+            age = self.canvas.getAge()
+            sleeping = [self._sleeping.get(i, False) for i in range(self.numAgents)]
+            reason = self.stop_criteria.limit_reached(age)
+            if reason is None:
+                reason = self.stop_criteria.converged(self.convergence, sleeping)
+                if (
+                    reason is None
+                    and self.stage_max_age
+                    and self.resolution_stage + 1 < len(self.resolution_stages)
+                    and age - self._stage_start_age >= self.stage_max_age
+                ):
+                    reason = f"stage age limit {self.stage_max_age} reached"
+                if reason is not None and self._next_resolution(reason):
+                    reason = None
+            if reason is not None:
+                print(f"[run] {reason}, stopping")
+                self.stop_reason = reason
                 self.running = False
                 break
-            with self.proposal_cv:
-                if not self.proposals:
-                    self.proposal_cv.wait(timeout=2)
-                    continue
-
-                batch = self.proposals.copy()
-                self.proposals.clear()
+            with timings.time("wait", age=self.canvas.age):
+                batch = self._take_batch()
+            if batch is None:
+                continue
             if batch:
-                print(f"[run] batch size: {len(batch)}")
+                print(f"[run] batch size: {sum(len(p) if isinstance(p, ProposalBatch) else 1 for p in batch)}")
                 if self.verbose:
-                    sample = [ (p.region_id, p.rgb, p.canvas_version) for p in batch[:5] ]
+                    first = batch[0] if isinstance(batch[0], ProposalBatch) else batch
+                    sample = [(p.region_id, p.rgb, p.canvas_version) for p, _ in zip(first, range(5))]
                     print(f"[run] sample proposals (first 5): {sample}")
-            # Dict[Pos, Dict[rgb, int]]
-            modified_pixels = dict()
-
-            cur_age = self.canvas.age
-
-            for p in batch:
-                # use proposal confidence as a weight; canvas_version can be 0
-                # which would otherwise zero-out contributions and prevent updates
-                weight = getattr(p, "confidence", None)
-                if weight is None:
-                    # fallback to 1.0 for older proposals
-                    weight = 1.0
-                # ensure non-zero small floor
-                try:
-                    weight = float(weight)
-                except Exception:
-                    weight = 1.0
-                if weight <= 0.0:
-                    weight = 0.01
-                if p.region_id not in modified_pixels:
-                    modified_pixels[p.region_id] = {}
-                modified_pixels[p.region_id][p.rgb] = (
-                    modified_pixels[p.region_id].get(p.rgb, 0) + weight
-                )
-            for pos, m in modified_pixels.items():
-                x, y = pos
-                tempR, tempG, tempB = 0, 0, 0
-                sumWeights = 0
-                for rgb, weight in m.items():
-                    r, g, b = rgb
-                    tempR += r * weight 
-                    tempG += g * weight
-                    tempB += b * weight 
-
-                    sumWeights += weight
-                if sumWeights == 0:
-                    continue
-                resultR = tempR / sumWeights
-                resultG = tempG / sumWeights
-                resultB = tempB / sumWeights
-
-                # record previous value for debugging
-                try:
-                    prev = self.canvas.pixels[y][x]
-                except Exception:
-                    prev = None
-
-                new_col = (int(resultR), int(resultG), int(resultB))
-                self.canvas.write(x, y, new_col)
-
-                # log a few sample modifications when verbose
-                if self.verbose and (self.canvas.age % 10 == 0):
-                    print(f"[run] modify pos={(x,y)} prev={prev} -> new={new_col}")
+            age = self.canvas.age
+            with tracing.span("merge_batch", "merge", age=age, proposals=len(batch)):
+                with timings.time("accumulate", age=age):
+                    merged = self._accumulate_batch(batch)
+                with timings.time("apply", age=age):
+                    self._apply_merge(merged)
+                self.canvas.increment_age()
+            merged_at = time.perf_counter()
             if self.verbose:
-                print(f"[run] modified_pixels count: {len(modified_pixels)}")
-            self.canvas.increment_age()
-            frame_path = os.path.join(frames_dir, f"frame_{self.canvas.age:04d}.png")
-            self.canvas.export(frame_path)
+                print(f"[run] modified_pixels count: {merged[0].size}")
+            if self.regions is not None and self.canvas.age % self.region_interval == 0:
+                with timings.time("regions", age=self.canvas.age):
+                    self._rebalance_regions()
+            self.metrics.inc("merges_total")
+            with timings.time("export", age=self.canvas.age):
+                self._export_frame(frames_dir)
+            self.metrics.set_gauge("frame_export_lag_seconds", time.perf_counter() - merged_at)
+            self.metrics.set_gauge("last_export_age", self.canvas.age)
+            self._maybe_checkpoint()
 
 
         # stop spinning agents
         for thread in self.threads:
             thread.join()
+        if self.executor is not None:
+            self.executor.stop()
+        with self.proposal_cv:
+            leftover = len(self.proposals)
+        if leftover:
+            self.metrics.inc("proposals_dropped_total", leftover, reason="shutdown")
+        if self.checkpoint_dir is not None:
+            self.checkpoint()
+            self._checkpoint_writer.flush()
         print("[run] stopped")
 
     def start_run(self):
         if self.run_thread is not None and self.run_thread.is_alive():
             return
         self.running = True
-        self.run_thread = threading.Thread(target=self.run)
+        self.run_thread = threading.Thread(target=self.run, name="merge")
         # Make the run thread daemon as well so it won't block process exit.
         self.run_thread.daemon = True
         self.run_thread.start()
@@ -282,7 +877,7 @@ class Synchronizer:
                     print(f"[synchronizer.parent_watcher] exception: {exc}")
                 time.sleep(interval)
 
-        t = threading.Thread(target=_watcher, daemon=True)
+        t = threading.Thread(target=_watcher, name="parent-watcher", daemon=True)
         t.start()
 
     def stop_run(self):
@@ -307,6 +902,11 @@ class Synchronizer:
         Call this from main application teardown when blocking is acceptable.
         """
         self.running = False
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
         if self.run_thread is not None:
             try:
                 self.run_thread.join(timeout=timeout)
@@ -0,0 +1,195 @@
+"""
+CPU thread budget for a PLAiCE process.
+
+Every agent worker calls into torch and NumPy, and each of those brings its
+own thread pool (torch intra-op/inter-op, OpenMP, BLAS). Left at their
+defaults each pool sizes itself to the whole machine, so N agents on a C
+core node run roughly N * C compute threads and throughput drops as agents
+are added. A ThreadBudget splits the cores instead:
+
+    workers      = agent threads (or stage workers with --staged)
+    intra_op     = cores // workers   torch.set_num_threads, per worker
+    blas         = intra_op           OMP/MKL/OpenBLAS thread env vars
+    inter_op     = 1                  torch.set_num_interop_threads
+
+Optionally each worker thread is pinned to its own slice of cores
+(pin="threads"), or the whole process to a contiguous core range
+(pin="process", e.g. several PLAiCE processes on one node).
+
+BLAS/OpenMP env vars are only read when those libraries load, so apply()
+must run before torch is first imported (i.e. before initialize_agents);
+NumPy's BLAS, already loaded by then, is limited at runtime through
+threadpoolctl when it is installed. apply() does not import torch itself:
+the model loader calls apply_torch() right after its import (see
+Synchronizer.preload_models), so the import stays off the main thread and
+heuristic runs never load torch at all.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+BLAS_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "BLIS_NUM_THREADS",
+)
+PIN_MODES = (None, "threads", "process")
+
+
+def available_cores() -> List[int]:
+    """CPU ids this process may run on (respects cgroup/taskset limits)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+@dataclass
+class ThreadBudget:
+    workers: int
+    cores: List[int] = field(default_factory=available_cores)
+    intra_op: Optional[int] = None
+    inter_op: int = 1
+    blas: Optional[int] = None
+    pin: Optional[str] = None
+
+    def __post_init__(self):
+        if self.pin not in PIN_MODES:
+            raise ValueError(f"pin must be one of {PIN_MODES}, got {self.pin!r}")
+        self.workers = max(1, int(self.workers))
+        self.cores = list(self.cores) or available_cores()
+        if self.intra_op is None:
+            self.intra_op = max(1, len(self.cores) // self.workers)
+        if self.blas is None:
+            self.blas = self.intra_op
+
+    @classmethod
+    def plan(cls, workers: int, num_cores: Optional[int] = None, core_offset: int = 0, **kwargs):
+        """Budget for `workers` compute threads on `num_cores` cores starting
+        at `core_offset` within the available set."""
+        cores = available_cores()
+        if num_cores is not None:
+            cores = cores[core_offset:core_offset + num_cores] or cores
+        return cls(workers=workers, cores=cores, **kwargs)
+
+    # ------------------------------------------------------------------ apply
+
+    def environ(self) -> Dict[str, str]:
+        """Env vars for this budget (also usable for child processes)."""
+        return {name: str(self.blas) for name in BLAS_ENV_VARS}
+
+    def apply(self):
+        """Configure thread pools for this process. Call before the models load."""
+        os.environ.update(self.environ())
+        try:
+            from threadpoolctl import threadpool_limits
+
+            threadpool_limits(limits=self.blas)
+        except Exception:
+            pass
+        if "torch" in sys.modules:
+            self.apply_torch()
+        if self.pin == "process" and hasattr(os, "sched_setaffinity"):
+            # Inherited by every thread started afterwards.
+            os.sched_setaffinity(0, self.cores)
+        print(f"[threads] {self.describe()}")
+
+    def apply_torch(self):
+        """Size torch's pools; a no-op until torch has been imported."""
+        torch = sys.modules.get("torch")
+        if torch is None:
+            return
+        torch.set_num_threads(self.intra_op)
+        try:
+            torch.set_num_interop_threads(self.inter_op)
+        except RuntimeError:
+            # Only settable before the first parallel op has run.
+            pass
+
+    def core_slice(self, index: int) -> List[int]:
+        """Cores for worker `index` (round-robin when workers > cores)."""
+        n = len(self.cores)
+        per_worker = max(1, n // self.workers)
+        start = (index * per_worker) % n
+        return self.cores[start:start + per_worker]
+
+    def enter_worker(self, index: int):
+        """Call at the top of worker thread `index`: sizes this thread's torch
+        pool (OpenMP settings are per thread) and pins it if requested."""
+        if "torch" in sys.modules:
+            sys.modules["torch"].set_num_threads(self.intra_op)
+        self.pin_thread(index)
+
+    def pin_thread(self, index: int):
+        """Pin the calling thread to its core slice (pin="threads" only)."""
+        if self.pin != "threads" or not hasattr(os, "sched_setaffinity"):
+            return
+        try:
+            # pid 0 = the calling thread on Linux.
+            os.sched_setaffinity(0, self.core_slice(index))
+        except OSError as exc:
+            print(f"[threads] pinning worker {index} failed: {exc}")
+
+    def describe(self) -> str:
+        return (
+            f"workers={self.workers} cores={len(self.cores)} intra_op={self.intra_op} "
+            f"inter_op={self.inter_op} blas={self.blas} pin={self.pin}"
+        )
+
+
+def _total_steps(sync) -> float:
+    return sum(
+        sync.metrics.counter("agent_steps_total", agent=agent.state.agent_id)
+        for agent in sync.agents
+    )
+
+
+def measure_step_rate(make_sync: Callable[[int], object], num_agents: int, seconds: float) -> float:
+    """Run a throwaway Synchronizer with `num_agents` agents for `seconds`
+    and return completed agent steps per second."""
+    sync = make_sync(num_agents)
+    with tempfile.TemporaryDirectory(prefix="plaice-autotune-") as frames_dir:
+        sync.frames_dir = frames_dir
+        sync.checkpoint_dir = None
+        sync.start()
+        sync.start_run()
+        # Skip the first steps (model warmup, first allocations).
+        time.sleep(min(1.0, seconds / 4))
+        steps0 = _total_steps(sync)
+        start = time.perf_counter()
+        time.sleep(seconds)
+        steps1 = _total_steps(sync)
+        elapsed = time.perf_counter() - start
+        sync.shutdown(timeout=5.0)
+    return (steps1 - steps0) / elapsed
+
+
+def autotune_agents(
+    measure: Callable[[int], float],
+    candidates: Sequence[int],
+    tolerance: float = 0.05,
+) -> Tuple[int, Dict[int, float]]:
+    """Pick the agent count with the best measured throughput.
+
+    Counts within `tolerance` of the best are considered equal and the
+    smallest one wins (fewer threads, less memory, same throughput).
+    Stops early once throughput falls clearly below the best so far.
+    """
+    rates: Dict[int, float] = {}
+    best = None
+    for n in sorted(candidates):
+        rates[n] = measure(n)
+        print(f"[autotune] agents={n} steps/s={rates[n]:.2f}")
+        if best is None or rates[n] > rates[best]:
+            best = n
+        elif rates[n] < rates[best] * (1.0 - 2 * tolerance):
+            break
+    peak = rates[best]
+    chosen = min(n for n, rate in rates.items() if rate >= peak * (1.0 - tolerance))
+    return chosen, rates
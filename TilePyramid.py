@@ -0,0 +1,189 @@
+"""
+Incremental Deep Zoom tile-pyramid export of a canvas.
+
+Layout (Deep Zoom / DZI, as read by OpenSeadragon and the Tk slideshow):
+
+    <name>.dzi                      XML: tile size, overlap 0, format, size
+    <name>_files/<level>/<col>_<row>.png
+
+Level `max_level` = ceil(log2(max(W, H))) is full resolution; each level
+below halves both sides (rounding up) down to a single pixel at level 0.
+
+Only tiles whose pixels changed are re-encoded. The canvas records which
+DIRTY_BLOCK-sized blocks were written since the last export
+(Canvas.consume_dirty); those map to full-resolution tiles, and a dirty tile
+dirties its parent on every level above it. A parent tile is rebuilt from
+its (at most four) child tiles as just written, so export cost per age is
+proportional to the changed area times the number of levels, not to the
+canvas size. Tiles are replaced atomically, so a viewer never reads a
+partially written file.
+"""
+
+import math
+import os
+import xml.etree.ElementTree as ET
+from typing import Dict, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image
+
+from Canvas import DIRTY_BLOCK
+
+DZI_NAMESPACE = "http://schemas.microsoft.com/deepzoom/2008"
+DEFAULT_TILE_SIZE = 256
+
+
+def num_levels(width: int, height: int) -> int:
+    return int(math.ceil(math.log2(max(width, height, 1)))) + 1
+
+
+def level_size(width: int, height: int, level: int, max_level: int) -> Tuple[int, int]:
+    scale = 2 ** (max_level - level)
+    return max(1, -(-width // scale)), max(1, -(-height // scale))
+
+
+def _downsample(pixels: np.ndarray) -> np.ndarray:
+    """Halve both sides (rounding up) with a 2x2 box filter."""
+    h, w = pixels.shape[:2]
+    if h % 2 or w % 2:
+        pixels = np.pad(pixels, ((0, h % 2), (0, w % 2), (0, 0)), mode="edge")
+    total = pixels[0::2, 0::2].astype(np.uint16)
+    total += pixels[1::2, 0::2]
+    total += pixels[0::2, 1::2]
+    total += pixels[1::2, 1::2]
+    total += 2
+    total >>= 2
+    return total.astype(np.uint8)
+
+
+class TilePyramidExporter:
+    """Writes a canvas as a Deep Zoom pyramid, re-encoding dirty tiles only."""
+
+    def __init__(self, directory: str, tile_size: int = DEFAULT_TILE_SIZE, name: str = "canvas"):
+        self.directory = directory
+        self.tile_size = tile_size
+        self.name = name
+        self.size: Optional[Tuple[int, int]] = None
+        self.last_stats: Dict[str, int] = {}
+
+    @property
+    def dzi_path(self) -> str:
+        return os.path.join(self.directory, f"{self.name}.dzi")
+
+    def tile_path(self, level: int, col: int, row: int) -> str:
+        return os.path.join(self.directory, f"{self.name}_files", str(level), f"{col}_{row}.png")
+
+    def _write_dzi(self, width: int, height: int):
+        root = ET.Element(
+            "Image", TileSize=str(self.tile_size), Overlap="0", Format="png", xmlns=DZI_NAMESPACE
+        )
+        ET.SubElement(root, "Size", Width=str(width), Height=str(height))
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.dzi_path}.tmp.{os.getpid()}"
+        ET.ElementTree(root).write(tmp_path, xml_declaration=True, encoding="utf-8")
+        os.replace(tmp_path, self.dzi_path)
+
+    def _save_tile(self, level: int, col: int, row: int, pixels: np.ndarray):
+        path = self.tile_path(level, col, row)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}.png"
+        Image.fromarray(pixels, mode="RGB").save(tmp_path, compress_level=1)
+        os.replace(tmp_path, path)
+
+    def _load_tile(self, level: int, col: int, row: int) -> np.ndarray:
+        with Image.open(self.tile_path(level, col, row)) as image:
+            return np.asarray(image.convert("RGB"))
+
+    def _dirty_tiles(self, dirty_blocks: np.ndarray, width: int, height: int) -> Set[Tuple[int, int]]:
+        ts = self.tile_size
+        tiles = set()
+        for by, bx in zip(*np.nonzero(dirty_blocks)):
+            x0, y0 = int(bx) * DIRTY_BLOCK, int(by) * DIRTY_BLOCK
+            x1, y1 = min(width, x0 + DIRTY_BLOCK) - 1, min(height, y0 + DIRTY_BLOCK) - 1
+            for row in range(y0 // ts, y1 // ts + 1):
+                for col in range(x0 // ts, x1 // ts + 1):
+                    tiles.add((col, row))
+        return tiles
+
+    def export(self, canvas) -> Dict[str, int]:
+        """Bring the pyramid up to date with `canvas`; returns counts of
+        tiles written (total and at full resolution)."""
+        snapshot = canvas.snapshot()
+        width, height = snapshot.width, snapshot.height
+        dirty_blocks = canvas.consume_dirty()
+        if self.size != (width, height) or not os.path.exists(self.dzi_path):
+            self._write_dzi(width, height)
+            self.size = (width, height)
+            dirty_blocks = np.ones_like(dirty_blocks)
+
+        ts = self.tile_size
+        max_level = num_levels(width, height) - 1
+        tiles = self._dirty_tiles(dirty_blocks, width, height)
+        written = 0
+        full_res = len(tiles)
+        for col, row in tiles:
+            self._save_tile(max_level, col, row, np.asarray(snapshot.read(col * ts, row * ts, ts, ts)))
+        written += len(tiles)
+
+        for level in range(max_level - 1, -1, -1):
+            tiles = {(col // 2, row // 2) for col, row in tiles}
+            child_w, child_h = level_size(width, height, level + 1, max_level)
+            for col, row in tiles:
+                # Children (2col..2col+1, 2row..2row+1) at level + 1.
+                rows = []
+                for child_row in (2 * row, 2 * row + 1):
+                    if child_row * ts >= child_h:
+                        continue
+                    parts = [
+                        self._load_tile(level + 1, child_col, child_row)
+                        for child_col in (2 * col, 2 * col + 1)
+                        if child_col * ts < child_w
+                    ]
+                    rows.append(np.concatenate(parts, axis=1))
+                self._save_tile(level, col, row, _downsample(np.concatenate(rows, axis=0)))
+            written += len(tiles)
+
+        self.last_stats = {"tiles_written": written, "full_res_tiles": full_res, "levels": max_level + 1}
+        return self.last_stats
+
+
+# ---------------------------------------------------------------- reading
+
+
+def read_dzi(path: str) -> dict:
+    """{width, height, tile_size, format, files_dir, max_level} of a .dzi file."""
+    root = ET.parse(path).getroot()
+    size = root.find(f"{{{DZI_NAMESPACE}}}Size")
+    if size is None:
+        size = root.find("Size")
+    width, height = int(size.get("Width")), int(size.get("Height"))
+    base, _ = os.path.splitext(path)
+    return {
+        "width": width,
+        "height": height,
+        "tile_size": int(root.get("TileSize")),
+        "format": root.get("Format", "png"),
+        "files_dir": f"{base}_files",
+        "max_level": num_levels(width, height) - 1,
+    }
+
+
+def load_level_image(path: str, max_w: int, max_h: int) -> Tuple[Image.Image, int]:
+    """Stitch the largest pyramid level that fits in max_w x max_h (decoding
+    only that level's tiles); returns (image, level)."""
+    info = read_dzi(path)
+    width, height, ts, max_level = info["width"], info["height"], info["tile_size"], info["max_level"]
+    level = max_level
+    while level > 0:
+        w, h = level_size(width, height, level, max_level)
+        if (max_w <= 0 or w <= max_w) and (max_h <= 0 or h <= max_h):
+            break
+        level -= 1
+    w, h = level_size(width, height, level, max_level)
+    image = Image.new("RGB", (w, h))
+    for row in range(-(-h // ts)):
+        for col in range(-(-w // ts)):
+            tile_path = os.path.join(info["files_dir"], str(level), f"{col}_{row}.{info['format']}")
+            with Image.open(tile_path) as tile:
+                image.paste(tile.convert("RGB"), (col * ts, row * ts))
+    return image, level
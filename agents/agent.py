@@ -1,31 +1,62 @@
 from agents.proposal import Proposal
 from agents.pipeline import PipelineConfig, DiffusionPromptPipeline
 from agents.prompt_generator import PromptGenerator
+from agents.timing import StageTimings
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
 from PIL import Image
 import numpy as np
 
+
+@dataclass
+class StepWork:
+    """One FOV snapshot on its way through the agent stages."""
+    fov_np: np.ndarray
+    fov_image: Image.Image
+    fov_origin: Tuple[int, int]
+    canvas_version: int
+    label: Optional[str] = None
+    generated: Optional[Any] = None
+
+
 class Agent:
-    def __init__(self, state, model=None, pipeline_config=None):
+    def __init__(self, state, model=None, pipeline_config=None, prompt_generator=None, diffuser=None):
         self.state = state
         self.model = model
         self.pipeline_config = pipeline_config or PipelineConfig()
-        self.prompt_generator = PromptGenerator(device=self.pipeline_config.evaluator_device)
-        self.diffuser = DiffusionPromptPipeline(self.pipeline_config)
+        # Backends can be injected (fakes for benchmarks/tests); otherwise the
+        # real ViT classifier and aMUSEd diffuser are used.
+        self.prompt_generator = prompt_generator or PromptGenerator(
+            device=self.pipeline_config.evaluator_device,
+            local_files_only=self.pipeline_config.local_files_only,
+        )
+        self.diffuser = diffuser or DiffusionPromptPipeline(self.pipeline_config)
         self._logged_sizes = False
+        # Per-stage latency histograms; each stage is written by one thread
+        # (the agent's worker, or its stage worker under StagedExecutor).
+        self.timings = StageTimings(owner=str(state.agent_id))
+
+    def _blend_last_guess(self, fov_image: Image.Image) -> Image.Image:
+        if self.state.last_guess is None:
+            return fov_image
+        last_guess = self.state.last_guess
+        if last_guess.size != fov_image.size:
+            last_guess = last_guess.resize(fov_image.size, resample=Image.LANCZOS)
+        return Image.blend(fov_image, last_guess, alpha=0.5)
 
     def _classify(self, fov_image: Image.Image) -> str:
-        if self.state.last_guess is not None:
-            last_guess = self.state.last_guess
-            if last_guess.size != fov_image.size:
-                last_guess = last_guess.resize(fov_image.size, resample=Image.LANCZOS)
-            fov_image = Image.blend(fov_image, last_guess, alpha=0.5)
+        fov_image = self._blend_last_guess(fov_image)
         return self.prompt_generator.generate_prompt_from_image(fov_image)
 
+    def _diff(self, fov_np, gen_np):
+        return np.linalg.norm(fov_np.astype(np.float32) - gen_np.astype(np.float32), axis=2)
+
     def _diff_to_proposals(self, fov_np, gen_np, fov_origin, canvas_version):
         if fov_np.size == 0 or gen_np.size == 0:
             return []
+        return self._build_proposals(self._diff(fov_np, gen_np), gen_np, fov_origin, canvas_version)
 
-        diff = np.linalg.norm(fov_np.astype(np.float32) - gen_np.astype(np.float32), axis=2)
+    def _build_proposals(self, diff, gen_np, fov_origin, canvas_version):
         flat = diff.reshape(-1)
         top_x = min(self.state.top_x_proposals, flat.shape[0])
         if top_x <= 0:
@@ -54,38 +85,76 @@ class Agent:
 
         return proposals
 
-    def step(self, fov, fov_origin, canvas_version):
+    def prepare(self, fov, fov_origin, canvas_version):
+        """Stage 0: wrap a FOV snapshot into a StepWork (None if empty)."""
         if fov is None or len(fov) == 0:
-            return []
-
-        fov_np = np.array(fov, dtype=np.uint8)
-        fov_image = Image.fromarray(fov_np, mode="RGB")
+            return None
+        with self.timings.time("fov_array", age=canvas_version):
+            fov_np = np.array(fov, dtype=np.uint8)
+            fov_image = Image.fromarray(fov_np, mode="RGB")
+        return StepWork(fov_np, fov_image, fov_origin, canvas_version)
 
+    def classify_stage(self, work):
+        """Stage 1: blend with the last guess and classify (ViT)."""
+        timings = self.timings
         if self.state.verbose:
             print(f"[worker {self.state.agent_id}] before classifier")
-        label = self._classify(fov_image)
+        with timings.time("blend", age=work.canvas_version):
+            classifier_input = self._blend_last_guess(work.fov_image)
+        with timings.time("classify", age=work.canvas_version):
+            work.label = self.prompt_generator.generate_prompt_from_image(classifier_input)
+        return work
 
+    def diffuse_stage(self, work):
+        """Stage 2: generate an image for the label and fit it to the FOV."""
+        timings = self.timings
         if self.state.verbose:
-            print(f"[worker {self.state.agent_id}] before diffuser: label={label}")
-        generated = self.diffuser.generate(label)
+            print(f"[worker {self.state.agent_id}] before diffuser: label={work.label}")
+        with timings.time("diffuse", age=work.canvas_version):
+            if self.pipeline_config.diffusion_mode == "img2img":
+                generated = self.diffuser.generate(work.label, init_image=work.fov_image)
+            else:
+                generated = self.diffuser.generate(work.label)
         if self.state.verbose:
             print(f"[worker {self.state.agent_id}] before resize")
-        generated = generated.resize(fov_image.size, resample=Image.LANCZOS).convert("RGB")
+        with timings.time("resize", age=work.canvas_version):
+            generated = generated.resize(work.fov_image.size, resample=Image.LANCZOS).convert("RGB")
 
         self.state.last_guess = generated
         if not self._logged_sizes and self.state.verbose:
             print(
-                f"[worker {self.state.agent_id}] fov={fov_image.size}, "
+                f"[worker {self.state.agent_id}] fov={work.fov_image.size}, "
                 f"generated={generated.size}"
             )
             self._logged_sizes = True
+        work.generated = generated
+        return work
 
+    def evaluate_stage(self, work):
+        """Stage 3: diff generated vs. FOV and turn the top pixels into proposals."""
+        timings = self.timings
         if self.state.verbose:
             print(f"[worker {self.state.agent_id}] before eval")
-        gen_np = np.array(generated, dtype=np.uint8)
-        proposals = self._diff_to_proposals(fov_np, gen_np, fov_origin, canvas_version)
+        fov_np = work.fov_np
+        with timings.time("diff", age=work.canvas_version):
+            gen_np = np.array(work.generated, dtype=np.uint8)
+            diff = self._diff(fov_np, gen_np)
+            self.state.last_diff = float(diff.mean()) if diff.size else 0.0
+        with timings.time("proposals", age=work.canvas_version):
+            if fov_np.size == 0 or gen_np.size == 0:
+                proposals = []
+            else:
+                proposals = self._build_proposals(diff, gen_np, work.fov_origin, work.canvas_version)
         if self.state.verbose:
             print(f"[worker {self.state.agent_id}] after eval")
         if self.state.verbose:
             print(f"[worker {self.state.agent_id}] proposals={len(proposals)}")
         return proposals
+
+    def step(self, fov, fov_origin, canvas_version):
+        work = self.prepare(fov, fov_origin, canvas_version)
+        if work is None:
+            return []
+        work = self.classify_stage(work)
+        work = self.diffuse_stage(work)
+        return self.evaluate_stage(work)
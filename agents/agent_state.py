@@ -11,4 +11,5 @@ class AgentState:
     slice_bounds: Tuple[int, int, int, int] = (0, 0, 0, 0)
     last_guess: Optional[Any] = None
     top_x_proposals: int = 3000
+    last_diff: float = 0.0          # mean per-pixel diff of the last step
     verbose: bool = False
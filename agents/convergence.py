@@ -0,0 +1,186 @@
+"""
+Convergence statistics and stop criteria for a run.
+
+ConvergenceTracker is fed by the merge thread after every merge (the same
+per-pixel |RGB change| the region scheduler uses) and keeps, over the last
+`window` ages:
+
+    mean_change       mean |change| per channel of the merged pixels, per
+                      merge and averaged over the window
+    touched_fraction  fraction of the canvas changed at least once
+                      (counted on blocks of `block` pixels, 1 unless the
+                      canvas is huge)
+
+and, on a grid of `cell`-pixel regions, the last age at which each region
+changed by more than `quiet_change` per channel on average. A window whose
+regions have all been quiet for `window` ages is converged: its agent can
+sleep until a neighbour's merges wake the region up again.
+
+StopCriteria turns these into a reason to end the run: hard limits (age,
+seconds) and convergence (change and touched fraction below thresholds,
+over a full window), or every agent asleep.
+"""
+
+import math
+import time
+from collections import deque
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+Bounds = Tuple[int, int, int, int]  # (x0, x1, y0, y1), as in Synchronizer.agent_bounds
+
+# Upper bound on the touched-block grid (entries), so huge canvases stay cheap.
+MAX_TOUCH_BLOCKS = 1 << 22
+
+
+class ConvergenceTracker:
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        window: int = 32,
+        cell: int = 32,
+        quiet_change: float = 1.0,
+        start_age: int = 0,
+    ):
+        self.width = width
+        self.height = height
+        self.window = window
+        self.cell = cell
+        self.quiet_change = quiet_change
+        self.block = max(1, math.ceil(math.sqrt(width * height / MAX_TOUCH_BLOCKS)))
+        self._touch_cols = math.ceil(width / self.block)
+        self._touch_counts = np.zeros(math.ceil(height / self.block) * self._touch_cols, dtype=np.int32)
+        self._touched_blocks = 0
+        self._recent_touched = deque()
+        self._recent_change = deque()
+        self._change_sum = 0.0
+        self.cells = (math.ceil(height / cell), math.ceil(width / cell))
+        # Regions count as active at the start, so nothing sleeps before
+        # it has been looked at for a full window.
+        self.last_active = np.full(self.cells, start_age, dtype=np.int64)
+        self.age = start_age
+        self.merges = 0
+        self.mean_change = 0.0
+
+    def observe_merge(self, xs, ys, delta, age: int):
+        """Fold one merge in (merge thread). delta: summed |RGB change| per pixel."""
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        delta = np.asarray(delta, dtype=np.float64)
+        self.age = age
+        self.merges += 1
+        self.mean_change = float(delta.mean() / 3.0) if delta.size else 0.0
+        self._recent_change.append(self.mean_change)
+        self._change_sum += self.mean_change
+
+        changed = delta > 0
+        blocks = np.unique((ys[changed] // self.block) * self._touch_cols + xs[changed] // self.block)
+        self._touch_counts[blocks] += 1
+        self._touched_blocks += int(np.count_nonzero(self._touch_counts[blocks] == 1))
+        self._recent_touched.append(blocks)
+        while len(self._recent_touched) > self.window:
+            old = self._recent_touched.popleft()
+            self._touch_counts[old] -= 1
+            self._touched_blocks -= int(np.count_nonzero(self._touch_counts[old] == 0))
+            self._change_sum -= self._recent_change.popleft()
+
+        if delta.size:
+            cells = (ys // self.cell) * self.cells[1] + xs // self.cell
+            size = self.cells[0] * self.cells[1]
+            total = np.bincount(cells, weights=delta, minlength=size)
+            count = np.bincount(cells, minlength=size)
+            active = total > self.quiet_change * 3.0 * np.maximum(count, 1)
+            self.last_active.reshape(-1)[active] = age
+
+    @property
+    def window_full(self) -> bool:
+        return len(self._recent_change) >= self.window
+
+    @property
+    def window_mean_change(self) -> float:
+        # Running sum: also read by the metrics thread while merges append.
+        return self._change_sum / max(1, len(self._recent_change))
+
+    @property
+    def touched_fraction(self) -> float:
+        return self._touched_blocks / self._touch_counts.size
+
+    def region_converged(self, bounds: Bounds) -> bool:
+        """True if every region under `bounds` has been quiet for a window."""
+        x0, x1, y0, y1 = bounds
+        if x1 <= x0 or y1 <= y0:
+            return True
+        c = self.cell
+        last = self.last_active[y0 // c: (y1 - 1) // c + 1, x0 // c: (x1 - 1) // c + 1]
+        return int(last.max()) <= self.age - self.window
+
+    def converged_fraction(self) -> float:
+        """Fraction of regions quiet for a full window."""
+        return float(np.mean(self.last_active <= self.age - self.window))
+
+    def snapshot(self) -> dict:
+        return {
+            "age": self.age,
+            "merges": self.merges,
+            "mean_change": self.mean_change,
+            "window_mean_change": self.window_mean_change,
+            "touched_fraction": self.touched_fraction,
+            "converged_regions": self.converged_fraction(),
+        }
+
+
+class StopCriteria:
+    def __init__(
+        self,
+        max_age: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+        min_change: Optional[float] = None,
+        min_touched: Optional[float] = None,
+        stop_when_idle: bool = True,
+    ):
+        """
+        Args:
+            max_age, max_seconds: Hard limits (None or 0: no limit)
+            min_change: Converged once the window's mean change per merged
+                pixel and channel drops below this (None or 0: ignored)
+            min_touched: Converged once less than this fraction of the
+                canvas changed during the window (None or 0: ignored)
+            stop_when_idle: Stop once every agent sleeps on a converged region
+        """
+        self.max_age = max_age
+        self.max_seconds = max_seconds
+        self.min_change = min_change
+        self.min_touched = min_touched
+        self.stop_when_idle = stop_when_idle
+        self.started = time.monotonic()
+
+    def check(
+        self, tracker: ConvergenceTracker, age: int, sleeping: Iterable = ()
+    ) -> Optional[str]:
+        """Reason to stop now, or None to keep going."""
+        return self.limit_reached(age) or self.converged(tracker, sleeping)
+
+    def limit_reached(self, age: int) -> Optional[str]:
+        """Reason if a hard limit (age, seconds) was hit."""
+        if self.max_age and age >= self.max_age:
+            return f"age limit {self.max_age} reached"
+        if self.max_seconds and time.monotonic() - self.started >= self.max_seconds:
+            return f"time limit {self.max_seconds:g}s reached"
+        return None
+
+    def converged(self, tracker: ConvergenceTracker, sleeping: Iterable = ()) -> Optional[str]:
+        """Reason if the canvas (or every agent's region) converged."""
+        if (self.min_change or self.min_touched) and tracker is not None and tracker.window_full:
+            change = tracker.window_mean_change
+            touched = tracker.touched_fraction
+            if (not self.min_change or change < self.min_change) and (
+                not self.min_touched or touched < self.min_touched
+            ):
+                return (
+                    f"converged: mean change {change:.3f} and {100.0 * touched:.2f}% "
+                    f"of the canvas touched over the last {tracker.window} ages"
+                )
+        if self.stop_when_idle and sleeping and all(sleeping):
+            return "converged: every agent is idle"
+        return None
@@ -1,15 +1,19 @@
 import numpy as np
-import torch
-from agents.classifier.vit_extractor import ViTFeatureExtractor
 
 class ImageDifference:
     def __init__(self, device="cpu"):
+        # Deferred so importing agents.evaluator (e.g. for generate_proposals)
+        # does not pull in torch/transformers.
+        from agents.classifier.vit_extractor import ViTFeatureExtractor
+
         self.extractor = ViTFeatureExtractor(device=device)
 
     def compute_patch_difference(self, img_a: np.ndarray, img_b: np.ndarray):
         """
         Returns per-patch difference scores using ViT features
         """
+        import torch
+
         feat_a, attn_a = self.extractor.extract_with_attention(img_a)
         feat_b, attn_b = self.extractor.extract_with_attention(img_b)
 
@@ -1,7 +1,7 @@
 import numpy as np
 from PIL import Image
 from agents.evaluator.difference import ImageDifference
-from agents.evaluator.proposals import generate_proposals
+from agents.evaluator.proposals import dense_proposals, generate_proposals
 
 class Evaluator:
     def __init__(self, device="cpu"):
@@ -31,3 +31,27 @@ class Evaluator:
         )
 
         return proposals
+
+    def evaluate_dense(
+        self,
+        current_canvas_img: Image.Image,
+        generated_img: Image.Image,
+        top_x: int
+    ):
+        """
+        Returns (xs, ys, rgb, confidence) arrays: every changed pixel of
+        the top_x most different patches (see dense_proposals)
+        """
+        current_np = np.array(current_canvas_img)
+        generated_np = np.array(generated_img)
+
+        diff_scores = self.diff_engine.compute_patch_difference(
+            current_np, generated_np
+        )
+
+        return dense_proposals(
+            diff_scores,
+            current_np,
+            generated_np,
+            top_x
+        )
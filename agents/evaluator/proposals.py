@@ -4,6 +4,10 @@ from typing import List, Tuple
 rgb = Tuple[int, int, int]
 Proposal = Tuple[int, int, rgb]
 
+# Parallel arrays, as ProposalBatch: xs, ys (n,), rgb (n, 3) uint8, confidence (n,) float32
+DenseProposals = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
 def patch_to_pixel_coords(
     patch_idx: int,
     image_width: int,
@@ -27,6 +31,19 @@ def extract_pixel_color(image: np.ndarray, x: int, y: int) -> rgb:
     return int(r), int(g), int(b)
 
 
+def top_patches(scores: np.ndarray, top_x: int) -> np.ndarray:
+    """
+    Indices of the top_x highest scores, in ascending score order.
+    O(n) selection (argpartition), then only the selected k are sorted.
+    """
+    scores = np.asarray(scores).reshape(-1)
+    top_x = min(top_x, scores.shape[0])
+    if top_x <= 0:
+        return np.zeros(0, dtype=np.intp)
+    selected = np.argpartition(scores, -top_x)[-top_x:]
+    return selected[np.argsort(scores[selected], kind="stable")]
+
+
 def generate_proposals(
     diff_scores: np.ndarray,
     current_img: np.ndarray,
@@ -36,14 +53,129 @@ def generate_proposals(
     """
     Select top-X most different patches and create pixel proposals
     """
-    indices = np.argsort(diff_scores)[-top_x:]
+    indices = top_patches(diff_scores, top_x)
 
-    proposals = []
     h, w, _ = current_img.shape
+    patch_size = 16
+    patches_per_row = w // patch_size
+    xs = (indices % patches_per_row) * patch_size + patch_size // 2
+    ys = (indices // patches_per_row) * patch_size + patch_size // 2
+
+    gh, gw = generated_img.shape[:2]
+    cols = generated_img[np.clip(ys, 0, gh - 1), np.clip(xs, 0, gw - 1)]
+
+    return [
+        (x, y, (r, g, b))
+        for x, y, (r, g, b) in zip(xs.tolist(), ys.tolist(), cols.tolist())
+    ]
+
+
+def patch_scores_from_heatmap(heatmap: np.ndarray, patch_size: int = 16) -> np.ndarray:
+    """
+    Mean of a pixel heatmap (e.g. LocalEvaluator.evaluate) over each
+    patch_size square, as a (rows, cols) grid. Edge patches may be partial.
+    """
+    heatmap = np.asarray(heatmap, dtype=np.float64)
+    h, w = heatmap.shape
+    row_starts = np.arange(0, h, patch_size)
+    col_starts = np.arange(0, w, patch_size)
+    sums = np.add.reduceat(np.add.reduceat(heatmap, row_starts, axis=0), col_starts, axis=1)
+    heights = np.diff(np.append(row_starts, h))
+    widths = np.diff(np.append(col_starts, w))
+    return sums / np.outer(heights, widths)
+
+
+def _patch_grid(num_patches: int, h: int, w: int, patch_size: int) -> Tuple[int, int, bool]:
+    """(rows, cols, stretched) of per-patch scores for an h x w image."""
+    rows, cols = h // patch_size, w // patch_size
+    if rows * cols == num_patches:
+        return rows, cols, False
+    # Scores of a fixed-size model input (ViT: 14x14 at 224px) for an image
+    # of another size: stretch the square grid over the image.
+    side = int(round(np.sqrt(num_patches)))
+    if side * side != num_patches:
+        raise ValueError(
+            f"{num_patches} patch scores do not fit a {h}x{w} image with {patch_size}px patches"
+        )
+    return side, side, True
+
+
+def dense_proposals(
+    saliency: np.ndarray,
+    current_img: np.ndarray,
+    generated_img: np.ndarray,
+    top_x: int,
+    patch_size: int = 16,
+) -> DenseProposals:
+    """
+    Propose every changed pixel inside the top-X most salient patches.
+
+    Args:
+        saliency: Per-patch scores (n,) as ImageDifference.compute_patch_difference,
+            or a pixel heatmap (H, W) as LocalEvaluator.evaluate
+        current_img, generated_img: (H, W, 3) uint8 images of the same size
+        top_x: Number of patches to select
+        patch_size: Patch side in pixels
+
+    Returns:
+        (xs, ys, rgb, confidence) in image coordinates. rgb is the generated
+        colour; confidence is the patch score relative to the best selected
+        patch times the pixel's RGB difference relative to the largest one.
+        Pixels the generated image does not change are left out.
+    """
+    current = np.asarray(current_img)
+    generated = np.asarray(generated_img)
+    if current.shape != generated.shape:
+        raise ValueError(f"image shapes differ: {current.shape} vs {generated.shape}")
+    h, w = current.shape[:2]
+
+    scores = np.asarray(saliency, dtype=np.float64)
+    if scores.ndim == 2:
+        if scores.shape != (h, w):
+            raise ValueError(f"heatmap shape {scores.shape} does not match the {h}x{w} image")
+        scores = patch_scores_from_heatmap(scores, patch_size)
+        rows, cols = scores.shape
+        stretched = False
+    else:
+        rows, cols, stretched = _patch_grid(scores.size, h, w, patch_size)
+    scores = scores.reshape(-1)
+
+    selected = top_patches(scores, top_x)
+    if selected.size == 0 or h == 0 or w == 0:
+        return (
+            np.zeros(0, dtype=np.intp),
+            np.zeros(0, dtype=np.intp),
+            np.zeros((0, 3), dtype=np.uint8),
+            np.zeros(0, dtype=np.float32),
+        )
+
+    # Patch index of every pixel. A grid built on the image has patch_size
+    # squares (pixels past the last full patch of an h // patch_size grid
+    # join it); a model's fixed grid is stretched over the image.
+    if stretched:
+        patch_row = (np.arange(h) * rows) // h
+        patch_col = (np.arange(w) * cols) // w
+    else:
+        patch_row = np.minimum(np.arange(h) // patch_size, rows - 1)
+        patch_col = np.minimum(np.arange(w) // patch_size, cols - 1)
+    patch_of = (patch_row[:, None] * cols + patch_col[None, :]).ravel()
+
+    chosen = np.zeros(scores.size, dtype=bool)
+    chosen[selected] = True
+    # |generated - current| without a signed copy of each image.
+    diff = np.maximum(generated, current)
+    diff -= np.minimum(generated, current)
+    diff = diff.astype(np.int16)
+    diff = (diff[..., 0] + diff[..., 1] + diff[..., 2]).ravel()
 
-    for idx in indices:
-        x, y = patch_to_pixel_coords(idx, w)
-        col = extract_pixel_color(generated_img, x, y)
-        proposals.append((x, y, col))
+    # Flat indices and np.take: much cheaper than 2-D fancy indexing.
+    flat = np.flatnonzero(chosen[patch_of] & (diff > 0))
+    ys, xs = np.divmod(flat, w)
 
-    return proposals
+    best = scores[selected[-1]]
+    patch_weight = scores[patch_of[flat]] / best if best > 0 else np.ones(len(flat))
+    pixel_diff = diff[flat]
+    pixel_weight = pixel_diff / pixel_diff.max() if len(pixel_diff) else pixel_diff
+    confidence = (np.clip(patch_weight, 0.0, 1.0) * pixel_weight).astype(np.float32)
+    rgb = np.take(generated.reshape(-1, 3), flat, axis=0).astype(np.uint8, copy=False)
+    return xs, ys, rgb, confidence
@@ -0,0 +1,117 @@
+"""
+Tests for patch selection and dense proposals in agents/evaluator/proposals.py
+(numpy only, no ViT weights).
+"""
+
+import numpy as np
+
+from agents.evaluator.proposals import (
+    dense_proposals,
+    generate_proposals,
+    patch_scores_from_heatmap,
+    patch_to_pixel_coords,
+    top_patches,
+)
+
+
+def _images(size=64, seed=0):
+    rng = np.random.default_rng(seed)
+    current = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    generated = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    return current, generated
+
+
+def test_top_patches_matches_argsort():
+    scores = np.random.default_rng(0).random(196)
+    for top_x in (1, 5, 196, 500):
+        assert np.array_equal(top_patches(scores, top_x), np.argsort(scores)[-top_x:])
+    assert top_patches(scores, 0).size == 0
+
+
+def test_generate_proposals_unchanged():
+    current, generated = _images(224)
+    scores = np.random.default_rng(1).random(196)
+    proposals = generate_proposals(scores, current, generated, top_x=10)
+    expected = []
+    for idx in np.argsort(scores)[-10:]:
+        x, y = patch_to_pixel_coords(idx, 224)
+        expected.append((x, y, tuple(int(v) for v in generated[y, x])))
+    assert proposals == expected
+
+
+def test_dense_proposals_cover_selected_patches():
+    current, generated = _images(64)
+    generated[:16, :16] = current[:16, :16]  # patch 0 unchanged
+    scores = np.zeros(16)
+    scores[[0, 5, 15]] = [3.0, 2.0, 1.0]
+    xs, ys, rgb, confidence = dense_proposals(scores, current, generated, top_x=3)
+
+    patches = set((ys // 16 * 4 + xs // 16).tolist())
+    assert patches == {5, 15}, "only changed pixels of selected patches"
+    assert len(xs) == 2 * 16 * 16
+    assert rgb.dtype == np.uint8 and np.array_equal(rgb, generated[ys, xs])
+    assert confidence.dtype == np.float32
+    assert 0 < confidence.min() and confidence.max() <= 1.0
+    # The lower-scored patch gets at most half the weight of the best one.
+    assert confidence[xs >= 48].max() <= 0.5 + 1e-6
+
+
+def test_dense_proposals_from_heatmap_and_stretched_grid():
+    current, generated = _images(64)
+    heatmap = np.zeros((64, 64))
+    heatmap[32:48, 16:32] = 1.0
+    xs, ys, _, _ = dense_proposals(heatmap, current, generated, top_x=1)
+    assert xs.min() == 16 and xs.max() == 31 and ys.min() == 32 and ys.max() == 47
+    assert patch_scores_from_heatmap(np.ones((40, 40))).shape == (3, 3)
+
+    # Sides that are not a multiple of the patch size: full 16px patches
+    # first, then a partial edge patch.
+    current, generated = _images(40)
+    heatmap = np.zeros((40, 40))
+    heatmap[:16, :16] = 1.0
+    xs, ys, _, _ = dense_proposals(heatmap, current, generated, top_x=1)
+    assert len(xs) == 16 * 16 and xs.max() == 15 and ys.max() == 15
+    heatmap = np.zeros((40, 40))
+    heatmap[32:, 32:] = 1.0
+    xs, ys, _, _ = dense_proposals(heatmap, current, generated, top_x=1)
+    assert len(xs) == 8 * 8 and xs.min() == 32 and ys.min() == 32
+
+    # Per-patch scores of a 40x40 image: 2x2 full patches, the remainder
+    # belongs to the last one.
+    xs, ys, _, _ = dense_proposals(np.array([1.0, 0, 0, 0]), current, generated, top_x=1)
+    assert len(xs) == 16 * 16 and xs.max() == 15 and ys.max() == 15
+    xs, ys, _, _ = dense_proposals(np.array([0, 0, 0, 1.0]), current, generated, top_x=1)
+    assert len(xs) == 24 * 24 and xs.min() == 16 and xs.max() == 39
+
+    # 196 ViT scores over a 64x64 FOV: one score per ~4.6px cell.
+    current, generated = _images(64)
+    scores = np.zeros(196)
+    scores[0] = 1.0
+    xs, ys, _, _ = dense_proposals(scores, current, generated, top_x=1)
+    assert xs.max() < 5 and ys.max() < 5 and len(xs) > 0
+
+
+def test_dense_proposals_edge_cases():
+    current, generated = _images(32)
+    xs, ys, rgb, confidence = dense_proposals(np.ones(4), current, current, top_x=4)
+    assert len(xs) == 0 and rgb.shape == (0, 3)
+    xs, _, _, _ = dense_proposals(np.ones(4), current, generated, top_x=0)
+    assert len(xs) == 0
+    # Zero saliency still ranks patches; every changed pixel is weighted by its diff.
+    xs, _, _, confidence = dense_proposals(np.zeros(4), current, generated, top_x=4)
+    assert len(xs) > 0 and confidence.max() == 1.0
+    try:
+        dense_proposals(np.ones(5), current, generated, top_x=1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError for a non-square score grid")
+
+
+if __name__ == "__main__":
+    test_top_patches_matches_argsort()
+    test_generate_proposals_unchanged()
+    test_dense_proposals_cover_selected_patches()
+    test_dense_proposals_from_heatmap_and_stretched_grid()
+    test_dense_proposals_edge_cases()
+    print("proposal tests passed")
@@ -0,0 +1,67 @@
+"""
+Model-free agent backend.
+
+HeuristicAgent is a drop-in for Agent (same constructor and step()) that
+needs no classifier or diffuser. One step evaluates every pixel of the FOV
+in a single vectorized pass: box-filter local mean/std over each pixel's
+extract_fov patch (perception.local_stats), then AgentModel.infer_field
+applies the agent's contrast, smoothness and edge biases. Every pixel whose
+colour would change is proposed, as one ProposalBatch.
+
+A 64x64 FOV takes about a millisecond on one CPU core, so this is for
+stress-testing the synchronizer and for GPU-free preview runs.
+"""
+
+import numpy as np
+
+from agents.model_interface import AgentModel
+from agents.perception import local_stats
+from agents.proposal import ProposalBatch
+from agents.timing import StageTimings
+
+
+class HeuristicAgent:
+    def __init__(self, state, model=None, pipeline_config=None, radius=2, seed=None):
+        """
+        Args:
+            state: AgentState
+            model: AgentModel (default: a new one)
+            pipeline_config: Accepted for agent_factory compatibility; unused
+            radius: Patch radius of the local statistics (as extract_fov)
+            seed: Seed of the noise Generator (default: drawn from np.random,
+                so a seeded run is reproducible)
+        """
+        self.state = state
+        self.model = model if isinstance(model, AgentModel) else AgentModel()
+        self.pipeline_config = pipeline_config
+        self.radius = radius
+        if seed is None:
+            seed = int(np.random.randint(2**31))
+        self.rng = np.random.default_rng(seed)
+        self.timings = StageTimings(owner=str(state.agent_id))
+
+    def step(self, fov, fov_origin, canvas_version):
+        if fov is None or len(fov) == 0:
+            return []
+        timings = self.timings
+        fov_np = np.asarray(fov, dtype=np.uint8)
+        with timings.time("local_stats", age=canvas_version):
+            mean, std = local_stats(fov_np, self.radius)
+        with timings.time("infer", age=canvas_version):
+            rgb, confidence = self.model.infer_field(fov_np, mean, std, self.state, self.rng)
+        with timings.time("proposals", age=canvas_version):
+            diff = np.abs(rgb.astype(np.int16) - fov_np).sum(axis=2)
+            self.state.last_diff = float(diff.mean()) if diff.size else 0.0
+            ys, xs = np.nonzero(diff)
+            x0, y0 = fov_origin
+            batch = ProposalBatch(
+                agent_id=self.state.agent_id,
+                xs=xs + x0,
+                ys=ys + y0,
+                rgb=rgb[ys, xs],
+                confidence=confidence[ys, xs],
+                canvas_version=canvas_version,
+            )
+        if self.state.verbose:
+            print(f"[worker {self.state.agent_id}] proposals={len(batch)}")
+        return batch
@@ -41,3 +41,42 @@ class AgentModel(ModelInterface):
         confidence = max(0.0, min(1.0, 0.6 - 0.3 * temperature))
 
         return (r, g, b), confidence
+
+    def infer_field(self, fov, mean, std, agent_state, rng=None):
+        """
+        Vectorized infer() for every pixel of a FOV at once.
+
+        Args:
+            fov: numpy array of shape (H, W, 3), the current pixels
+            mean, std: (H, W, 3) mean colour and (H, W) luminance std of
+                each pixel's patch (perception.local_stats)
+            agent_state: AgentState object with agent attributes
+            rng: numpy Generator for the temperature noise
+
+        Each pixel's target is infer()'s colour for its patch (contrast-biased
+        mean plus temperature noise). bias_smoothness sets how far a pixel
+        moves towards it; bias_edge keeps pixels on edges (high local std)
+        where they are.
+
+        Returns:
+            (rgb, confidence): (H, W, 3) uint8 and (H, W) float32
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        contrast = max(0.0, min(1.0, float(agent_state.bias_contrast)))
+        smoothness = max(0.0, min(1.0, float(agent_state.bias_smoothness)))
+        edge_bias = max(0.0, min(1.0, float(agent_state.bias_edge)))
+        temperature = max(0.0, float(agent_state.temperature))
+
+        target = 128.0 + (mean - 128.0) * (1.0 + 0.5 * contrast)
+        if temperature > 0.0:
+            target += rng.standard_normal(fov.shape, dtype=np.float32) * (25.0 * temperature)
+
+        # Edge strength in [0, 1]: local std relative to a hard edge.
+        edge = np.minimum(std / 64.0, 1.0)
+        keep = edge_bias * edge
+        pull = (smoothness * (1.0 - keep))[..., None]
+        rgb = fov + pull * (target - fov)
+        np.clip(rgb, 0, 255, out=rgb)
+
+        confidence = max(0.0, min(1.0, 0.6 - 0.3 * temperature)) * (1.0 - 0.5 * keep)
+        return rgb.astype(np.uint8), confidence.astype(np.float32)
@@ -10,3 +10,50 @@ def extract_fov(canvas: np.ndarray, x: int, y: int, radius: int):
     y0 = max(0, y - radius)
     y1 = min(h, y + radius + 1)
     return canvas[y0:y1, x0:x1]
+
+
+def _window_sum(values: np.ndarray, radius: int, axis: int):
+    """Clipped (2*radius+1) window sums along axis 0 or 1, from prefix sums
+    padded with their first/last value so every window is a plain slice."""
+    if axis == 1:
+        total, count = _window_sum(values.swapaxes(0, 1), radius, 0)
+        return total.swapaxes(0, 1), count
+    n = values.shape[0]
+    prefix = np.empty((n + 2 * radius + 1,) + values.shape[1:], dtype=np.int64)
+    prefix[: radius + 1] = 0
+    np.cumsum(values, axis=0, out=prefix[radius + 1: radius + 1 + n])
+    prefix[radius + 1 + n:] = prefix[radius + n]
+    idx = np.arange(n)
+    count = np.minimum(idx + radius + 1, n) - np.maximum(idx - radius, 0)
+    return prefix[2 * radius + 1:] - prefix[:n], count
+
+
+def box_sum(values: np.ndarray, radius: int):
+    """
+    Sum of integer `values` (H, W, ...) over the (2*radius+1)^2 window
+    around every pixel, clipped at the borders like extract_fov, plus the
+    number of pixels in each clipped window. Separable prefix sums (exact,
+    int64), so the cost does not depend on the radius.
+    """
+    rows, row_count = _window_sum(values, radius, 0)
+    total, col_count = _window_sum(rows, radius, 1)
+    return total, np.outer(row_count, col_count)
+
+
+def local_stats(fov: np.ndarray, radius: int):
+    """
+    Per-pixel mean colour (H, W, 3) and luminance standard deviation (H, W)
+    of the patch extract_fov(fov, x, y, radius) would return, for every
+    pixel at once.
+    """
+    values = np.empty(fov.shape[:2] + (4,), dtype=np.int64)
+    values[..., :3] = fov
+    # Channel sum as luminance (integer, so the prefix sums stay exact).
+    luma = values[..., 0] + values[..., 1] + values[..., 2]
+    values[..., 3] = luma * luma
+    total, count = box_sum(values, radius)
+    count = count[..., None]
+    mean = total[..., :3] / count
+    luma_mean = mean[..., 0] + mean[..., 1] + mean[..., 2]
+    var = np.maximum(total[..., 3] / count[..., 0] - luma_mean * luma_mean, 0.0)
+    return mean, np.sqrt(var) / 3.0
@@ -9,14 +9,50 @@ This module composes three independent components:
 No global state. All data passed explicitly.
 """
 
+from dataclasses import dataclass, replace
 from typing import List, Tuple, Optional
 from PIL import Image
 import numpy as np
 
+from agents import tracing
+
 # Type aliases for clarity
 PixelProposal = Tuple[int, int, Tuple[int, int, int]]  # (x, y, (r, g, b))
 RGB = Tuple[int, int, int]
 
+DIFFUSION_MODES = ("text2img", "img2img")
+AMUSED_MODEL = "amused/amused-256"
+# Native resolution of amused/amused-256.
+AMUSED_RESOLUTION = 256
+# AmusedPipeline.__call__ defaults.
+AMUSED_DEFAULT_STEPS = 12
+AMUSED_DEFAULT_GUIDANCE = 10.0
+AMUSED_TEMPERATURE = (2, 0)
+AMUSED_AESTHETIC_SCORE = 6
+
+
+@dataclass(frozen=True)
+class DiffusionProfile:
+    """Quality/latency trade-off for one diffusion call."""
+    num_inference_steps: int
+    guidance_scale: float           # <= 1.0 disables CFG (half the transformer batch)
+    seed: Optional[int]             # None = nondeterministic
+    resolution: int                 # generation height/width in pixels
+
+
+DIFFUSION_PROFILES = {
+    # CPU nodes: few steps, no classifier-free guidance, 8x8 token grid.
+    "draft": DiffusionProfile(num_inference_steps=4, guidance_scale=1.0, seed=0, resolution=128),
+    "balanced": DiffusionProfile(num_inference_steps=8, guidance_scale=4.0, seed=None, resolution=256),
+    # GPU nodes: the aMUSEd defaults.
+    "quality": DiffusionProfile(
+        num_inference_steps=AMUSED_DEFAULT_STEPS,
+        guidance_scale=AMUSED_DEFAULT_GUIDANCE,
+        seed=None,
+        resolution=AMUSED_RESOLUTION,
+    ),
+}
+
 
 class PipelineConfig:
     """Configuration for pipeline execution."""
@@ -27,6 +63,18 @@ class PipelineConfig:
         evaluator_device: str = "cpu",
         diffuser_device: Optional[str] = None,
         top_x_proposals: int = 10,
+        prompt_embedding_cache: Optional[str] = None,
+        diffusion_mode: str = "text2img",
+        img2img_strength: float = 0.6,
+        img2img_steps: int = 8,
+        warm_start: bool = False,
+        warm_start_strength: float = 0.35,
+        profile: str = "quality",
+        num_inference_steps: Optional[int] = None,
+        guidance_scale: Optional[float] = None,
+        seed: Optional[int] = None,
+        resolution: Optional[int] = None,
+        local_files_only: bool = False,
     ):
         """
         Args:
@@ -34,11 +82,50 @@ class PipelineConfig:
             evaluator_device: Device for evaluator ("cpu", "cuda", "mps")
             diffuser_device: Device for diffuser (auto-select if None)
             top_x_proposals: Number of pixel proposals to extract
+            prompt_embedding_cache: Directory of precomputed text-encoder
+                embeddings for classifier labels (disabled if None)
+            diffusion_mode: "text2img" (from the label only) or "img2img"
+                (conditioned on the agent's current field of view)
+            img2img_strength: Fraction of image tokens re-masked in img2img
+                mode (0 keeps the input, 1 ignores it)
+            img2img_steps: Schedule length in img2img mode; only
+                int(img2img_steps * img2img_strength) steps actually run
+            warm_start: Start each text2img generation from this pipeline's
+                previous VQ token grid when the prompt repeats
+            warm_start_strength: Fraction of the schedule re-run on a warm
+                start (tokens are re-masked to match that point)
+            profile: Name in DIFFUSION_PROFILES ("draft", "balanced", "quality")
+            num_inference_steps, guidance_scale, seed, resolution: Override
+                the corresponding profile field when not None
+            local_files_only: Load model weights from the local Hugging Face
+                cache only (no network)
         """
+        if profile not in DIFFUSION_PROFILES:
+            raise ValueError(f"profile must be one of {sorted(DIFFUSION_PROFILES)}, got {profile!r}")
+        if diffusion_mode not in DIFFUSION_MODES:
+            raise ValueError(f"diffusion_mode must be one of {DIFFUSION_MODES}, got {diffusion_mode!r}")
         self.image_size = image_size
         self.evaluator_device = evaluator_device
         self.diffuser_device = diffuser_device
         self.top_x_proposals = top_x_proposals
+        self.prompt_embedding_cache = prompt_embedding_cache
+        self.diffusion_mode = diffusion_mode
+        self.img2img_strength = img2img_strength
+        self.img2img_steps = img2img_steps
+        self.warm_start = warm_start
+        self.warm_start_strength = warm_start_strength
+        self.profile = profile
+        self.local_files_only = local_files_only
+        overrides = {
+            "num_inference_steps": num_inference_steps,
+            "guidance_scale": guidance_scale,
+            "seed": seed,
+            "resolution": resolution,
+        }
+        self.diffusion = replace(
+            DIFFUSION_PROFILES[profile],
+            **{k: v for k, v in overrides.items() if v is not None},
+        )
 
 
 class DiffusionPromptPipeline:
@@ -58,13 +145,21 @@ class DiffusionPromptPipeline:
         if not hasattr(DiffusionPromptPipeline, "_shared_lock"):
             import threading
             DiffusionPromptPipeline._shared_lock = threading.Lock()
-
-    def _get_diffuser(self):
+        if not hasattr(DiffusionPromptPipeline, "_shared_embedding_caches"):
+            DiffusionPromptPipeline._shared_embedding_caches = {}
+        if not hasattr(DiffusionPromptPipeline, "_shared_img2img"):
+            DiffusionPromptPipeline._shared_img2img = None
+        # Warm-start state: this instance's (i.e. this agent's) last token grid.
+        self._last_prompt = None
+        self._last_tokens = None
+        self._scheduler = None
+
+    def _get_diffuser(self, local_files_only: Optional[bool] = None):
         """Lazy-load diffuser on first use."""
         if DiffusionPromptPipeline._shared_diffuser is not None:
             return DiffusionPromptPipeline._shared_diffuser
 
-        with DiffusionPromptPipeline._shared_lock:
+        with tracing.traced_acquire(DiffusionPromptPipeline._shared_lock, "diffuser._shared_lock"):
             if DiffusionPromptPipeline._shared_diffuser is not None:
                 return DiffusionPromptPipeline._shared_diffuser
 
@@ -75,10 +170,15 @@ class DiffusionPromptPipeline:
             dtype = torch.bfloat16 if "cuda" in device else torch.float32
             device_map = "balanced" if "cuda" in device else None
 
+            # safetensors weights are memory-mapped instead of unpickled.
             shared = AmusedPipeline.from_pretrained(
-                "amused/amused-256",
+                AMUSED_MODEL,
                 torch_dtype=dtype,
                 device_map=device_map,
+                use_safetensors=True,
+                local_files_only=(
+                    self.config.local_files_only if local_files_only is None else local_files_only
+                ),
             )
             # Log where the pipeline parameters live (cpu/cuda).
             try:
@@ -96,6 +196,174 @@ class DiffusionPromptPipeline:
             DiffusionPromptPipeline._shared_diffuser = shared
         return DiffusionPromptPipeline._shared_diffuser
 
+    def _get_img2img(self):
+        """Img2img variant sharing the text2img pipeline's loaded weights."""
+        if DiffusionPromptPipeline._shared_img2img is not None:
+            return DiffusionPromptPipeline._shared_img2img
+
+        diffuser = self._get_diffuser()
+        with tracing.traced_acquire(DiffusionPromptPipeline._shared_lock, "diffuser._shared_lock"):
+            if DiffusionPromptPipeline._shared_img2img is None:
+                from diffusers.pipelines.amused import AmusedImg2ImgPipeline
+
+                DiffusionPromptPipeline._shared_img2img = AmusedImg2ImgPipeline(
+                    **diffuser.components
+                )
+        return DiffusionPromptPipeline._shared_img2img
+
+    def _prompt_embeddings(self, diffuser, prompt, embeds):
+        if embeds is not None:
+            return embeds
+        from agents.prompt_embeddings import encode_texts
+
+        pooled, hidden = encode_texts(diffuser, [prompt, ""])
+        return {
+            "prompt_embeds": pooled[:1],
+            "encoder_hidden_states": hidden[:1],
+            "negative_prompt_embeds": pooled[1:],
+            "negative_encoder_hidden_states": hidden[1:],
+        }
+
+    def _generate_warm(self, diffuser, prompt, embeds) -> Image.Image:
+        """
+        Masked-token denoising loop of AmusedPipeline, but able to start part
+        way through the schedule from the previous token grid (the same
+        truncation AmusedImg2ImgPipeline applies to VQ-encoded images, minus
+        the VQ encode). Runs int(steps * warm_start_strength) transformer
+        passes instead of the full schedule when the prompt repeats.
+        """
+        import copy
+        import torch
+
+        if self._scheduler is None:
+            # Private copy: set_timesteps mutates scheduler state.
+            self._scheduler = copy.deepcopy(diffuser.scheduler)
+        scheduler = self._scheduler
+        device = diffuser._execution_device
+        profile = self.config.diffusion
+        steps = profile.num_inference_steps
+        guidance_scale = profile.guidance_scale
+        size = profile.resolution
+        generator = self._generator()
+
+        kwargs = self._prompt_embeddings(diffuser, prompt, embeds)
+        prompt_embeds = kwargs["prompt_embeds"]
+        encoder_hidden_states = kwargs["encoder_hidden_states"]
+        if guidance_scale > 1.0:
+            prompt_embeds = torch.concat([kwargs["negative_prompt_embeds"], prompt_embeds])
+            encoder_hidden_states = torch.concat(
+                [kwargs["negative_encoder_hidden_states"], encoder_hidden_states]
+            )
+        batch = 2 if guidance_scale > 1.0 else 1
+        micro_conds = torch.tensor(
+            [size, size, 0, 0, AMUSED_AESTHETIC_SCORE],
+            device=device,
+            dtype=encoder_hidden_states.dtype,
+        ).unsqueeze(0).expand(batch, -1)
+
+        scheduler.set_timesteps(steps, AMUSED_TEMPERATURE, device)
+        timesteps = scheduler.timesteps
+        latent_size = size // diffuser.vae_scale_factor
+        start = self._warm_start_index(len(timesteps), prompt, latent_size)
+        if start > 0:
+            latents = scheduler.add_noise(
+                self._last_tokens.to(device), timesteps[start - 1], generator=generator
+            )
+        else:
+            latents = torch.full(
+                (1, latent_size, latent_size),
+                scheduler.config.mask_token_id,
+                dtype=torch.long,
+                device=device,
+            )
+
+        with torch.no_grad():
+            for timestep in timesteps[start:]:
+                model_input = torch.cat([latents] * 2) if guidance_scale > 1.0 else latents
+                logits = diffuser.transformer(
+                    model_input,
+                    micro_conds=micro_conds,
+                    pooled_text_emb=prompt_embeds,
+                    encoder_hidden_states=encoder_hidden_states,
+                )
+                if guidance_scale > 1.0:
+                    uncond_logits, cond_logits = logits.chunk(2)
+                    logits = uncond_logits + guidance_scale * (cond_logits - uncond_logits)
+                latents = scheduler.step(
+                    model_output=logits, timestep=timestep, sample=latents, generator=generator
+                ).prev_sample
+
+            self._last_prompt = prompt
+            self._last_tokens = latents.detach().clone()
+            return self._decode_tokens(diffuser, latents, latent_size)
+
+    def _warm_start_index(self, num_timesteps: int, prompt: str, latent_size: int) -> int:
+        """First schedule step to run: 0 (cold, all tokens masked) unless
+        the prompt repeats and the last token grid has the same size."""
+        if (
+            self._last_tokens is None
+            or self._last_prompt != prompt
+            or self._last_tokens.shape[-1] != latent_size
+        ):
+            return 0
+        return num_timesteps - max(1, int(num_timesteps * self.config.warm_start_strength))
+
+    @staticmethod
+    def _decode_tokens(diffuser, latents, latent_size: int) -> Image.Image:
+        """VQ-decode a token grid as AmusedPipeline does, including its fp16
+        upcast: an fp16 VQ decoder with force_upcast overflows to NaN
+        (black frames) unless it decodes in fp32."""
+        import torch
+
+        vqvae = diffuser.vqvae
+        needs_upcasting = vqvae.dtype == torch.float16 and vqvae.config.force_upcast
+        if needs_upcasting:
+            vqvae.float()
+        try:
+            output = vqvae.decode(
+                latents,
+                force_not_quantize=True,
+                shape=(1, latent_size, latent_size, vqvae.config.latent_channels),
+            ).sample.clip(0, 1)
+            return diffuser.image_processor.postprocess(output, "pil")[0]
+        finally:
+            if needs_upcasting:
+                vqvae.half()
+
+    def _generator(self):
+        """torch.Generator for the profile seed (None when unseeded)."""
+        seed = self.config.diffusion.seed
+        if seed is None:
+            return None
+        import torch
+
+        # The masked-token scheduler samples on CPU.
+        return torch.Generator(device="cpu").manual_seed(seed)
+
+    def _get_embedding_cache(self, diffuser):
+        """Shared PromptEmbeddingCache for the configured directory, if any."""
+        directory = self.config.prompt_embedding_cache
+        if directory is None:
+            return None
+        caches = DiffusionPromptPipeline._shared_embedding_caches
+        cache = caches.get(directory)
+        if cache is not None:
+            return cache
+
+        with tracing.traced_acquire(DiffusionPromptPipeline._shared_lock, "diffuser._shared_lock"):
+            cache = caches.get(directory)
+            if cache is None:
+                from agents.prompt_embeddings import PromptEmbeddingCache
+
+                try:
+                    cache = PromptEmbeddingCache(directory, diffuser)
+                except Exception as exc:
+                    # Fall back to encoding prompts on every call.
+                    print(f"[diffuser] prompt embedding cache disabled: {exc}")
+                    cache = False
+                caches[directory] = cache
+        return cache or None
+
     @staticmethod
     def _auto_device():
         """Auto-select device: cuda > mps (macOS only) > cpu."""
@@ -113,20 +381,48 @@ class DiffusionPromptPipeline:
         else:
             return "cpu"
 
-    def generate(self, prompt: str) -> Image.Image:
+    def generate(self, prompt: str, init_image: Optional[Image.Image] = None) -> Image.Image:
         """
         Generate image from text prompt.
 
         Args:
             prompt: Text description of the image to generate
+            init_image: Optional image to start from (img2img); the result
+                stays close to it and needs fewer denoising steps
 
         Returns:
             PIL.Image of size (image_size, image_size) in RGB mode
         """
         diffuser = self._get_diffuser()
+        cache = self._get_embedding_cache(diffuser)
+        embeds = cache.lookup(prompt) if cache is not None else None
+        # Skip tokenizer + text encoder when cached embeddings are available.
+        prompt_kwargs = embeds if embeds is not None else {"prompt": prompt}
+        profile = self.config.diffusion
         try:
-            result = diffuser(prompt)
-            image = result.images[0]
+            if init_image is not None:
+                init_image = init_image.convert("RGB").resize(
+                    (profile.resolution, profile.resolution), resample=Image.LANCZOS
+                )
+                image = self._get_img2img()(
+                    image=init_image,
+                    strength=self.config.img2img_strength,
+                    num_inference_steps=self.config.img2img_steps,
+                    guidance_scale=profile.guidance_scale,
+                    generator=self._generator(),
+                    **prompt_kwargs,
+                ).images[0]
+            elif self.config.warm_start:
+                image = self._generate_warm(diffuser, prompt, embeds)
+            else:
+                image = diffuser(
+                    num_inference_steps=profile.num_inference_steps,
+                    guidance_scale=profile.guidance_scale,
+                    height=profile.resolution,
+                    width=profile.resolution,
+                    generator=self._generator(),
+                    **prompt_kwargs,
+                ).images[0]
         except Exception as exc:
             print(f"[diffuser] error during generate: {exc}")
             raise
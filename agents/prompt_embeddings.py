@@ -0,0 +1,187 @@
+"""
+Precomputed aMUSEd text-encoder outputs for the classifier vocabulary.
+
+Prompts given to DiffusionPromptPipeline come from PromptGenerator, i.e. from
+the ViT's fixed id2label vocabulary (1000 ImageNet labels). Tokenizing and
+running the CLIP text encoder for the same handful of strings on every
+generate call is wasted work, so this module keeps one row per label in
+memory-mapped .npy files:
+
+    <dir>/labels.json   vocabulary; the last entry is "" (negative prompt)
+    <dir>/hidden.npy    (N, seq_len, hidden)  encoder_hidden_states, float16
+    <dir>/pooled.npy    (N, proj_dim)         prompt_embeds (text_embeds), float16
+    <dir>/filled.npy    (N,) bool             which rows are computed
+
+Missing rows are computed lazily on first use and persisted, so the text
+encoder drops out of the hot path after the first call per label.
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from agents.prompt_generator import VIT_MODEL
+
+NEGATIVE_PROMPT = ""
+
+
+def encode_texts(pipe, texts: List[str]):
+    """Run an aMUSEd pipeline's tokenizer + CLIP text encoder.
+
+    Returns (prompt_embeds, encoder_hidden_states) tensors exactly as
+    AmusedPipeline computes them internally.
+    """
+    import torch
+
+    input_ids = pipe.tokenizer(
+        texts,
+        return_tensors="pt",
+        padding="max_length",
+        truncation=True,
+        max_length=pipe.tokenizer.model_max_length,
+    ).input_ids.to(pipe._execution_device)
+    with torch.no_grad():
+        outputs = pipe.text_encoder(input_ids, return_dict=True, output_hidden_states=True)
+    return outputs.text_embeds, outputs.hidden_states[-2]
+
+
+def default_labels(model_name: str = VIT_MODEL) -> List[str]:
+    """The classifier vocabulary in id order (config only, no weights)."""
+    from transformers import AutoConfig
+
+    id2label = AutoConfig.from_pretrained(model_name).id2label
+    return [id2label[i] for i in sorted(id2label)]
+
+
+class PromptEmbeddingCache:
+    """Memory-mapped prompt embedding table bound to one aMUSEd pipeline."""
+
+    def __init__(self, directory: str, pipe, labels: Optional[Sequence[str]] = None):
+        """
+        Args:
+            directory: Where the table lives (created if needed)
+            pipe: Loaded AmusedPipeline (its tokenizer/text_encoder fill misses)
+            labels: Vocabulary; defaults to the ViT classifier's id2label
+        """
+        self.directory = directory
+        self.pipe = pipe
+        self._lock = threading.Lock()
+        vocab = list(labels) if labels is not None else default_labels()
+        self.labels = vocab + [NEGATIVE_PROMPT]
+        self.index: Dict[str, int] = {label: i for i, label in enumerate(self.labels)}
+        # Tensors already moved to the pipeline device, per row.
+        self._device_rows: Dict[int, tuple] = {}
+        self._open()
+
+    def _shapes(self):
+        encoder = self.pipe.text_encoder
+        seq_len = self.pipe.tokenizer.model_max_length
+        hidden = encoder.config.hidden_size
+        proj = getattr(encoder.config, "projection_dim", hidden)
+        return seq_len, hidden, proj
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        labels_path = os.path.join(self.directory, "labels.json")
+        n = len(self.labels)
+        seq_len, hidden, proj = self._shapes()
+
+        paths = {
+            name: os.path.join(self.directory, f"{name}.npy")
+            for name in ("hidden", "pooled", "filled")
+        }
+        existing = None
+        if os.path.exists(labels_path):
+            with open(labels_path) as f:
+                existing = json.load(f)
+        reuse = existing == self.labels and all(os.path.exists(p) for p in paths.values())
+
+        if reuse:
+            self.hidden = np.load(paths["hidden"], mmap_mode="r+")
+            self.pooled = np.load(paths["pooled"], mmap_mode="r+")
+            self.filled = np.load(paths["filled"], mmap_mode="r+")
+            if self.hidden.shape != (n, seq_len, hidden) or self.pooled.shape != (n, proj):
+                reuse = False
+        if not reuse:
+            open_memmap = np.lib.format.open_memmap
+            self.hidden = open_memmap(paths["hidden"], mode="w+", dtype=np.float16, shape=(n, seq_len, hidden))
+            self.pooled = open_memmap(paths["pooled"], mode="w+", dtype=np.float16, shape=(n, proj))
+            self.filled = open_memmap(paths["filled"], mode="w+", dtype=np.bool_, shape=(n,))
+            with open(labels_path, "w") as f:
+                json.dump(self.labels, f)
+        print(
+            f"[embeddings] {self.directory}: {int(self.filled.sum())}/{n} prompts cached"
+        )
+
+    def _encode(self, texts: List[str]):
+        pooled, hidden = encode_texts(self.pipe, texts)
+        return pooled.float().cpu().numpy(), hidden.float().cpu().numpy()
+
+    def _fill(self, rows: List[int]):
+        with self._lock:
+            rows = [i for i in rows if not self.filled[i]]
+            if not rows:
+                return
+            pooled, hidden = self._encode([self.labels[i] for i in rows])
+            for j, i in enumerate(rows):
+                self.pooled[i] = pooled[j]
+                self.hidden[i] = hidden[j]
+            self.pooled.flush()
+            self.hidden.flush()
+            # Mark rows valid only once their data is on disk.
+            self.filled[rows] = True
+            self.filled.flush()
+
+    def precompute(self, batch_size: int = 32):
+        """Fill every missing row (e.g. once per machine, ahead of runs)."""
+        missing = [i for i in range(len(self.labels)) if not self.filled[i]]
+        for start in range(0, len(missing), batch_size):
+            self._fill(missing[start:start + batch_size])
+
+    def _row_tensors(self, i: int):
+        cached = self._device_rows.get(i)
+        if cached is not None:
+            return cached
+        if not self.filled[i]:
+            self._fill([i])
+        import torch
+
+        device = self.pipe._execution_device
+        dtype = self.pipe.text_encoder.dtype
+        pooled = torch.from_numpy(np.array(self.pooled[i:i + 1])).to(device=device, dtype=dtype)
+        hidden = torch.from_numpy(np.array(self.hidden[i:i + 1])).to(device=device, dtype=dtype)
+        self._device_rows[i] = (pooled, hidden)
+        return pooled, hidden
+
+    def lookup(self, prompt: str) -> Optional[dict]:
+        """Keyword arguments for AmusedPipeline.__call__ replacing `prompt`,
+        or None if the prompt is outside the vocabulary."""
+        i = self.index.get(prompt)
+        if i is None:
+            return None
+        prompt_embeds, encoder_hidden_states = self._row_tensors(i)
+        negative_embeds, negative_hidden = self._row_tensors(self.index[NEGATIVE_PROMPT])
+        return {
+            "prompt_embeds": prompt_embeds,
+            "encoder_hidden_states": encoder_hidden_states,
+            "negative_prompt_embeds": negative_embeds,
+            "negative_encoder_hidden_states": negative_hidden,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from agents.pipeline import DiffusionPromptPipeline, PipelineConfig
+
+    parser = argparse.ArgumentParser(description="Precompute prompt embeddings for all labels")
+    parser.add_argument("--cache-dir", default="cache/prompt_embeds")
+    args = parser.parse_args()
+
+    pipeline = DiffusionPromptPipeline(PipelineConfig(prompt_embedding_cache=args.cache_dir))
+    cache = pipeline._get_embedding_cache(pipeline._get_diffuser())
+    cache.precompute()
+    print(f"[embeddings] {int(cache.filled.sum())}/{len(cache.labels)} prompts cached")
@@ -5,27 +5,58 @@ Uses the ViT image classifier to identify the dominant visual content
 and uses the top prediction label as the prompt.
 """
 
+import threading
+
 import numpy as np
 from PIL import Image
-import torch
+
+from agents import tracing
+
+VIT_MODEL = "google/vit-base-patch16-224"
 
 
 class PromptGenerator:
     """Generate prompts from image classification using ViT."""
 
-    def __init__(self, device: str = "cpu"):
-        """Initialize the image classifier."""
-        from transformers import ViTImageProcessor, ViTForImageClassification
+    # device -> (processor, model); shared by every agent on that device.
+    _shared_models = {}
+    _shared_lock = threading.Lock()
 
+    def __init__(self, device: str = "cpu", local_files_only: bool = False):
+        """Initialize the image classifier (weights load on first use)."""
         self.device = device
-        self.processor = ViTImageProcessor.from_pretrained(
-            "google/vit-base-patch16-224"
-        )
-        self.model = ViTForImageClassification.from_pretrained(
-            "google/vit-base-patch16-224"
-        )
-        self.model = self.model.to(device)
-        self.model.eval()
+        self.local_files_only = local_files_only
+
+    @classmethod
+    def load(cls, device: str = "cpu", local_files_only: bool = False):
+        """Load (once per device) the shared ViT processor and model."""
+        shared = cls._shared_models.get(device)
+        if shared is not None:
+            return shared
+        with tracing.traced_acquire(cls._shared_lock, "classifier._shared_lock"):
+            shared = cls._shared_models.get(device)
+            if shared is not None:
+                return shared
+            from transformers import ViTImageProcessor, ViTForImageClassification
+
+            processor = ViTImageProcessor.from_pretrained(
+                VIT_MODEL, local_files_only=local_files_only
+            )
+            model = ViTForImageClassification.from_pretrained(
+                VIT_MODEL, local_files_only=local_files_only, use_safetensors=True
+            )
+            model = model.to(device)
+            model.eval()
+            shared = cls._shared_models[device] = (processor, model)
+        return shared
+
+    @property
+    def processor(self):
+        return self.load(self.device, self.local_files_only)[0]
+
+    @property
+    def model(self):
+        return self.load(self.device, self.local_files_only)[1]
 
     def generate_prompt_from_image(self, image: Image.Image) -> str:
         """
@@ -37,23 +68,25 @@ class PromptGenerator:
         Returns:
             str: The top predicted class label (used as prompt)
         """
+        import torch
+
+        processor, model = self.load(self.device, self.local_files_only)
+
         # Convert to RGB if needed
         image = image.convert("RGB")
 
         # Process the image
-        inputs = self.processor(images=image, return_tensors="pt")
+        inputs = processor(images=image, return_tensors="pt")
         inputs = {k: v.to(self.device) for k, v in inputs.items()}
 
         # Get predictions
         with torch.no_grad():
-            outputs = self.model(**inputs)
+            outputs = model(**inputs)
 
         logits = outputs.logits
         predicted_class_idx = logits.argmax(-1).item()
 
         # Get the predicted class label
-        predicted_class = self.model.config.id2label[predicted_class_idx]
+        predicted_class = model.config.id2label[predicted_class_idx]
 
         return predicted_class
-
-
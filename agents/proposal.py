@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 from typing import Tuple
 
+import numpy as np
+
 @dataclass
 class Proposal:
     agent_id: int
@@ -8,3 +10,29 @@ class Proposal:
     rgb: Tuple[int, int, int]
     confidence: float
     canvas_version: int
+
+
+@dataclass
+class ProposalBatch:
+    """Many proposals of one agent step as parallel arrays (no per-pixel
+    objects): xs, ys (n,) canvas coordinates, rgb (n, 3) uint8,
+    confidence (n,) float32."""
+    agent_id: int
+    xs: np.ndarray
+    ys: np.ndarray
+    rgb: np.ndarray
+    confidence: np.ndarray
+    canvas_version: int
+
+    def __len__(self):
+        return len(self.xs)
+
+    def __iter__(self):
+        for x, y, rgb, confidence in zip(self.xs, self.ys, self.rgb, self.confidence):
+            yield Proposal(
+                agent_id=self.agent_id,
+                region_id=(int(x), int(y)),
+                rgb=(int(rgb[0]), int(rgb[1]), int(rgb[2])),
+                confidence=float(confidence),
+                canvas_version=self.canvas_version,
+            )
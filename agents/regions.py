@@ -0,0 +1,204 @@
+"""
+Activity-driven placement of agent fields of view.
+
+The static layout (Synchronizer._compute_slice_bounds) pins every agent to
+one grid cell plus a fixed overlap: agents over quiet parts of the canvas
+keep proposing pixels that barely change, busy parts stay under-served, and
+neighbours duplicate work in the overlaps.
+
+RegionScheduler keeps a coarse grid over the canvas, fed by the merge thread
+after every merge with, per cell, exponential moving averages of
+
+    proposed   pixels that received proposals
+    changed    of those, pixels whose value actually changed (acceptance)
+    delta      summed absolute RGB change
+    duplicate  pixels proposed more than once in the batch
+
+Every `interval` ages assign() re-places one window per agent. A window is
+the static slice size plus an overlap margin on each side. Windows are
+placed greedily on the cells with the highest expected gain:
+
+    gain  = delta * (0.5 + changed / proposed)
+    score = gain + explore * mean(gain) * staleness
+
+where staleness (capped) counts the rebalance intervals since any window
+covered the cell, so quiet cells are revisited now and then instead of never
+being measured again. Each placed window suppresses the cells in its core
+(the window minus the overlap margin), which spreads the agents out. Agents
+are then matched to the new windows nearest-first, so they move as little
+as possible.
+
+The overlap adapts between min_overlap and max_overlap: it shrinks while the
+duplicate fraction is above duplicate_target and grows back otherwise.
+"""
+
+import math
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+Bounds = Tuple[int, int, int, int]  # (x0, x1, y0, y1), as in Synchronizer.agent_bounds
+
+
+class RegionScheduler:
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        num_agents: int,
+        grid: int = 8,
+        interval: int = 16,
+        decay: float = 0.8,
+        explore: float = 0.25,
+        overlap: float = 0.4,
+        min_overlap: float = 0.0,
+        max_overlap: float = 0.6,
+        duplicate_target: float = 0.1,
+        overlap_step: float = 0.05,
+    ):
+        self.width = width
+        self.height = height
+        self.num_agents = num_agents
+        self.interval = interval
+        self.decay = decay
+        self.explore = explore
+        self.overlap = overlap
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+        self.duplicate_target = duplicate_target
+        self.overlap_step = overlap_step
+
+        self.cell_w = max(1, math.ceil(width / grid))
+        self.cell_h = max(1, math.ceil(height / grid))
+        self.shape = (math.ceil(height / self.cell_h), math.ceil(width / self.cell_w))
+        self.proposed = np.zeros(self.shape)
+        self.changed = np.zeros(self.shape)
+        self.delta = np.zeros(self.shape)
+        self.duplicate = np.zeros(self.shape)
+        self.last_covered = np.zeros(self.shape)
+        self.age = 0
+        self.reassignments = 0
+
+        # Window size: the static layout's slice (same cols x rows split).
+        cols = max(1, int(math.sqrt(num_agents)))
+        if cols * cols < num_agents:
+            cols += 1
+        rows = max(1, math.ceil(num_agents / cols))
+        self.slice_w = max(1, math.ceil(width / cols))
+        self.slice_h = max(1, math.ceil(height / rows))
+
+    # ------------------------------------------------------------ measurement
+
+    def _cells(self, xs, ys):
+        return (np.asarray(ys) // self.cell_h) * self.shape[1] + np.asarray(xs) // self.cell_w
+
+    def observe_merge(self, xs, ys, delta, duplicate, age: int):
+        """Fold one merge into the activity grid (merge thread only).
+
+        xs, ys: merged pixel coordinates; delta: summed |RGB change| per
+        pixel; duplicate: bool per pixel, proposed more than once.
+        """
+        self.age = age
+        size = self.shape[0] * self.shape[1]
+        cells = self._cells(xs, ys)
+        delta = np.asarray(delta, dtype=np.float64)
+        fresh = [
+            np.bincount(cells, minlength=size),
+            np.bincount(cells, weights=(delta > 0), minlength=size),
+            np.bincount(cells, weights=delta, minlength=size),
+            np.bincount(cells, weights=np.asarray(duplicate, dtype=np.float64), minlength=size),
+        ]
+        keep = self.decay
+        for ema, value in zip((self.proposed, self.changed, self.delta, self.duplicate), fresh):
+            ema *= keep
+            ema += (1.0 - keep) * value.reshape(self.shape)
+
+    def note_bounds(self, bounds: Iterable[Bounds], age: int):
+        """Mark the cells under `bounds` as covered at `age`."""
+        for x0, x1, y0, y1 in bounds:
+            if x1 <= x0 or y1 <= y0:
+                continue
+            self.last_covered[
+                y0 // self.cell_h: (y1 - 1) // self.cell_h + 1,
+                x0 // self.cell_w: (x1 - 1) // self.cell_w + 1,
+            ] = age
+
+    def gain(self) -> np.ndarray:
+        acceptance = self.changed / np.maximum(self.proposed, 1e-9)
+        return self.delta * (0.5 + acceptance)
+
+    def duplicate_fraction(self) -> float:
+        proposed = self.proposed.sum()
+        return float(self.duplicate.sum() / proposed) if proposed > 0 else 0.0
+
+    # ------------------------------------------------------------ placement
+
+    def _window(self, row: int, col: int) -> Bounds:
+        w = min(self.width, int(round(self.slice_w * (1 + 2 * self.overlap))))
+        h = min(self.height, int(round(self.slice_h * (1 + 2 * self.overlap))))
+        cx = col * self.cell_w + self.cell_w // 2
+        cy = row * self.cell_h + self.cell_h // 2
+        x0 = min(max(0, cx - w // 2), self.width - w)
+        y0 = min(max(0, cy - h // 2), self.height - h)
+        return (x0, x0 + w, y0, y0 + h)
+
+    def _core_cells(self, bounds: Bounds):
+        x0, x1, y0, y1 = bounds
+        mx = int((x1 - x0) * self.overlap / (1 + 2 * self.overlap))
+        my = int((y1 - y0) * self.overlap / (1 + 2 * self.overlap))
+        x0, x1, y0, y1 = x0 + mx, max(x0 + mx + 1, x1 - mx), y0 + my, max(y0 + my + 1, y1 - my)
+        return (
+            slice(y0 // self.cell_h, (y1 - 1) // self.cell_h + 1),
+            slice(x0 // self.cell_w, (x1 - 1) // self.cell_w + 1),
+        )
+
+    def adapt_overlap(self):
+        if self.duplicate_fraction() > self.duplicate_target:
+            self.overlap = max(self.min_overlap, self.overlap - self.overlap_step)
+        else:
+            self.overlap = min(self.max_overlap, self.overlap + self.overlap_step)
+
+    def assign(self, current: Dict[int, Bounds]) -> Dict[int, Bounds]:
+        """New bounds for every agent in `current` (agent_id -> bounds)."""
+        self.adapt_overlap()
+        gain = self.gain()
+        staleness = np.minimum((self.age - self.last_covered) / max(1, self.interval), 4.0) / 4.0
+        score = gain + self.explore * (gain.mean() + 1e-9) * staleness
+        base = score.copy()
+
+        windows = []
+        for _ in range(len(current)):
+            if not np.isfinite(score).any():
+                score = base.copy()
+            row, col = np.unravel_index(int(np.argmax(score)), self.shape)
+            window = self._window(row, col)
+            windows.append(window)
+            score[self._core_cells(window)] = -np.inf
+
+        # Nearest current agent per new window, best windows first.
+        def center(b):
+            return ((b[0] + b[1]) / 2.0, (b[2] + b[3]) / 2.0)
+
+        free = dict(current)
+        assigned = {}
+        for window in windows:
+            wx, wy = center(window)
+            agent_id = min(
+                free,
+                key=lambda a: (center(free[a])[0] - wx) ** 2 + (center(free[a])[1] - wy) ** 2,
+            )
+            assigned[agent_id] = window
+            del free[agent_id]
+
+        moved = sum(1 for a, b in assigned.items() if current[a] != b)
+        self.reassignments += moved
+        self.note_bounds(assigned.values(), self.age)
+        return assigned
+
+    def snapshot(self) -> dict:
+        return {
+            "overlap": self.overlap,
+            "duplicate_fraction": self.duplicate_fraction(),
+            "reassignments": self.reassignments,
+            "gain": self.gain().tolist(),
+        }
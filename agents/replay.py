@@ -0,0 +1,306 @@
+"""
+Record model calls during a real run and replay them without weights.
+
+Recording wraps an agent's classifier and diffuser and captures every call:
+
+    classify: hash of the input image -> label
+    diffuse:  prompt, seed, init-image hash (img2img), output image
+
+into a single zip archive:
+
+    index.json          {"version", "config", "classify": {hash: label},
+                         "diffuse": [{prompt, seed, init, image, seconds}]}
+    images/<hash>.png   distinct output images (stored, PNG is compressed)
+
+Replay backends serve those results with no model at all. Canvas contents
+drift between runs (thread timing differs), so lookups that miss fall back
+deterministically: an unseen classifier input gets a recorded label chosen
+by its hash, an unseen prompt gets a recorded image chosen by the prompt's
+hash. Replays of the same archive therefore exercise the same code paths
+with stable, realistic data, and optionally with the recorded latencies.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+ARCHIVE_VERSION = 1
+
+
+def image_hash(image: Image.Image) -> str:
+    """Content hash of an image (mode, size and pixels)."""
+    h = hashlib.blake2b(digest_size=12)
+    h.update(f"{image.mode}:{image.size}".encode("ascii"))
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def _stable_index(key: str, n: int) -> int:
+    return (zlib.crc32(key.encode("utf-8")) & 0xFFFFFFFF) % n
+
+
+def _png_bytes(image: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+# ---------------------------------------------------------------- recording
+
+
+class ModelCallRecorder:
+    """Thread-safe collector of model calls; written out by save()."""
+
+    def __init__(self, path: str, config=None):
+        self.path = path
+        self.config = config
+        self._lock = threading.Lock()
+        self.classify: Dict[str, str] = {}
+        self.diffuse: List[dict] = []
+        self.images: Dict[str, bytes] = {}
+
+    def record_classify(self, image: Image.Image, label: str):
+        key = image_hash(image)
+        with self._lock:
+            self.classify[key] = label
+
+    def record_diffuse(self, prompt, seed, init_image, image, seconds):
+        key = image_hash(image)
+        png = None if key in self.images else _png_bytes(image)
+        entry = {
+            "prompt": prompt,
+            "seed": seed,
+            "init": image_hash(init_image) if init_image is not None else None,
+            "image": key,
+            "seconds": seconds,
+        }
+        with self._lock:
+            if png is not None:
+                self.images.setdefault(key, png)
+            self.diffuse.append(entry)
+
+    def save(self) -> str:
+        """Atomically write the archive to self.path."""
+        import zipfile
+
+        with self._lock:
+            index = {
+                "version": ARCHIVE_VERSION,
+                "created": time.time(),
+                "config": _config_dict(self.config),
+                "classify": dict(self.classify),
+                "diffuse": list(self.diffuse),
+            }
+            images = dict(self.images)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp.{os.getpid()}"
+        with zipfile.ZipFile(tmp_path, "w") as zf:
+            zf.writestr("index.json", json.dumps(index), compress_type=zipfile.ZIP_DEFLATED)
+            for key, png in images.items():
+                zf.writestr(f"images/{key}.png", png, compress_type=zipfile.ZIP_STORED)
+        os.replace(tmp_path, self.path)
+        print(
+            f"[replay] recorded {len(index['classify'])} classifier inputs, "
+            f"{len(index['diffuse'])} diffusion calls ({len(images)} images) -> {self.path}"
+        )
+        return self.path
+
+
+def _config_dict(config) -> dict:
+    if config is None:
+        return {}
+    out = {k: v for k, v in vars(config).items() if isinstance(v, (str, int, float, bool, type(None)))}
+    diffusion = getattr(config, "diffusion", None)
+    if diffusion is not None:
+        out["diffusion"] = dict(vars(diffusion))
+    return out
+
+
+class RecordingPromptGenerator:
+    """Wraps a PromptGenerator and records every classification."""
+
+    def __init__(self, inner, recorder: ModelCallRecorder):
+        self.inner = inner
+        self.recorder = recorder
+        self.device = getattr(inner, "device", "cpu")
+
+    def generate_prompt_from_image(self, image: Image.Image) -> str:
+        label = self.inner.generate_prompt_from_image(image)
+        self.recorder.record_classify(image, label)
+        return label
+
+
+class RecordingDiffuser:
+    """Wraps a DiffusionPromptPipeline and records every generation."""
+
+    def __init__(self, inner, recorder: ModelCallRecorder):
+        self.inner = inner
+        self.recorder = recorder
+        self.config = inner.config
+
+    def generate(self, prompt: str, init_image: Optional[Image.Image] = None) -> Image.Image:
+        start = time.perf_counter()
+        if init_image is not None:
+            image = self.inner.generate(prompt, init_image=init_image)
+        else:
+            image = self.inner.generate(prompt)
+        seconds = time.perf_counter() - start
+        diffusion = getattr(self.config, "diffusion", None)
+        seed = diffusion.seed if diffusion is not None else None
+        self.recorder.record_diffuse(prompt, seed, init_image, image, seconds)
+        return image
+
+
+# ---------------------------------------------------------------- replay
+
+
+class ReplayArchive:
+    """A loaded recording; images are decoded on first use and cached."""
+
+    def __init__(self, path: str):
+        import zipfile
+
+        self.path = path
+        with zipfile.ZipFile(path) as zf:
+            index = json.loads(zf.read("index.json"))
+            self._png = {
+                name[len("images/"):-len(".png")]: zf.read(name)
+                for name in zf.namelist()
+                if name.startswith("images/")
+            }
+        if index.get("version") != ARCHIVE_VERSION:
+            raise ValueError(f"unsupported replay archive version: {index.get('version')}")
+        self.config = index.get("config", {})
+        self.classify: Dict[str, str] = index["classify"]
+        self.labels = sorted(set(self.classify.values())) or ["image"]
+        self.by_prompt: Dict[str, List[dict]] = defaultdict(list)
+        self.by_prompt_init: Dict[tuple, dict] = {}
+        for entry in index["diffuse"]:
+            self.by_prompt[entry["prompt"]].append(entry)
+            if entry["init"] is not None:
+                self.by_prompt_init[(entry["prompt"], entry["init"])] = entry
+        self.entries = sorted(index["diffuse"], key=lambda e: (e["prompt"], e["image"]))
+        self._decoded: Dict[str, Image.Image] = {}
+        self._lock = threading.Lock()
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def image(self, key: str) -> Image.Image:
+        with self._lock:
+            image = self._decoded.get(key)
+            if image is None:
+                image = Image.open(io.BytesIO(self._png[key]))
+                image.load()
+                self._decoded[key] = image
+        return image.copy()
+
+    def summary(self) -> str:
+        return (
+            f"[replay] {self.path}: classify hits={self.hits['classify']} "
+            f"misses={self.misses['classify']}, diffuse hits={self.hits['diffuse']} "
+            f"misses={self.misses['diffuse']}"
+        )
+
+
+class ReplayPromptGenerator:
+    """PromptGenerator stand-in serving recorded labels."""
+
+    def __init__(self, archive: ReplayArchive, device: str = "cpu"):
+        self.archive = archive
+        self.device = device
+
+    def generate_prompt_from_image(self, image: Image.Image) -> str:
+        key = image_hash(image)
+        label = self.archive.classify.get(key)
+        if label is not None:
+            self.archive.hits["classify"] += 1
+            return label
+        self.archive.misses["classify"] += 1
+        return self.archive.labels[_stable_index(key, len(self.archive.labels))]
+
+
+class ReplayDiffuser:
+    """DiffusionPromptPipeline stand-in serving recorded images.
+
+    latency_scale > 0 sleeps for the recorded generation time times the
+    scale, to emulate model cost; 0 serves instantly.
+    """
+
+    def __init__(self, archive: ReplayArchive, config=None, latency_scale: float = 0.0):
+        self.archive = archive
+        self.config = config
+        self.latency_scale = latency_scale
+        self._next: Dict[str, int] = defaultdict(int)
+
+    def _lookup(self, prompt: str, init_image: Optional[Image.Image]) -> dict:
+        archive = self.archive
+        if init_image is not None:
+            entry = archive.by_prompt_init.get((prompt, image_hash(init_image)))
+            if entry is not None:
+                archive.hits["diffuse"] += 1
+                return entry
+        entries = archive.by_prompt.get(prompt)
+        if entries:
+            # Cycle through this prompt's recordings, in recorded order.
+            i = self._next[prompt]
+            self._next[prompt] = i + 1
+            archive.hits["diffuse"] += 1
+            return entries[i % len(entries)]
+        archive.misses["diffuse"] += 1
+        if not archive.entries:
+            raise KeyError("replay archive has no diffusion recordings")
+        return archive.entries[_stable_index(prompt, len(archive.entries))]
+
+    def generate(self, prompt: str, init_image: Optional[Image.Image] = None) -> Image.Image:
+        entry = self._lookup(prompt, init_image)
+        if self.latency_scale > 0:
+            time.sleep(entry["seconds"] * self.latency_scale)
+        image = self.archive.image(entry["image"]).convert("RGB")
+        size = getattr(self.config, "image_size", None)
+        if size is not None and image.size != (size, size):
+            image = image.resize((size, size), resample=Image.LANCZOS)
+        return image
+
+
+# ---------------------------------------------------------------- agent factories
+
+
+def recording_agent_factory(recorder: ModelCallRecorder):
+    """Synchronizer.initialize_agents factory: real models, recorded."""
+    from agents.agent import Agent
+
+    def factory(state, model, pipeline_config=None):
+        agent = Agent(state, model, pipeline_config=pipeline_config)
+        if recorder.config is None:
+            recorder.config = agent.pipeline_config
+        agent.prompt_generator = RecordingPromptGenerator(agent.prompt_generator, recorder)
+        agent.diffuser = RecordingDiffuser(agent.diffuser, recorder)
+        return agent
+
+    return factory
+
+
+def replay_agent_factory(archive: ReplayArchive, latency_scale: float = 0.0):
+    """Synchronizer.initialize_agents factory: recorded results, no weights."""
+    from agents.agent import Agent
+
+    def factory(state, model, pipeline_config=None):
+        return Agent(
+            state,
+            model,
+            pipeline_config=pipeline_config,
+            prompt_generator=ReplayPromptGenerator(archive),
+            diffuser=ReplayDiffuser(archive, pipeline_config, latency_scale=latency_scale),
+        )
+
+    return factory
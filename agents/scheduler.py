@@ -1,4 +1,43 @@
+"""
+Agent scheduling.
+
+select_agents picks a random subset of agents. BudgetScheduler decides
+which agent steps next under a global budget, and is what Synchronizer
+uses instead of letting every worker step as fast as it can.
+
+The budget is a token bucket refilled at `rate` per second, up to `burst`:
+
+    unit="calls"     one token per agent step (model calls per second)
+    unit="seconds"   the measured duration of each step (model seconds
+                     per wall second, i.e. how many cores / GPUs' worth of
+                     time the agents may use); a step may start while the
+                     bucket is positive and is charged when it finishes
+
+Workers call acquire(agent_id) before a step and release(agent_id, ...)
+after it. Among the agents waiting in acquire, the one with the highest
+priority gets the next token:
+
+    priority = change_weight    * mean |RGB change| per pixel merged into
+                                  the agent's window since its last step
+             + shortfall_weight * max(0, last diff - tolerance), how far
+                                  its last generated image was from the FOV
+             + staleness_weight * seconds since its last step
+
+so agents whose region moved or who have not converged yet run first, and
+staleness makes sure quiet agents still get a turn. Agents that have never
+stepped go first.
+"""
+
+import math
 import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+Bounds = Tuple[int, int, int, int]  # (x0, x1, y0, y1), as in Synchronizer.agent_bounds
+
 
 def select_agents(agents, fraction=0.3):
     """
@@ -6,3 +45,177 @@ def select_agents(agents, fraction=0.3):
     """
     k = max(1, int(len(agents) * fraction))
     return random.sample(agents, k)
+
+
+class BudgetScheduler:
+    UNITS = ("calls", "seconds")
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        bounds: Dict[int, Bounds],
+        rate: float,
+        unit: str = "calls",
+        burst: Optional[float] = None,
+        cell: int = 16,
+        tolerance: float = 8.0,
+        change_weight: float = 1.0,
+        shortfall_weight: float = 1.0,
+        staleness_weight: float = 1.0,
+    ):
+        """
+        Args:
+            width, height: Canvas size
+            bounds: agent_id -> window; read on every decision, so windows
+                moved by the region scheduler are picked up
+            rate: Tokens per second (see the module docstring for units)
+            unit: "calls" or "seconds"
+            burst: Bucket capacity (default: one second's worth, at least 1)
+            cell: Side in pixels of the grid merged changes are counted on
+            tolerance: Per-pixel diff below which an agent counts as converged
+        """
+        if unit not in self.UNITS:
+            raise ValueError(f"unknown budget unit {unit!r} (choose from {', '.join(self.UNITS)})")
+        if rate <= 0:
+            raise ValueError("budget rate must be positive")
+        self.bounds = bounds
+        self.rate = float(rate)
+        self.unit = unit
+        self.burst = float(burst) if burst else max(1.0, self.rate)
+        self.cell = cell
+        self.tolerance = tolerance
+        self.change_weight = change_weight
+        self.shortfall_weight = shortfall_weight
+        self.staleness_weight = staleness_weight
+
+        # Cumulative |RGB change| per grid cell since start.
+        self._change = np.zeros((math.ceil(height / cell), math.ceil(width / cell)))
+        self._seen: Dict[int, float] = {}
+        self._last_step: Dict[int, float] = {}
+        self._last_diff: Dict[int, float] = {}
+        self._waiting = set()
+        self._tokens = self.burst
+        self._refilled = time.monotonic()
+        self._cv = threading.Condition()
+        self._stopped = False
+        self.grants = 0
+        self.wait_seconds = 0.0
+
+    # ------------------------------------------------------------ measurement
+
+    def resize(self, width: int, height: int):
+        """Restart change tracking for a resized canvas."""
+        with self._cv:
+            self._change = np.zeros((math.ceil(height / self.cell), math.ceil(width / self.cell)))
+            self._seen.clear()
+
+    def observe_merge(self, xs, ys, delta):
+        """Fold one merge into the change grid (merge thread)."""
+        cells = (np.asarray(ys) // self.cell) * self._change.shape[1] + np.asarray(xs) // self.cell
+        fresh = np.bincount(cells, weights=np.asarray(delta, dtype=np.float64), minlength=self._change.size)
+        with self._cv:
+            self._change += fresh.reshape(self._change.shape)
+            self._cv.notify_all()
+
+    def _region_change(self, bounds: Bounds) -> float:
+        x0, x1, y0, y1 = bounds
+        if x1 <= x0 or y1 <= y0:
+            return 0.0
+        c = self.cell
+        return float(self._change[y0 // c: (y1 - 1) // c + 1, x0 // c: (x1 - 1) // c + 1].sum())
+
+    def priority(self, agent_id: int, now: Optional[float] = None) -> float:
+        """Expected gain of stepping `agent_id` now (caller holds no lock)."""
+        with self._cv:
+            return self._priority(agent_id, time.monotonic() if now is None else now)
+
+    def _priority(self, agent_id: int, now: float) -> float:
+        if agent_id not in self._last_step:
+            return math.inf
+        bounds = self.bounds.get(agent_id, (0, 0, 0, 0))
+        x0, x1, y0, y1 = bounds
+        area = max(1, (x1 - x0) * (y1 - y0))
+        change = max(0.0, self._region_change(bounds) - self._seen.get(agent_id, 0.0)) / area
+        shortfall = max(0.0, self._last_diff.get(agent_id, 0.0) - self.tolerance)
+        return (
+            self.change_weight * change
+            + self.shortfall_weight * shortfall
+            + self.staleness_weight * (now - self._last_step[agent_id])
+        )
+
+    # ------------------------------------------------------------ budget
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _next_agent(self, now: float) -> int:
+        return max(self._waiting, key=lambda a: (self._priority(a, now), -a))
+
+    def acquire(self, agent_id: int, timeout: Optional[float] = None) -> bool:
+        """Block until `agent_id` may step. False on stop() or timeout."""
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        needed = 1.0 if self.unit == "calls" else 1e-9
+        with self._cv:
+            self._waiting.add(agent_id)
+            try:
+                while not self._stopped:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._tokens >= needed and self._next_agent(now) == agent_id:
+                        if self.unit == "calls":
+                            self._tokens -= 1.0
+                        self._seen[agent_id] = self._region_change(self.bounds.get(agent_id, (0, 0, 0, 0)))
+                        self.grants += 1
+                        self.wait_seconds += now - started
+                        # Let the next waiter re-check against the new balance.
+                        self._cv.notify_all()
+                        return True
+                    if deadline is not None and now >= deadline:
+                        return False
+                    refill_in = max(needed - self._tokens, 0.0) / self.rate
+                    wait = min(max(refill_in, 0.001), 0.1)
+                    if deadline is not None:
+                        wait = min(wait, deadline - now)
+                    self._cv.wait(wait)
+                return False
+            finally:
+                self._waiting.discard(agent_id)
+
+    def release(self, agent_id: int, seconds: float, diff: Optional[float] = None):
+        """Record a finished step: its duration and the agent's last diff."""
+        with self._cv:
+            now = time.monotonic()
+            self._last_step[agent_id] = now
+            if diff is not None:
+                self._last_diff[agent_id] = float(diff)
+            if self.unit == "seconds":
+                self._refill(now)
+                self._tokens -= seconds
+            self._cv.notify_all()
+
+    def stop(self):
+        with self._cv:
+            self._stopped = True
+            self._cv.notify_all()
+
+    @property
+    def tokens(self) -> float:
+        with self._cv:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._cv:
+            self._refill(now)
+            return {
+                "unit": self.unit,
+                "rate": self.rate,
+                "tokens": self._tokens,
+                "grants": self.grants,
+                "wait_seconds": self.wait_seconds,
+                "priority": {a: self._priority(a, now) for a in sorted(self.bounds)},
+            }
@@ -0,0 +1,187 @@
+"""
+Pipelined execution of Agent steps across dedicated stage workers.
+
+In the default mode every agent thread runs classify -> diffuse -> evaluate
+back to back, so while one agent is diffusing the classifier sits idle.
+StagedExecutor instead runs one thread per stage, connected by bounded
+queues:
+
+    feed -> [classify] -> q -> [diffuse] -> q -> [evaluate] -> emit
+
+The feeder snapshots the FOV of an idle agent and pushes it into the
+pipeline; each agent has at most one item in flight, so its last_guess
+feedback loop behaves exactly as in the threaded mode, while different
+agents' work occupies the ViT, the diffuser and NumPy at the same time.
+Bounded queues give backpressure: a slow diffuser stalls the feeder rather
+than letting stale FOVs pile up.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+STAGES = ("classify", "diffuse", "evaluate")
+
+
+class _StageStats:
+    """Busy time and item count of one stage worker (single writer)."""
+
+    def __init__(self):
+        self.busy = 0.0
+        self.items = 0
+        self.errors = 0
+
+
+class StagedExecutor:
+    def __init__(
+        self,
+        agents: List,
+        read_fov: Callable,
+        emit: Callable,
+        queue_size: int = 2,
+        idle_sleep: float = 0.01,
+        on_thread_start: Optional[Callable[[int], None]] = None,
+    ):
+        """
+        Args:
+            agents: Agents exposing prepare/classify_stage/diffuse_stage/evaluate_stage
+            read_fov: read_fov(agent) -> (fov, fov_origin, canvas_version) or None
+            emit: emit(agent, proposals, seconds) called from the evaluate worker
+            queue_size: Capacity of each inter-stage queue
+            idle_sleep: Feeder back-off when an agent has nothing to read
+            on_thread_start: Called with the stage index at the top of each
+                stage worker (e.g. ThreadBudget.enter_worker)
+        """
+        self.agents = list(agents)
+        self.read_fov = read_fov
+        self.emit = emit
+        self.idle_sleep = idle_sleep
+        self.on_thread_start = on_thread_start
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in STAGES]
+        self.stats: Dict[str, _StageStats] = {stage: _StageStats() for stage in STAGES}
+        self.threads: List[threading.Thread] = []
+        self.started_at = None
+        self._stop = threading.Event()
+        self._idle = deque(self.agents)
+        self._idle_cv = threading.Condition()
+
+    # ---------------------------------------------------------------- control
+
+    def start(self):
+        if self.threads:
+            return
+        self.started_at = time.perf_counter()
+        self.threads.append(threading.Thread(target=self._feed, name="stage-feed", daemon=True))
+        for i, stage in enumerate(STAGES):
+            self.threads.append(
+                threading.Thread(target=self._work, args=(i,), name=f"stage-{stage}", daemon=True)
+            )
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        with self._idle_cv:
+            self._idle_cv.notify_all()
+        deadline = time.time() + timeout
+        for thread in self.threads:
+            thread.join(timeout=max(0.0, deadline - time.time()))
+
+    # ---------------------------------------------------------------- workers
+
+    def _release(self, agent):
+        with self._idle_cv:
+            self._idle.append(agent)
+            self._idle_cv.notify()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _feed(self):
+        while not self._stop.is_set():
+            with self._idle_cv:
+                while not self._idle and not self._stop.is_set():
+                    self._idle_cv.wait(timeout=0.1)
+                if self._stop.is_set():
+                    return
+                agent = self._idle.popleft()
+            try:
+                started = time.perf_counter()
+                snapshot = self.read_fov(agent)
+                work = agent.prepare(*snapshot) if snapshot is not None else None
+            except Exception as exc:
+                print(f"[staged] feed agent {agent.state.agent_id} exception: {exc}")
+                work = None
+            if work is None:
+                self._release(agent)
+                time.sleep(self.idle_sleep)
+                continue
+            if not self._put(self.queues[0], (agent, work, started)):
+                return
+
+    def _work(self, index: int):
+        if self.on_thread_start is not None:
+            self.on_thread_start(index)
+        stage = STAGES[index]
+        stats = self.stats[stage]
+        q = self.queues[index]
+        last = index == len(STAGES) - 1
+        while not self._stop.is_set():
+            try:
+                agent, work, started = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            t0 = time.perf_counter()
+            try:
+                result = getattr(agent, f"{stage}_stage")(work)
+            except Exception as exc:
+                stats.errors += 1
+                print(f"[staged] {stage} agent {agent.state.agent_id} exception: {exc}")
+                self._release(agent)
+                continue
+            finally:
+                stats.busy += time.perf_counter() - t0
+            stats.items += 1
+            if not last:
+                if not self._put(self.queues[index + 1], (agent, result, started)):
+                    return
+                continue
+            try:
+                self.emit(agent, result, time.perf_counter() - started)
+            except Exception as exc:
+                print(f"[staged] emit agent {agent.state.agent_id} exception: {exc}")
+            finally:
+                self._release(agent)
+
+    # ---------------------------------------------------------------- reporting
+
+    def utilization(self) -> Dict[str, float]:
+        """Fraction of wall time each stage worker spent busy since start()."""
+        if self.started_at is None:
+            return {stage: 0.0 for stage in STAGES}
+        elapsed = max(time.perf_counter() - self.started_at, 1e-9)
+        return {stage: min(1.0, self.stats[stage].busy / elapsed) for stage in STAGES}
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Items waiting in front of each stage."""
+        return {stage: q.qsize() for stage, q in zip(STAGES, self.queues)}
+
+    def format_utilization(self) -> str:
+        util = self.utilization()
+        depths = self.queue_depths()
+        lines = ["[stage utilization]"]
+        for stage in STAGES:
+            s = self.stats[stage]
+            lines.append(
+                f"  {stage:<9} busy={100.0 * util[stage]:5.1f}% items={s.items:<7} "
+                f"errors={s.errors:<4} queued={depths[stage]}"
+            )
+        return "\n".join(lines)
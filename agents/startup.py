@@ -0,0 +1,126 @@
+"""
+Parallel model loading ahead of the agent workers.
+
+Without it every model loads lazily on first use inside a worker thread:
+the ViT on the first classify, aMUSEd on the first generate, one after the
+other, while the merge loop waits for its first proposals. preload_models()
+loads both at once on two threads (weight loading is mostly file I/O and
+tensor copies that release the GIL), preferring the local Hugging Face cache
+and safetensors files, which are memory-mapped rather than unpickled.
+
+Phases (seconds, wall clock) are collected in a StartupReport:
+
+    import_torch   torch import (shared by both loaders, done first)
+    vit            ViT processor + classifier
+    amused         aMUSEd pipeline
+    embeddings     prompt embedding cache (if configured)
+    img2img        img2img pipeline view (img2img mode only)
+    total          wall time of the whole startup
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from agents.pipeline import DiffusionPromptPipeline, PipelineConfig
+from agents.prompt_generator import PromptGenerator
+
+
+class StartupReport:
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as exc:
+            with self._lock:
+                self.errors[name] = str(exc)
+            raise
+        finally:
+            with self._lock:
+                self.phases[name] = time.perf_counter() - start
+
+    def format(self) -> str:
+        parts = [f"{name}={seconds:.2f}s" for name, seconds in self.phases.items()]
+        serial = sum(s for name, s in self.phases.items() if name != "total")
+        line = f"[startup] {' '.join(parts)} (serial sum {serial:.2f}s)"
+        for name, error in self.errors.items():
+            line += f"\n[startup] {name} failed: {error}"
+        return line
+
+
+def _from_cache_first(load, local_files_only: Optional[bool]):
+    """Run load(local_files_only) against the local cache; unless pinned to
+    local files, fall back to downloading when the cache misses."""
+    if local_files_only is not None:
+        return load(local_files_only)
+    try:
+        return load(True)
+    except OSError:
+        print("[startup] not in local cache, downloading")
+        return load(False)
+
+
+def preload_models(
+    config: PipelineConfig,
+    local_files_only: Optional[bool] = None,
+    on_torch_import: Optional[Callable[[], None]] = None,
+) -> StartupReport:
+    """Load the shared classifier and diffuser used by agents with `config`.
+
+    Args:
+        config: Pipeline configuration of the agents (devices, cache, mode)
+        local_files_only: True = never download, False = always allow
+            downloads, None = try the local cache first, then download
+        on_torch_import: Called right after torch is imported, before any
+            model loads (e.g. ThreadBudget.apply_torch)
+    """
+    if local_files_only is None and config.local_files_only:
+        local_files_only = True
+    report = StartupReport()
+    start = time.perf_counter()
+
+    with report.phase("import_torch"):
+        import torch  # noqa: F401
+    if on_torch_import is not None:
+        on_torch_import()
+
+    def load_vit():
+        with report.phase("vit"):
+            _from_cache_first(
+                lambda local: PromptGenerator.load(config.evaluator_device, local_files_only=local),
+                local_files_only,
+            )
+
+    def load_amused():
+        pipeline = DiffusionPromptPipeline(config)
+        with report.phase("amused"):
+            diffuser = _from_cache_first(
+                lambda local: pipeline._get_diffuser(local_files_only=local), local_files_only
+            )
+        if config.prompt_embedding_cache is not None:
+            with report.phase("embeddings"):
+                pipeline._get_embedding_cache(diffuser)
+        if config.diffusion_mode == "img2img":
+            with report.phase("img2img"):
+                pipeline._get_img2img()
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup") as pool:
+        futures = [pool.submit(load_vit), pool.submit(load_amused)]
+    for future in futures:
+        try:
+            future.result()
+        except Exception:
+            # Recorded in report.errors; the agents retry lazily on first use.
+            pass
+
+    report.phases["total"] = time.perf_counter() - start
+    print(report.format())
+    return report
@@ -0,0 +1,165 @@
+"""
+Tests for convergence statistics and stop criteria in agents/convergence.py.
+"""
+
+import tempfile
+import time
+
+import numpy as np
+
+from agents.convergence import ConvergenceTracker, StopCriteria
+from agents.proposal import Proposal
+
+
+def _merge(tracker, x0, x1, y0, y1, age, change):
+    ys, xs = np.mgrid[y0:y1, x0:x1]
+    tracker.observe_merge(xs.ravel(), ys.ravel(), np.full(xs.size, change), age)
+
+
+def test_tracker_statistics():
+    tracker = ConvergenceTracker(64, 64, window=4, cell=16)
+    _merge(tracker, 0, 32, 0, 32, 1, change=30.0)
+    assert tracker.mean_change == 10.0
+    assert tracker.touched_fraction == 0.25
+    _merge(tracker, 0, 64, 0, 32, 2, change=0.0)
+    assert tracker.touched_fraction == 0.25, "unchanged pixels do not count as touched"
+    assert tracker.window_mean_change == 5.0
+
+    # The first merge falls out of the window after `window` more ages.
+    for age in range(3, 7):
+        _merge(tracker, 0, 16, 0, 16, age, change=0.0)
+    assert tracker.window_full
+    assert tracker.touched_fraction == 0.0
+    assert tracker.window_mean_change == 0.0
+
+
+def test_region_convergence_flags():
+    tracker = ConvergenceTracker(64, 64, window=4, cell=16)
+    assert not tracker.region_converged((0, 32, 0, 32)), "nothing sleeps before a full window"
+    for age in range(1, 9):
+        _merge(tracker, 32, 64, 32, 64, age, change=30.0)
+    assert tracker.region_converged((0, 32, 0, 32))
+    assert not tracker.region_converged((16, 48, 16, 48))
+    assert tracker.converged_fraction() == 0.75
+
+
+def test_stop_criteria():
+    tracker = ConvergenceTracker(64, 64, window=2)
+    criteria = StopCriteria(min_change=1.0, min_touched=0.1)
+    _merge(tracker, 0, 8, 0, 8, 1, change=0.3)
+    assert criteria.check(tracker, 1) is None, "window not full yet"
+    _merge(tracker, 0, 8, 0, 8, 2, change=0.3)
+    assert criteria.check(tracker, 2).startswith("converged")
+
+    # Every changed pixel counts against min_touched.
+    _merge(tracker, 0, 64, 0, 64, 3, change=0.3)
+    assert criteria.check(tracker, 3) is None
+
+    assert StopCriteria(max_age=3).check(tracker, 3).startswith("age limit")
+    limited = StopCriteria(max_seconds=0.05)
+    time.sleep(0.06)
+    assert limited.check(tracker, 3).startswith("time limit")
+    assert StopCriteria().check(tracker, 3, [True, True]) == "converged: every agent is idle"
+    assert StopCriteria().check(tracker, 3, [True, False]) is None
+
+    # A run that never converges still has a hard age limit by default.
+    from Canvas import Canvas
+    from Synchronizer import Synchronizer
+
+    assert Synchronizer(Canvas(8, 8, seed=0), 1).max_age == 512
+
+
+class _StillAgent:
+    """Proposes every pixel of its FOV unchanged, so nothing ever moves."""
+
+    def __init__(self, state, model=None, pipeline_config=None):
+        self.state = state
+
+    def step(self, fov, fov_origin, canvas_version):
+        x0, y0 = fov_origin
+        return [
+            Proposal(
+                agent_id=self.state.agent_id,
+                region_id=(x0 + x, y0 + y),
+                rgb=tuple(int(v) for v in fov[y, x]),
+                confidence=1.0,
+                canvas_version=canvas_version,
+            )
+            for y in range(0, fov.shape[0], 4)
+            for x in range(0, fov.shape[1], 4)
+        ]
+
+
+def test_run_stops_when_converged():
+    from Canvas import Canvas
+    from Synchronizer import Synchronizer
+
+    sync = Synchronizer(Canvas(32, 32, seed=0), 2)
+    sync.frames_dir = tempfile.mkdtemp()
+    sync.convergence_window = 4
+    sync.stop_min_change = 0.5
+    sync.max_seconds = 10.0
+    sync.initialize_agents(agent_factory=_StillAgent)
+    sync.start()
+    sync.start_run()
+    sync.run_thread.join(timeout=10.0)
+    assert not sync.running
+    assert sync.stop_reason is not None and sync.stop_reason.startswith("converged"), sync.stop_reason
+    sync.shutdown(timeout=2.0)
+
+
+def test_coarse_to_fine_stages():
+    from Canvas import Canvas, resolution_stages
+    from Synchronizer import Synchronizer
+
+    stages = resolution_stages(64, 64, 3)
+    sync = Synchronizer(Canvas(*stages[0], seed=0), 2)
+    sync.frames_dir = tempfile.mkdtemp()
+    sync.resolution_stages = stages
+    sync.convergence_window = 2
+    sync.stop_min_change = 0.5
+    sync.max_seconds = 10.0
+    sync.initialize_agents(agent_factory=_StillAgent)
+    sync.start()
+    assert sync.agent_bounds[1][1] <= 16
+    sync.start_run()
+    sync.run_thread.join(timeout=10.0)
+    # Each converged stage upsamples; only the last one ends the run.
+    assert sync.stop_reason.startswith("converged"), sync.stop_reason
+    assert (sync.canvas.width, sync.canvas.height) == (64, 64)
+    assert sync.metrics.counter("resolution_stages_total") == 2
+    assert max(b[1] for b in sync.agent_bounds.values()) == 64
+    sync.shutdown(timeout=2.0)
+
+
+def test_stage_change_drops_old_resolution_proposals():
+    from Canvas import Canvas, resolution_stages
+    from Synchronizer import Synchronizer
+
+    stages = resolution_stages(32, 32, 2)
+    sync = Synchronizer(Canvas(*stages[0], seed=0), 1)
+    sync.resolution_stages = stages
+    sync.initialize_agents(agent_factory=_StillAgent)
+    age = sync.canvas.age
+    old = Proposal(0, (1, 1), (255, 0, 0), 1.0, age)
+    assert sync._next_resolution("test")
+    assert sync.canvas.age == age + 1 and sync._stage_start_age == age + 1
+    before = sync.canvas.to_array()
+
+    fresh = Proposal(0, (20, 20), (0, 255, 0), 1.0, sync.canvas.age)
+    sync._apply_merge(sync._accumulate_batch([old, fresh]))
+    sync.canvas.increment_age()
+    after = sync.canvas.to_array()
+    assert np.array_equal(after[1, 1], before[1, 1]), "old-resolution proposal merged"
+    assert tuple(after[20, 20]) == (0, 255, 0)
+    assert sync.metrics.snapshot()["counters"]["proposals_dropped_total"] == {"reason=resolution": 1.0}
+
+
+if __name__ == "__main__":
+    test_tracker_statistics()
+    test_region_convergence_flags()
+    test_stop_criteria()
+    test_run_stops_when_converged()
+    test_coarse_to_fine_stages()
+    test_stage_change_drops_old_resolution_proposals()
+    print("convergence tests passed")
@@ -10,6 +10,9 @@ This test demonstrates the full pipeline:
 6. Visualize results
 """
 
+import os
+import tempfile
+
 import numpy as np
 from PIL import Image
 from agents.pipeline import LocalRegionPipeline, PipelineConfig
@@ -56,9 +59,11 @@ def test_e2e_with_real_canvas():
     print(f"  Region bounds: ({start_x}, {start_y}) to ({end_x}, {end_y})")
     print(f"  Region size: {canvas_region.size}")
 
-    # Save the canvas region for reference
-    canvas_region.save("e2e_canvas_region.png")
-    print(f"  Saved to: e2e_canvas_region.png")
+    # Save the canvas region for reference (outside the workspace, so test
+    # runs leave no files behind)
+    out_dir = tempfile.mkdtemp(prefix="plaice-e2e-")
+    canvas_region.save(os.path.join(out_dir, "e2e_canvas_region.png"))
+    print(f"  Saved to: {out_dir}/e2e_canvas_region.png")
 
     # Create pipeline
     print("\nStep 3: Initialize pipeline")
@@ -92,8 +97,8 @@ def test_e2e_with_real_canvas():
     print(f"  Mode: {generated_img.mode}")
 
     # Save generated image
-    generated_img.save("e2e_generated_image.png")
-    print(f"  Saved to: e2e_generated_image.png")
+    generated_img.save(os.path.join(out_dir, "e2e_generated_image.png"))
+    print(f"  Saved to: {out_dir}/e2e_generated_image.png")
 
     # Evaluate differences
     print("\nStep 6: Evaluator - Compare canvas region with generated image")
@@ -135,9 +140,9 @@ def test_e2e_with_real_canvas():
                         vis_array[ny, nx] = [0, 255, 255]
 
     vis_img = Image.fromarray(vis_array)
-    vis_img.save("e2e_proposals_visualization.png")
+    vis_img.save(os.path.join(out_dir, "e2e_proposals_visualization.png"))
     print(f"✓ Visualization created")
-    print(f"  Saved to: e2e_proposals_visualization.png")
+    print(f"  Saved to: {out_dir}/e2e_proposals_visualization.png")
     print(f"  (Cyan circles mark proposed pixel locations)")
 
     # Summary
@@ -148,7 +153,7 @@ def test_e2e_with_real_canvas():
     print(f"    Input: Canvas region (128×128 image)")
     print(f"    Process: ViT feature extraction + analysis")
     print(f"    Output: Contextual prompt for diffuser")
-    print(f"\n  Generated files:")
+    print(f"\n  Generated files (in {out_dir}):")
     print(f"    - e2e_canvas_region.png (extracted region from canvas)")
     print(f"    - e2e_generated_image.png (output from diffuser)")
     print(f"    - e2e_proposals_visualization.png (proposals marked on canvas)")
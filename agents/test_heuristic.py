@@ -0,0 +1,122 @@
+"""
+Tests for the model-free heuristic agent backend and dense proposal merges.
+"""
+
+import tempfile
+import time
+
+import numpy as np
+
+from agents.agent_state import AgentState
+from agents.heuristic import HeuristicAgent
+from agents.perception import extract_fov, local_stats
+from agents.proposal import Proposal, ProposalBatch
+
+
+def _fov(size=24, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+
+
+def test_local_stats_match_extract_fov():
+    fov = _fov(17)
+    mean, std = local_stats(fov, 2)
+    for y, x in ((0, 0), (5, 9), (16, 16), (1, 15)):
+        patch = extract_fov(fov, x, y, 2).astype(np.float64)
+        assert np.allclose(mean[y, x], patch.mean(axis=(0, 1)))
+        assert np.isclose(std[y, x], patch.sum(axis=2).std() / 3.0)
+
+
+def test_step_emits_dense_batch():
+    agent = HeuristicAgent(AgentState(3, 0.5, 0.5, 0.9, 0.1), seed=0)
+    fov = _fov()
+    batch = agent.step(fov, (10, 20), 7)
+    assert isinstance(batch, ProposalBatch)
+    assert batch.agent_id == 3 and batch.canvas_version == 7
+    assert len(batch) > 0.9 * fov.shape[0] * fov.shape[1]
+    assert batch.xs.min() >= 10 and batch.xs.max() < 10 + 24
+    assert batch.ys.min() >= 20 and batch.ys.max() < 20 + 24
+    assert batch.rgb.shape == (len(batch), 3) and batch.rgb.dtype == np.uint8
+    assert ((batch.confidence > 0) & (batch.confidence <= 1)).all()
+    assert agent.state.last_diff > 0
+    first = next(iter(batch))
+    assert isinstance(first, Proposal) and first.canvas_version == 7
+
+
+def test_biases():
+    fov = _fov()
+    # No smoothness pull and no noise: nothing to propose.
+    still = HeuristicAgent(AgentState(0, 0.0, 0.5, 0.0, 0.5), seed=0)
+    assert len(still.step(fov, (0, 0), 0)) == 0
+
+    # Full smoothness without noise moves pixels to their (contrast-biased)
+    # local mean, which is smoother than the input.
+    smooth = HeuristicAgent(AgentState(0, 0.0, 0.0, 1.0, 0.0), seed=0)
+    batch = smooth.step(fov, (0, 0), 0)
+    out = fov.copy()
+    out[batch.ys, batch.xs] = batch.rgb
+    assert np.abs(np.diff(out.astype(int), axis=1)).mean() < 0.5 * np.abs(np.diff(fov.astype(int), axis=1)).mean()
+
+    # Edge bias keeps a hard edge sharp.
+    edge = np.zeros((16, 16, 3), dtype=np.uint8)
+    edge[:, 8:] = 255
+    kept = HeuristicAgent(AgentState(0, 0.0, 0.0, 1.0, 1.0), seed=0).step(edge, (0, 0), 0)
+    blurred = HeuristicAgent(AgentState(0, 0.0, 0.0, 1.0, 0.0), seed=0).step(edge, (0, 0), 0)
+    assert len(kept) < len(blurred)
+
+
+def test_batch_merge_matches_single_proposals():
+    from Canvas import Canvas
+    from Synchronizer import Synchronizer
+
+    agent = HeuristicAgent(AgentState(0, 0.5, 0.5, 0.5, 0.5), seed=1)
+    results = []
+    for as_objects in (False, True):
+        sync = Synchronizer(Canvas(32, 32, seed=0), 0)
+        batch = [agent.step(sync.canvas.pixels[4:28, 2:26], (2, 4), 0) for _ in range(2)]
+        if as_objects:
+            batch = [p for item in batch for p in item]
+        agent.rng = np.random.default_rng(1)
+        sync._apply_merge(sync._accumulate_batch(batch))
+        sync.canvas.increment_age()
+        results.append(sync.canvas.to_array())
+    assert np.array_equal(results[0], results[1])
+
+
+def test_heuristic_run():
+    from Canvas import Canvas
+    from Synchronizer import Synchronizer
+
+    sync = Synchronizer(Canvas(64, 64, seed=0), 2)
+    sync.frames_dir = tempfile.mkdtemp()
+    sync.worker_sleep = 0.0
+    sync.max_age = 5
+    sync.initialize_agents(HeuristicAgent)
+    before = sync.canvas.to_array()
+    sync.start()
+    sync.start_run()
+    sync.run_thread.join(timeout=20.0)
+    assert sync.canvas.age >= 5
+    assert not np.array_equal(before, sync.canvas.to_array())
+    assert sync.metrics.counter("proposals_applied_total") > 64 * 64
+    sync.shutdown(timeout=2.0)
+
+
+def test_step_rate():
+    agent = HeuristicAgent(AgentState(0, 0.5, 0.5, 0.5, 0.5), seed=0)
+    fov = _fov(32)
+    start = time.perf_counter()
+    steps = 0
+    while time.perf_counter() - start < 0.5:
+        agent.step(fov, (0, 0), 0)
+        steps += 1
+    assert steps / 0.5 > 200, f"{steps / 0.5:.0f} steps/s"
+
+
+if __name__ == "__main__":
+    test_local_stats_match_extract_fov()
+    test_step_emits_dense_batch()
+    test_biases()
+    test_batch_merge_matches_single_proposals()
+    test_heuristic_run()
+    test_step_rate()
+    print("heuristic tests passed")
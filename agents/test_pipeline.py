@@ -6,6 +6,7 @@ composition without loading large models.
 """
 
 import numpy as np
+import pytest
 from PIL import Image
 from agents import pipeline as pipeline_module
 from agents import prompt_generator as prompt_module
@@ -134,6 +135,237 @@ def test_convenience_function():
     print("  ✓ Test passed!\n")
 
 
+def test_agent_img2img_passes_fov():
+    """In img2img mode the agent conditions the diffuser on its FOV."""
+    print("Test 4: Agent img2img mode")
+    print("-" * 50)
+
+    from agents.agent import Agent
+    from agents.agent_state import AgentState
+
+    class RecordingDiffuser(FakeDiffuser):
+        def generate(self, prompt, init_image=None):
+            self.last_init_image = init_image
+            return super().generate(prompt)
+
+    config = PipelineConfig(image_size=8, diffusion_mode="img2img")
+    diffuser = RecordingDiffuser(config)
+    agent = Agent(
+        AgentState(0, 0.5, 0.5, 0.5, 0.5, top_x_proposals=4),
+        pipeline_config=config,
+        prompt_generator=FakePromptGenerator(),
+        diffuser=diffuser,
+    )
+    fov = [[(200, 0, 0)] * 6 for _ in range(5)]
+    proposals = agent.step(fov, (10, 20), canvas_version=3)
+
+    assert diffuser.last_prompt == "cat"
+    assert diffuser.last_init_image.size == (6, 5), "init image should be the FOV"
+    assert len(proposals) == 4
+    assert all(10 <= p.region_id[0] < 16 and 20 <= p.region_id[1] < 25 for p in proposals)
+
+    try:
+        PipelineConfig(diffusion_mode="inpaint-everything")
+        assert False, "unknown diffusion modes should be rejected"
+    except ValueError:
+        pass
+
+    print("  ✓ Test passed!\n")
+
+
+def test_diffusion_profiles():
+    """Named profiles resolve to settings; explicit fields override them."""
+    print("Test 5: Diffusion profiles")
+    print("-" * 50)
+
+    from agents.pipeline import DIFFUSION_PROFILES
+
+    assert PipelineConfig().diffusion == DIFFUSION_PROFILES["quality"]
+
+    draft = PipelineConfig(profile="draft").diffusion
+    assert draft.guidance_scale <= 1.0, "draft should disable CFG"
+    assert draft.num_inference_steps < DIFFUSION_PROFILES["quality"].num_inference_steps
+
+    custom = PipelineConfig(profile="draft", num_inference_steps=6, seed=7).diffusion
+    assert custom.num_inference_steps == 6 and custom.seed == 7
+    assert custom.resolution == draft.resolution
+
+    try:
+        PipelineConfig(profile="ultra")
+        assert False, "unknown profiles should be rejected"
+    except ValueError:
+        pass
+
+    print("  ✓ Test passed!\n")
+
+
+def test_warm_start_schedule():
+    """Warm starts skip to the last warm_start_strength of the schedule."""
+    print("Test 6: Warm start schedule")
+    print("-" * 50)
+
+    from types import SimpleNamespace
+    from agents.pipeline import DiffusionPromptPipeline
+
+    pipeline = DiffusionPromptPipeline(PipelineConfig(warm_start=True, warm_start_strength=0.35))
+    assert pipeline._warm_start_index(12, "cat", 16) == 0, "nothing to reuse yet"
+    pipeline._last_prompt = "cat"
+    pipeline._last_tokens = SimpleNamespace(shape=(1, 16, 16))
+    assert pipeline._warm_start_index(12, "cat", 16) == 12 - 4
+    assert pipeline._warm_start_index(12, "dog", 16) == 0, "new label starts cold"
+    assert pipeline._warm_start_index(12, "cat", 8) == 0, "token grid size changed"
+    pipeline.config.warm_start_strength = 0.01
+    assert pipeline._warm_start_index(12, "cat", 16) == 11, "at least one step runs"
+
+    print("  ✓ Test passed!\n")
+
+
+def _stub_amused(torch, mask):
+    """(diffuser, calls): a stubbed aMUSEd pipeline for _generate_warm.
+    calls collects (model_input, pooled_text_emb, encoder_hidden_states)
+    per transformer pass."""
+    from types import SimpleNamespace
+
+    class StubScheduler:
+        config = SimpleNamespace(mask_token_id=mask)
+
+        def __init__(self):
+            self.noised = []
+
+        def set_timesteps(self, steps, temperature, device):
+            self.timesteps = torch.arange(steps - 1, -1, -1)
+
+        def add_noise(self, sample, timestep, generator=None):
+            self.noised.append((sample.clone(), int(timestep)))
+            return sample.clone()
+
+        def step(self, model_output, timestep, sample, generator=None):
+            # Each step "unmasks" and counts: tokens hold the steps run.
+            return SimpleNamespace(prev_sample=torch.where(sample == mask, 0, sample) + 1)
+
+    class StubVQ:
+        def __init__(self):
+            self.dtype = torch.float16
+            self.config = SimpleNamespace(force_upcast=True, latent_channels=4)
+            self.decode_dtypes = []
+
+        def float(self):
+            self.dtype = torch.float32
+            return self
+
+        def half(self):
+            self.dtype = torch.float16
+            return self
+
+        def decode(self, latents, force_not_quantize, shape):
+            self.decode_dtypes.append(self.dtype)
+            return SimpleNamespace(sample=torch.zeros(1, 3, shape[1], shape[2]))
+
+    calls = []
+
+    def transformer(model_input, micro_conds, pooled_text_emb, encoder_hidden_states):
+        calls.append((model_input.clone(), pooled_text_emb, encoder_hidden_states))
+        return torch.zeros(model_input.shape[0])
+
+    diffuser = SimpleNamespace(
+        scheduler=StubScheduler(),
+        _execution_device="cpu",
+        vae_scale_factor=4,
+        transformer=transformer,
+        vqvae=StubVQ(),
+        image_processor=SimpleNamespace(postprocess=lambda output, kind: [Image.new("RGB", (32, 32))]),
+    )
+    return diffuser, calls
+
+
+def test_warm_start_reuses_tokens():
+    """_generate_warm against a stubbed aMUSEd: reused tokens, truncated
+    schedule and the fp16 VQ upcast around decode."""
+    print("Test 7: Warm start token loop")
+    print("-" * 50)
+
+    torch = pytest.importorskip("torch")
+    from agents.pipeline import DiffusionPromptPipeline
+
+    mask = 99
+    diffuser, calls = _stub_amused(torch, mask)
+    embeds = {
+        "prompt_embeds": torch.zeros(1, 4),
+        "encoder_hidden_states": torch.zeros(1, 2, 4),
+        "negative_prompt_embeds": torch.zeros(1, 4),
+        "negative_encoder_hidden_states": torch.zeros(1, 2, 4),
+    }
+    config = PipelineConfig(
+        warm_start=True, warm_start_strength=0.25, profile="draft", num_inference_steps=8, resolution=32
+    )
+    pipeline = DiffusionPromptPipeline(config)
+
+    image = pipeline._generate_warm(diffuser, "cat", embeds)
+    assert image.size == (32, 32)
+    assert len(calls) == 8 and bool((calls[0][0] == mask).all()), "cold start: fully masked, full schedule"
+    assert bool((pipeline._last_tokens == 8).all())
+
+    calls.clear()
+    pipeline._generate_warm(diffuser, "cat", embeds)
+    noised, timestep = pipeline._scheduler.noised[-1]
+    assert bool((noised == 8).all()), "previous tokens are re-noised"
+    assert timestep == 2, "re-noised to the step before the truncated schedule"
+    assert len(calls) == 2 and bool((calls[0][0] == 8).all())
+    assert bool((pipeline._last_tokens == 10).all())
+
+    calls.clear()
+    pipeline._generate_warm(diffuser, "dog", embeds)
+    assert len(calls) == 8 and len(pipeline._scheduler.noised) == 1
+
+    assert diffuser.vqvae.decode_dtypes == [torch.float32] * 3, "fp16 VQ decodes upcast"
+    assert diffuser.vqvae.dtype == torch.float16, "and is cast back afterwards"
+
+    print("  ✓ Test passed!\n")
+
+
+def test_warm_start_encodes_prompt():
+    """Without cached embeddings, _generate_warm encodes [prompt, ""] and
+    conditions on the prompt, with "" as the CFG negative."""
+    print("Test 8: Warm start prompt encoding")
+    print("-" * 50)
+
+    torch = pytest.importorskip("torch")
+    from agents import prompt_embeddings
+    from agents.pipeline import DiffusionPromptPipeline
+
+    encoded = []
+
+    def encode_texts(pipe, texts):
+        encoded.append(list(texts))
+        # Row i is filled with 1 for the prompt, 0 for the empty negative.
+        rows = torch.tensor([[1.0 if text else 0.0] for text in texts])
+        return rows.expand(-1, 4), rows[:, :, None].expand(-1, 2, 4)
+
+    original = prompt_embeddings.encode_texts
+    prompt_embeddings.encode_texts = encode_texts
+    try:
+        for profile, guidance_scale in (("draft", 1.0), ("balanced", 4.0)):
+            diffuser, calls = _stub_amused(torch, 99)
+            config = PipelineConfig(
+                warm_start=True, profile=profile, num_inference_steps=2, resolution=32,
+                guidance_scale=guidance_scale,
+            )
+            DiffusionPromptPipeline(config)._generate_warm(diffuser, "cat", None)
+            _, pooled, hidden = calls[0]
+            if guidance_scale > 1.0:
+                # CFG batch: [negative, prompt], as AmusedPipeline.
+                assert pooled[:, 0].tolist() == [0.0, 1.0] and hidden[:, 0, 0].tolist() == [0.0, 1.0]
+            else:
+                assert pooled[:, 0].tolist() == [1.0] and hidden[:, 0, 0].tolist() == [1.0], (
+                    f"{profile}: conditioned on the prompt, not the negative"
+                )
+    finally:
+        prompt_embeddings.encode_texts = original
+    assert encoded == [["cat", ""], ["cat", ""]]
+
+    print("  ✓ Test passed!\n")
+
+
 if __name__ == "__main__":
     print("\n" + "=" * 50)
     print("Pipeline Integration Tests")
@@ -143,6 +375,11 @@ if __name__ == "__main__":
         test_local_region_pipeline()
         test_prompt_against_canvas()
         test_convenience_function()
+        test_agent_img2img_passes_fov()
+        test_diffusion_profiles()
+        test_warm_start_schedule()
+        test_warm_start_reuses_tokens()
+        test_warm_start_encodes_prompt()
 
         print("=" * 50)
         print("✓ All tests passed!")
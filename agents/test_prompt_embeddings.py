@@ -0,0 +1,87 @@
+"""
+Tests for the memory-mapped prompt embedding cache, using a fake
+tokenizer/text encoder so no weights are needed.
+"""
+
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from agents.prompt_embeddings import PromptEmbeddingCache
+
+
+class FakeTokenizer:
+    model_max_length = 4
+
+    def __call__(self, texts, **kwargs):
+        ids = [[len(t) + j for j in range(self.model_max_length)] for t in texts]
+        return SimpleNamespace(input_ids=torch.tensor(ids))
+
+
+class FakeTextEncoder:
+    config = SimpleNamespace(hidden_size=3, projection_dim=2)
+    dtype = torch.float32
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, input_ids, return_dict=True, output_hidden_states=True):
+        self.calls += 1
+        x = input_ids.float()
+        hidden = x[:, :, None].repeat(1, 1, 3)
+        return SimpleNamespace(
+            text_embeds=x[:, :2],
+            hidden_states=[hidden * 0, hidden, hidden * 2],
+        )
+
+
+def make_pipe():
+    return SimpleNamespace(
+        tokenizer=FakeTokenizer(),
+        text_encoder=FakeTextEncoder(),
+        _execution_device="cpu",
+    )
+
+
+def test_lookup_computes_lazily_and_persists():
+    directory = tempfile.mkdtemp()
+    pipe = make_pipe()
+    cache = PromptEmbeddingCache(directory, pipe, labels=["cat", "seashore"])
+
+    assert cache.lookup("not a label") is None
+    kwargs = cache.lookup("cat")
+    assert set(kwargs) == {
+        "prompt_embeds",
+        "encoder_hidden_states",
+        "negative_prompt_embeds",
+        "negative_encoder_hidden_states",
+    }
+    assert kwargs["prompt_embeds"].shape == (1, 2)
+    assert kwargs["encoder_hidden_states"].shape == (1, 4, 3)
+    # "cat" -> len 3 -> ids 3..6; hidden_states[-2] is the ids broadcast.
+    assert kwargs["encoder_hidden_states"][0, :, 0].tolist() == [3.0, 4.0, 5.0, 6.0]
+    calls = pipe.text_encoder.calls
+    cache.lookup("cat")
+    assert pipe.text_encoder.calls == calls, "cached rows must not re-run the encoder"
+
+    reopened_pipe = make_pipe()
+    reopened = PromptEmbeddingCache(directory, reopened_pipe, labels=["cat", "seashore"])
+    assert reopened.lookup("cat")["prompt_embeds"].tolist() == [[3.0, 4.0]]
+    assert reopened_pipe.text_encoder.calls == 0, "rows should be read back from disk"
+
+
+def test_precompute_fills_every_row():
+    pipe = make_pipe()
+    cache = PromptEmbeddingCache(tempfile.mkdtemp(), pipe, labels=["a", "bb", "ccc"])
+    cache.precompute(batch_size=2)
+    assert bool(cache.filled.all())
+    assert pipe.text_encoder.calls == 2
+
+
+if __name__ == "__main__":
+    test_lookup_computes_lazily_and_persists()
+    test_precompute_fills_every_row()
+    print("✓ All tests passed!")
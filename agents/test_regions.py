@@ -0,0 +1,79 @@
+"""
+Tests for the activity-driven region scheduler in agents/regions.py.
+"""
+
+import numpy as np
+
+from agents.regions import RegionScheduler
+
+
+def _static_bounds(scheduler, num_agents):
+    cols = -(-scheduler.width // scheduler.slice_w)
+    return {
+        a: (
+            (a % cols) * scheduler.slice_w,
+            min(scheduler.width, (a % cols + 1) * scheduler.slice_w),
+            (a // cols) * scheduler.slice_h,
+            min(scheduler.height, (a // cols + 1) * scheduler.slice_h),
+        )
+        for a in range(num_agents)
+    }
+
+
+def _merge(scheduler, x0, x1, y0, y1, age, duplicate=False, change=30.0):
+    ys, xs = np.mgrid[y0:y1, x0:x1]
+    xs, ys = xs.ravel(), ys.ravel()
+    scheduler.observe_merge(
+        xs, ys, np.full(xs.size, change), np.full(xs.size, duplicate), age
+    )
+
+
+def test_windows_follow_activity():
+    scheduler = RegionScheduler(256, 256, 4, explore=0.0)
+    current = _static_bounds(scheduler, 4)
+    scheduler.note_bounds(current.values(), 0)
+    for age in range(1, 17):
+        _merge(scheduler, 160, 256, 160, 256, age)
+
+    assigned = scheduler.assign(current)
+    assert sorted(assigned) == [0, 1, 2, 3]
+    # The busiest window lands on the active corner and goes to the agent
+    # already sitting there, which therefore does not have to move far.
+    x0, x1, y0, y1 = assigned[3]
+    assert x1 == 256 and y1 == 256
+    assert scheduler.reassignments >= 1
+    for x0, x1, y0, y1 in assigned.values():
+        assert 0 <= x0 < x1 <= 256 and 0 <= y0 < y1 <= 256
+
+
+def test_overlap_adapts_to_duplicates():
+    scheduler = RegionScheduler(128, 128, 4, overlap=0.4)
+    current = _static_bounds(scheduler, 4)
+    for age in range(1, 9):
+        _merge(scheduler, 0, 128, 0, 128, age, duplicate=True)
+    scheduler.assign(current)
+    assert scheduler.overlap < 0.4
+
+    for age in range(9, 40):
+        _merge(scheduler, 0, 128, 0, 128, age, duplicate=False)
+        scheduler.assign(current)
+    assert scheduler.overlap == scheduler.max_overlap
+
+
+def test_stale_cells_are_revisited():
+    scheduler = RegionScheduler(256, 256, 16, grid=4, interval=4, explore=1.0)
+    current = {0: (0, 128, 0, 128)}
+    # Nothing changes anywhere; only the agent's own cells were seen lately.
+    for age in range(1, 33):
+        _merge(scheduler, 0, 128, 0, 128, age, change=0.0)
+    scheduler.note_bounds(current.values(), 32)
+    x0, x1, y0, y1 = scheduler.assign(current)[0]
+    # Centred on a cell that has not been looked at for a while.
+    assert (x0 + x1) // 2 >= 128 or (y0 + y1) // 2 >= 128
+
+
+if __name__ == "__main__":
+    test_windows_follow_activity()
+    test_overlap_adapts_to_duplicates()
+    test_stale_cells_are_revisited()
+    print("region tests passed")
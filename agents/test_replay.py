@@ -0,0 +1,79 @@
+"""
+Tests for model-call record/replay (agents/replay.py) using the
+deterministic bench fakes as the "real" models.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from agents.pipeline import PipelineConfig
+from agents.replay import (
+    ModelCallRecorder,
+    RecordingDiffuser,
+    RecordingPromptGenerator,
+    ReplayArchive,
+    ReplayDiffuser,
+    ReplayPromptGenerator,
+    image_hash,
+)
+from bench.fakes import FakeDiffuser, FakePromptGenerator
+
+
+def _random_image(seed, size=8):
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8), mode="RGB")
+
+
+def _record(path, config, images):
+    recorder = ModelCallRecorder(path, config)
+    classifier = RecordingPromptGenerator(FakePromptGenerator(), recorder)
+    diffuser = RecordingDiffuser(FakeDiffuser(config), recorder)
+    calls = []
+    for image in images:
+        label = classifier.generate_prompt_from_image(image)
+        calls.append((image, label, diffuser.generate(label)))
+    recorder.save()
+    return calls
+
+
+def test_replay_serves_recorded_calls():
+    config = PipelineConfig(image_size=8, profile="draft")
+    path = os.path.join(tempfile.mkdtemp(), "run.zip")
+    calls = _record(path, config, [_random_image(i) for i in range(5)])
+
+    archive = ReplayArchive(path)
+    assert archive.config["diffusion"]["seed"] == 0
+    classifier = ReplayPromptGenerator(archive)
+    diffuser = ReplayDiffuser(archive, config)
+    for image, label, generated in calls:
+        assert classifier.generate_prompt_from_image(image) == label
+        assert image_hash(diffuser.generate(label)) == image_hash(generated)
+    assert archive.misses["classify"] == 0 and archive.misses["diffuse"] == 0
+
+
+def test_replay_misses_fall_back_deterministically():
+    config = PipelineConfig(image_size=8)
+    path = os.path.join(tempfile.mkdtemp(), "run.zip")
+    _record(path, config, [_random_image(i) for i in range(3)])
+
+    unseen = _random_image(99)
+    first = ReplayArchive(path)
+    second = ReplayArchive(path)
+    label = ReplayPromptGenerator(first).generate_prompt_from_image(unseen)
+    assert label == ReplayPromptGenerator(second).generate_prompt_from_image(unseen)
+    assert label in first.labels
+
+    a = ReplayDiffuser(first, config).generate("never recorded")
+    b = ReplayDiffuser(second, config).generate("never recorded")
+    assert image_hash(a) == image_hash(b)
+    assert a.size == (8, 8)
+    assert first.misses["classify"] == 1 and first.misses["diffuse"] == 1
+
+
+if __name__ == "__main__":
+    test_replay_serves_recorded_calls()
+    test_replay_misses_fall_back_deterministically()
+    print("replay tests passed")
@@ -0,0 +1,107 @@
+"""
+Tests for the budget-driven agent scheduler in agents/scheduler.py.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from agents.scheduler import BudgetScheduler
+
+
+def _bounds():
+    return {0: (0, 32, 0, 32), 1: (32, 64, 0, 32), 2: (0, 32, 32, 64)}
+
+
+def test_calls_budget_limits_rate():
+    scheduler = BudgetScheduler(64, 64, _bounds(), rate=20.0, burst=1.0)
+    steps = []
+
+    def run(agent_id):
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            if scheduler.acquire(agent_id, timeout=0.1):
+                steps.append(agent_id)
+                scheduler.release(agent_id, 0.0)
+
+    threads = [threading.Thread(target=run, args=(a,)) for a in _bounds()]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 1 token of burst + 20/s for 0.5 s, whatever the number of agents.
+    assert 8 <= len(steps) <= 13, len(steps)
+    assert set(steps) == {0, 1, 2}
+
+
+def test_priority_follows_change_shortfall_and_staleness():
+    scheduler = BudgetScheduler(64, 64, _bounds(), rate=1000.0, staleness_weight=0.0)
+    now = time.monotonic()
+    for agent_id in _bounds():
+        assert scheduler.acquire(agent_id, timeout=1.0)
+        scheduler.release(agent_id, 0.01, diff=4.0)
+    assert scheduler.priority(0) == scheduler.priority(1) == 0.0
+
+    # Merged changes inside agent 1's window raise its priority only.
+    ys, xs = np.mgrid[0:32, 32:64]
+    scheduler.observe_merge(xs.ravel(), ys.ravel(), np.full(xs.size, 10.0))
+    assert abs(scheduler.priority(1) - 10.0) < 1e-9
+    assert scheduler.priority(0) == 0.0
+
+    # A large last diff (far from convergence) raises agent 2's.
+    scheduler.release(2, 0.01, diff=30.0)
+    assert abs(scheduler.priority(2) - (30.0 - scheduler.tolerance)) < 1e-9
+
+    # Stepping resets the change seen by the agent.
+    assert scheduler.acquire(1, timeout=1.0)
+    assert scheduler.priority(1) == 0.0
+
+    scheduler.staleness_weight = 1.0
+    assert scheduler.priority(0, now=now + 100.0) > 90.0
+
+
+def test_highest_priority_waiter_goes_first():
+    scheduler = BudgetScheduler(64, 64, _bounds(), rate=5.0, burst=1.0, staleness_weight=0.0)
+    for agent_id in _bounds():
+        scheduler.release(agent_id, 0.0, diff=0.0)
+    scheduler.release(2, 0.0, diff=50.0)
+    assert scheduler.acquire(0, timeout=1.0)  # drains the bucket
+
+    order = []
+
+    def run(agent_id):
+        if scheduler.acquire(agent_id, timeout=2.0):
+            order.append(agent_id)
+            scheduler.release(agent_id, 0.0, diff=0.0)
+
+    threads = [threading.Thread(target=run, args=(a,)) for a in (1, 2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert order == [2, 1]
+
+
+def test_seconds_budget_charges_step_time():
+    scheduler = BudgetScheduler(64, 64, _bounds(), rate=1.0, unit="seconds", burst=0.1)
+    assert scheduler.acquire(0, timeout=0.1)
+    scheduler.release(0, 0.5)
+    # 0.4 s in debt: nothing may start for ~0.4 s.
+    assert not scheduler.acquire(1, timeout=0.2)
+    assert scheduler.acquire(1, timeout=1.0)
+
+    try:
+        BudgetScheduler(64, 64, _bounds(), rate=1.0, unit="watts")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown unit accepted")
+
+
+if __name__ == "__main__":
+    test_calls_budget_limits_rate()
+    test_priority_follows_change_shortfall_and_staleness()
+    test_highest_priority_waiter_goes_first()
+    test_seconds_budget_charges_step_time()
+    print("scheduler tests passed")
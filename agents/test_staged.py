@@ -0,0 +1,109 @@
+"""
+Tests for the pipelined stage executor in agents/staged.py.
+"""
+
+import threading
+import time
+
+from agents.agent_state import AgentState
+from agents.staged import STAGES, StagedExecutor
+
+
+class SlowStageAgent:
+    """Agent stand-in whose stages sleep and record what ran concurrently."""
+
+    def __init__(self, agent_id, log, in_flight):
+        self.state = AgentState(agent_id, 0.5, 0.5, 0.5, 0.5)
+        self.log = log
+        self.in_flight = in_flight
+
+    def prepare(self, fov, fov_origin, canvas_version):
+        assert self.in_flight.get(self.state.agent_id, 0) == 0, "one item per agent"
+        self.in_flight[self.state.agent_id] = 1
+        return {"fov": fov, "origin": fov_origin}
+
+    def _stage(self, name, work):
+        self.log.append((name, self.state.agent_id, "start", time.perf_counter()))
+        time.sleep(0.01)
+        self.log.append((name, self.state.agent_id, "end", time.perf_counter()))
+        return work
+
+    def classify_stage(self, work):
+        return self._stage("classify", work)
+
+    def diffuse_stage(self, work):
+        return self._stage("diffuse", work)
+
+    def evaluate_stage(self, work):
+        self._stage("evaluate", work)
+        self.in_flight[self.state.agent_id] = 0
+        return [(self.state.agent_id, work["origin"])]
+
+
+def _overlapping(log):
+    """True if two different stages were ever running at the same time."""
+    running = set()
+    for stage, agent_id, edge, _ in sorted(log, key=lambda e: e[3]):
+        if edge == "start":
+            if any(s != stage for s, _ in running):
+                return True
+            running.add((stage, agent_id))
+        else:
+            running.discard((stage, agent_id))
+    return False
+
+
+def test_staged_executor_pipelines_agents():
+    log, in_flight, emitted = [], {}, []
+    agents = [SlowStageAgent(i, log, in_flight) for i in range(3)]
+    lock = threading.Lock()
+
+    def emit(agent, proposals, seconds):
+        assert seconds > 0
+        with lock:
+            emitted.extend(proposals)
+
+    executor = StagedExecutor(
+        agents,
+        read_fov=lambda agent: ([[(0, 0, 0)]], (agent.state.agent_id, 0), 0),
+        emit=emit,
+        queue_size=1,
+    )
+    executor.start()
+    time.sleep(0.4)
+    executor.stop()
+
+    assert {agent_id for agent_id, _ in emitted} == {0, 1, 2}
+    assert _overlapping(log), "stages of different agents should overlap"
+    util = executor.utilization()
+    assert set(util) == set(STAGES)
+    assert all(0.0 < u <= 1.0 for u in util.values())
+    assert all(not t.is_alive() for t in executor.threads)
+    assert "diffuse" in executor.format_utilization()
+
+
+def test_staged_executor_survives_stage_errors():
+    class FailingAgent(SlowStageAgent):
+        def diffuse_stage(self, work):
+            self.in_flight[self.state.agent_id] = 0
+            raise RuntimeError("boom")
+
+    log, in_flight = [], {}
+    executor = StagedExecutor(
+        [FailingAgent(0, log, in_flight)],
+        read_fov=lambda agent: ([[(0, 0, 0)]], (0, 0), 0),
+        emit=lambda agent, proposals, seconds: None,
+    )
+    executor.start()
+    time.sleep(0.1)
+    executor.stop()
+
+    # The agent is released after each failure and fed again.
+    assert executor.stats["diffuse"].errors > 1
+    assert executor.stats["evaluate"].items == 0
+
+
+if __name__ == "__main__":
+    test_staged_executor_pipelines_agents()
+    test_staged_executor_survives_stage_errors()
+    print("staged executor tests passed")
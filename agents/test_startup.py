@@ -0,0 +1,84 @@
+"""
+Tests for lazy imports, parallel model preloading and the readiness barrier.
+Model loaders are replaced by sleeps, so no weights are needed.
+"""
+
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+from agents import startup
+from agents.pipeline import DiffusionPromptPipeline, PipelineConfig
+from agents.prompt_generator import PromptGenerator
+
+
+def test_agent_import_is_lazy():
+    code = (
+        "import sys, agents.agent, Synchronizer; "
+        "print(','.join(m for m in ('torch', 'transformers', 'diffusers') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "", f"heavy modules imported eagerly: {out.stdout.strip()}"
+
+
+def test_preload_loads_models_in_parallel():
+    pytest.importorskip("torch")
+
+    calls = []
+
+    def fake_vit(device="cpu", local_files_only=False):
+        calls.append(("vit", local_files_only, threading.current_thread().name))
+        time.sleep(0.2)
+
+    def fake_amused(self, local_files_only=None):
+        calls.append(("amused", local_files_only, threading.current_thread().name))
+        time.sleep(0.2)
+        return object()
+
+    def on_torch_import():
+        calls.append(("torch", "torch" in sys.modules, threading.current_thread().name))
+
+    original = PromptGenerator.__dict__["load"], DiffusionPromptPipeline._get_diffuser
+    PromptGenerator.load = staticmethod(fake_vit)
+    DiffusionPromptPipeline._get_diffuser = fake_amused
+    try:
+        report = startup.preload_models(PipelineConfig(), on_torch_import=on_torch_import)
+    finally:
+        PromptGenerator.load = original[0]
+        DiffusionPromptPipeline._get_diffuser = original[1]
+
+    assert calls[0][:2] == ("torch", True), "thread budget hook runs after the import, before loading"
+    calls = calls[1:]
+    assert {name for name, _, _ in calls} == {"vit", "amused"}
+    assert all(local is True for _, local, _ in calls), "local cache should be tried first"
+    assert len({thread for _, _, thread in calls}) == 2
+    assert report.phases["total"] < report.phases["vit"] + report.phases["amused"]
+    assert "amused=" in report.format()
+
+
+def test_run_waits_for_readiness():
+    from Canvas import Canvas
+    from Synchronizer import Synchronizer
+
+    sync = Synchronizer(Canvas(4, 4), 0)
+    started = threading.Event()
+    sync.threads = [threading.Thread(target=started.set, daemon=True)]
+    sync.frames_dir = tempfile.mkdtemp()
+    sync.ready.clear()
+    sync.start_run()
+    time.sleep(0.2)
+    assert not started.is_set(), "workers must not start before ready"
+    sync.ready.set()
+    assert started.wait(1.0)
+    sync.shutdown(timeout=2.0)
+
+
+if __name__ == "__main__":
+    test_agent_import_is_lazy()
+    test_preload_loads_models_in_parallel()
+    test_run_waits_for_readiness()
+    print("startup tests passed")
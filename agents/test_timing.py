@@ -0,0 +1,50 @@
+"""
+Tests for the per-stage latency histograms in agents/timing.py.
+"""
+
+from agents.timing import (
+    StageTimings,
+    format_prometheus,
+    merge_snapshots,
+    quantile,
+    summarize,
+)
+
+
+def test_stage_timings_observe_and_quantiles():
+    timings = StageTimings(owner="0")
+    for ms in range(1, 101):
+        timings.observe("classify", ms / 1000.0)
+    with timings.time("diff"):
+        pass
+
+    snap = timings.snapshot()
+    assert set(snap) == {"classify", "diff"}
+    assert snap["classify"]["count"] == 100
+    assert abs(snap["classify"]["total"] - 5.05) < 1e-9
+
+    p50 = quantile(snap["classify"], 0.5)
+    assert 0.025 <= p50 <= 0.05, f"p50 outside its bucket: {p50}"
+    assert quantile(snap["classify"], 1.0) <= snap["classify"]["max"]
+    assert summarize(snap["classify"])["max_ms"] == 100.0
+
+
+def test_merge_and_prometheus_format():
+    a, b = StageTimings("0"), StageTimings("1")
+    a.observe("diffuse", 0.2)
+    b.observe("diffuse", 0.4)
+
+    merged = merge_snapshots([a.snapshot()["diffuse"], b.snapshot()["diffuse"]])
+    assert merged["count"] == 2
+    assert merged["max"] == 0.4
+
+    text = format_prometheus({0: a.snapshot(), 1: b.snapshot()})
+    assert '# TYPE plaice_stage_seconds histogram' in text
+    assert 'plaice_stage_seconds_count{agent="1",stage="diffuse"} 1' in text
+    assert 'plaice_stage_seconds_bucket{agent="0",stage="diffuse",le="+Inf"} 1' in text
+
+
+if __name__ == "__main__":
+    test_stage_timings_observe_and_quantiles()
+    test_merge_and_prometheus_format()
+    print("✓ All tests passed!")
@@ -0,0 +1,92 @@
+"""
+Tests for the Chrome trace-event tracer in agents/tracing.py.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+from agents import tracing
+from agents.agent import Agent
+from agents.agent_state import AgentState
+from agents.timing import StageTimings
+from bench.fakes import FakeDiffuser, FakePromptGenerator
+
+
+def _agent():
+    return Agent(
+        AgentState(0, 0.5, 0.5, 0.5, 0.5),
+        prompt_generator=FakePromptGenerator(),
+        diffuser=FakeDiffuser(),
+    )
+
+
+def test_disabled_tracing_records_nothing():
+    tracing.disable()
+    timings = StageTimings("0")
+    with timings.time("classify", age=3):
+        pass
+    with tracing.span("merge_batch", age=3):
+        pass
+    lock = threading.Lock()
+    with tracing.traced_acquire(lock, "lock"):
+        assert lock.locked()
+    assert not lock.locked()
+    # Off: the lock itself, and lazy args are never built.
+    assert tracing.traced_acquire(lock, "lock", lambda: 1 / 0) is lock
+    assert tracing.get_tracer() is None
+    assert timings.snapshot()["classify"]["count"] == 1
+
+
+def test_agent_step_spans_and_trace_json():
+    tracer = tracing.enable()
+    try:
+        fov = [[(10 * x % 256, 20 * y % 256, 30) for x in range(32)] for y in range(32)]
+        _agent().step(fov, (0, 0), 7)
+        lock = threading.Lock()
+        with tracing.traced_acquire(lock, "diffuser._shared_lock"):
+            pass
+        with tracing.traced_acquire(lock, "proposal_cv.acquire", lambda: {"age": 5}):
+            assert lock.locked()
+        assert not lock.locked()
+    finally:
+        assert tracing.disable() is tracer
+
+    names = [event[0] for event in tracer.events]
+    for stage in ("fov_array", "classify", "diffuse", "diff", "proposals", "diffuser._shared_lock"):
+        assert stage in names, f"missing span {stage}: {names}"
+
+    path = os.path.join(tempfile.mkdtemp(prefix="plaice-trace-"), "trace.json")
+    tracer.write(path)
+    with open(path) as f:
+        trace = json.load(f)
+    spans = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+    meta = [e for e in trace["traceEvents"] if e["ph"] == "M"]
+    assert len(spans) == len(names)
+    assert any(e["name"] == "thread_name" and e["tid"] == threading.get_native_id() for e in meta)
+    classify = next(e for e in spans if e["name"] == "classify")
+    assert classify["args"] == {"age": 7, "owner": "0"}
+    assert classify["dur"] >= 0 and classify["ts"] >= 0
+    lock_span = next(e for e in spans if e["name"] == "diffuser._shared_lock")
+    assert lock_span["cat"] == "lock"
+    assert next(e for e in spans if e["name"] == "proposal_cv.acquire")["args"] == {"age": 5}
+    assert trace["otherData"]["dropped_events"] == 0
+
+
+def test_buffer_is_bounded():
+    tracer = tracing.Tracer(capacity=5)
+    for i in range(12):
+        tracer.complete(f"span{i}", 0.0, 0.001)
+    assert len(tracer.events) == 5
+    assert tracer.dropped == 7
+    # The newest events are the ones kept.
+    assert [e[0] for e in tracer.events] == [f"span{i}" for i in range(7, 12)]
+    assert tracer.to_dict()["otherData"]["dropped_events"] == 7
+
+
+if __name__ == "__main__":
+    test_disabled_tracing_records_nothing()
+    test_agent_step_spans_and_trace_json()
+    test_buffer_is_bounded()
+    print("tracing tests passed")
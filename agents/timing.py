@@ -0,0 +1,201 @@
+"""
+Per-stage latency histograms for Agent.step (and other hot loops).
+
+Each Agent owns a StageTimings and only its worker thread writes to it, so
+observations need no lock: a histogram is a fixed list of bucket counters
+updated in place. Readers (Synchronizer, reporters) take snapshots by
+copying; a snapshot taken mid-update can be off by one observation, which
+is fine for monitoring.
+"""
+
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable
+
+from agents import tracing
+
+# Stages recorded by Agent.step, in execution order.
+AGENT_STAGES = ("fov_array", "blend", "classify", "diffuse", "resize", "diff", "proposals")
+
+# Upper bounds (seconds) of the histogram buckets; the last bucket is +Inf.
+BUCKET_BOUNDS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf,
+)
+
+
+# thread ident -> stage currently being timed on that thread. Read by the
+# sampling profiler to attribute samples to stages; each thread only writes
+# its own key, and single dict item assignment is atomic.
+_active_stages: Dict[int, str] = {}
+
+
+def active_stage(thread_id: int):
+    """Stage currently running on `thread_id`, or None."""
+    return _active_stages.get(thread_id)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with a single writer."""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKET_BOUNDS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def snapshot(self) -> dict:
+        return {
+            "counts": list(self.counts),
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+        }
+
+
+def merge_snapshots(snapshots: Iterable[dict]) -> dict:
+    """Sum several histogram snapshots into one."""
+    merged = {"counts": [0] * len(BUCKET_BOUNDS), "count": 0, "total": 0.0, "max": 0.0}
+    for snap in snapshots:
+        merged["counts"] = [a + b for a, b in zip(merged["counts"], snap["counts"])]
+        merged["count"] += snap["count"]
+        merged["total"] += snap["total"]
+        merged["max"] = max(merged["max"], snap["max"])
+    return merged
+
+
+def quantile(snapshot: dict, q: float) -> float:
+    """Estimate the q-quantile (0..1) of a snapshot by interpolating inside
+    the bucket that contains it."""
+    count = snapshot["count"]
+    if count == 0:
+        return 0.0
+    rank = q * count
+    seen = 0
+    lower = 0.0
+    for bound, n in zip(BUCKET_BOUNDS, snapshot["counts"]):
+        if n and seen + n >= rank:
+            upper = min(bound, snapshot["max"])
+            frac = (rank - seen) / n
+            return lower + (max(upper, lower) - lower) * frac
+        seen += n
+        lower = bound if not math.isinf(bound) else lower
+    return snapshot["max"]
+
+
+def summarize(snapshot: dict) -> dict:
+    """Human-oriented summary of a snapshot, in milliseconds."""
+    count = snapshot["count"]
+    return {
+        "count": count,
+        "mean_ms": (snapshot["total"] / count * 1000.0) if count else 0.0,
+        "p50_ms": quantile(snapshot, 0.50) * 1000.0,
+        "p90_ms": quantile(snapshot, 0.90) * 1000.0,
+        "p99_ms": quantile(snapshot, 0.99) * 1000.0,
+        "max_ms": snapshot["max"] * 1000.0,
+        "total_s": snapshot["total"],
+    }
+
+
+class StageTimings:
+    """A set of per-stage histograms owned by one thread."""
+
+    def __init__(self, owner: str = ""):
+        self.owner = owner
+        self.histograms: Dict[str, LatencyHistogram] = {}
+
+    def observe(self, stage: str, seconds: float):
+        hist = self.histograms.get(stage)
+        if hist is None:
+            hist = self.histograms[stage] = LatencyHistogram()
+        hist.observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str, **trace_args):
+        """Time a stage; with tracing on, also record it as a span whose args
+        are `trace_args` (e.g. the canvas age) plus this owner."""
+        ident = threading.get_ident()
+        outer = _active_stages.get(ident)
+        _active_stages[ident] = stage
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.observe(stage, end - start)
+            tracer = tracing._tracer
+            if tracer is not None:
+                tracer.complete(stage, start, end, "stage", dict(trace_args, owner=self.owner))
+            if outer is None:
+                _active_stages.pop(ident, None)
+            else:
+                _active_stages[ident] = outer
+
+    def snapshot(self) -> Dict[str, dict]:
+        # list() guards against a stage being added while we iterate.
+        return {stage: hist.snapshot() for stage, hist in list(self.histograms.items())}
+
+
+def format_summary(stage_snapshots: Dict[str, dict], title: str = "stage timings") -> str:
+    """Render {stage: snapshot} as a fixed-width table, slowest stage first."""
+    lines = [f"[{title}]"]
+    grand_total = sum(s["total"] for s in stage_snapshots.values()) or 1.0
+    ordered = sorted(stage_snapshots.items(), key=lambda kv: kv[1]["total"], reverse=True)
+    for stage, snap in ordered:
+        s = summarize(snap)
+        lines.append(
+            f"  {stage:<12} n={s['count']:<7} share={100.0 * snap['total'] / grand_total:5.1f}% "
+            f"mean={s['mean_ms']:8.2f}ms p50={s['p50_ms']:8.2f}ms "
+            f"p90={s['p90_ms']:8.2f}ms p99={s['p99_ms']:8.2f}ms max={s['max_ms']:8.2f}ms"
+        )
+    return "\n".join(lines)
+
+
+def _format_le(bound: float) -> str:
+    return "+Inf" if math.isinf(bound) else repr(bound)
+
+
+def format_prometheus(
+    snapshots: Dict[str, Dict[str, dict]],
+    metric: str = "plaice_stage_seconds",
+    owner_label: str = "agent",
+) -> str:
+    """Render {owner: {stage: snapshot}} in the Prometheus text exposition
+    format (cumulative `le` buckets, `_sum` and `_count`)."""
+    lines = [
+        f"# HELP {metric} Wall-clock seconds spent per pipeline stage.",
+        f"# TYPE {metric} histogram",
+    ]
+    for owner, stages in sorted(snapshots.items(), key=lambda kv: str(kv[0])):
+        for stage, snap in sorted(stages.items()):
+            labels = f'{owner_label}="{owner}",stage="{stage}"'
+            cumulative = 0
+            for bound, n in zip(BUCKET_BOUNDS, snap["counts"]):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{{labels},le="{_format_le(bound)}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{labels}}} {snap['total']!r}")
+            lines.append(f"{metric}_count{{{labels}}} {snap['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: str, text: str):
+    """Atomically replace `path` with `text` (safe for textfile collectors
+    that may read while we write)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
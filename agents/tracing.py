@@ -0,0 +1,144 @@
+"""
+Opt-in timeline tracing in Chrome trace-event format.
+
+The histograms in agents/timing.py say how long stages take; a trace shows
+how they interleave: which agent thread was classifying while another held
+the diffuser lock, how long the merge loop sat in proposal_cv.wait, when
+exports ran. Open the output in https://ui.perfetto.dev or chrome://tracing.
+
+Tracing is off unless enable() is called. While off, every hook is a single
+global lookup. While on, a span costs two perf_counter() calls and one
+deque.append of a tuple; events are only converted to JSON in write(). The
+buffer is a bounded deque: once full, the oldest events are dropped (and
+counted) instead of growing memory or stalling the traced threads.
+
+Event args carry the canvas age where the caller knows it.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Optional
+
+DEFAULT_CAPACITY = 1_000_000
+
+_tracer: Optional["Tracer"] = None
+
+
+class Tracer:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        # (name, cat, tid, start, end, args); deque.append is thread-safe.
+        self.events = deque(maxlen=capacity)
+        self.dropped = 0
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.thread_names: Dict[int, str] = {}
+
+    def complete(self, name: str, start: float, end: float, cat: str = "", args: Optional[dict] = None):
+        """Record a finished span (perf_counter start/end seconds)."""
+        tid = threading.get_native_id()
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+        if len(self.events) == self.capacity:
+            self.dropped += 1
+        self.events.append((name, cat, tid, start, end, args))
+
+    @contextmanager
+    def span(self, name: str, cat: str = "", **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, start, time.perf_counter(), cat, args or None)
+
+    def to_dict(self) -> dict:
+        us = 1e6
+        trace = [
+            {"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0, "args": {"name": "PLAiCE"}}
+        ]
+        for tid, name in sorted(self.thread_names.items()):
+            trace.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}})
+        for name, cat, tid, start, end, args in list(self.events):
+            event = {
+                "name": name,
+                "cat": cat or "span",
+                "ph": "X",
+                "pid": self.pid,
+                "tid": tid,
+                "ts": round((start - self.origin) * us, 3),
+                "dur": round((end - start) * us, 3),
+            }
+            if args:
+                event["args"] = args
+            trace.append(event)
+        return {
+            "traceEvents": trace,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": self.dropped, "capacity": self.capacity},
+        }
+
+    def write(self, path: str) -> str:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+        return path
+
+
+def enable(capacity: int = DEFAULT_CAPACITY) -> Tracer:
+    """Start recording into a fresh global tracer."""
+    global _tracer
+    _tracer = Tracer(capacity)
+    return _tracer
+
+
+def disable() -> Optional[Tracer]:
+    """Stop recording; returns the tracer that was active (to write it)."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def span(name: str, cat: str = "", **args):
+    """Context manager recording a span when tracing is on (no-op otherwise)."""
+    tracer = _tracer
+    if tracer is None:
+        return nullcontext()
+    return tracer.span(name, cat, **args)
+
+
+def traced_acquire(lock, name: str, args_fn: Optional[Callable[[], dict]] = None, **args):
+    """`with lock:` that records the time spent waiting to acquire it.
+
+    While tracing is off this returns the lock itself. args_fn, if given, is
+    only called when tracing is on, for args that cost something to build
+    (e.g. reading the canvas age under its lock).
+    """
+    tracer = _tracer
+    if tracer is None:
+        return lock
+    if args_fn is not None:
+        args = args_fn()
+    return _traced_acquire(tracer, lock, name, args)
+
+
+@contextmanager
+def _traced_acquire(tracer: "Tracer", lock, name: str, args: dict):
+    start = time.perf_counter()
+    lock.acquire()
+    tracer.complete(name, start, time.perf_counter(), "lock", args or None)
+    try:
+        yield
+    finally:
+        lock.release()
@@ -0,0 +1,7 @@
+"""Headless benchmarks for PLAiCE.
+
+Everything in this package runs without model weights: the ViT classifier
+and aMUSEd diffuser are replaced by the deterministic fakes in
+`bench.fakes`, so results reflect the Canvas / Synchronizer / Agent
+machinery rather than model noise.
+"""
@@ -0,0 +1,343 @@
+"""
+End-to-end benchmark of the agent loop with fake model backends.
+
+Drives Canvas + Synchronizer + Agent exactly as PLAiCE.py does, but with the
+deterministic fakes from `bench.fakes` (or a `--replay` archive recorded by
+`PLAiCE.py --record`), across a grid of canvas sizes and agent counts. Reports merges/sec, proposals/sec, per-stage latency
+percentiles and peak RSS, and writes everything to a JSON file so results
+can be compared between commits.
+
+Usage:
+    python -m bench.agent_loop --sizes 64 128 256 --agents 1 2 4 --duration 5
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+from Canvas import Canvas, resolution_stages
+from Synchronizer import Synchronizer
+from ThreadBudget import ThreadBudget
+from agents.timing import summarize
+from bench.fakes import FakeDiffuser, FakePromptGenerator
+
+PERCENTILES = (50, 90, 99)
+
+
+class StageRecorder:
+    """Collects raw per-stage durations from many threads.
+
+    list.append is atomic under the GIL, so no lock is needed on the hot path.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def record(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def summary(self) -> dict:
+        result = {}
+        for stage, values in sorted(self.samples.items()):
+            arr = np.asarray(values, dtype=np.float64) * 1000.0
+            entry = {"count": int(arr.size), "mean_ms": float(arr.mean())}
+            for p in PERCENTILES:
+                entry[f"p{p}_ms"] = float(np.percentile(arr, p))
+            entry["max_ms"] = float(arr.max())
+            result[stage] = entry
+        return result
+
+
+def _timed(fn, recorder: StageRecorder, stage: str):
+    def wrapper(*args, **kwargs):
+        with recorder.time(stage):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+class RssSampler:
+    """Tracks peak resident set size of this process during a scenario."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+        try:
+            import psutil
+
+            self._process = psutil.Process()
+        except Exception:
+            self._process = None
+
+    def _current(self) -> int:
+        if self._process is not None:
+            return self._process.memory_info().rss
+        # Fallback: lifetime peak from getrusage (KiB on Linux).
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self._current()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._current())
+
+
+def make_agent_factory(args, recorder: StageRecorder, counters: dict):
+    from agents.agent import Agent
+
+    archive = None
+    if args.replay:
+        from agents.replay import ReplayArchive, ReplayDiffuser, ReplayPromptGenerator
+
+        archive = ReplayArchive(args.replay)
+
+    def factory(state, model, pipeline_config=None):
+        if args.backend == "heuristic":
+            from agents.heuristic import HeuristicAgent
+
+            agent = HeuristicAgent(state, model, pipeline_config=pipeline_config)
+            step = agent.step
+
+            def counted_heuristic_step(fov, fov_origin, canvas_version):
+                with recorder.time("step"):
+                    proposals = step(fov, fov_origin, canvas_version)
+                counters["steps"] += 1
+                counters["proposals"] += len(proposals)
+                return proposals
+
+            agent.step = counted_heuristic_step
+            return agent
+        if archive is not None:
+            prompt_generator = ReplayPromptGenerator(archive)
+            diffuser = ReplayDiffuser(archive, pipeline_config, latency_scale=args.replay_latency)
+        else:
+            prompt_generator = FakePromptGenerator(latency=args.classify_latency, busy=args.busy)
+            diffuser = FakeDiffuser(pipeline_config, latency=args.diffuse_latency, busy=args.busy)
+        agent = Agent(
+            state,
+            model,
+            pipeline_config=pipeline_config,
+            prompt_generator=prompt_generator,
+            diffuser=diffuser,
+        )
+        step = agent.step
+
+        def counted_step(fov, fov_origin, canvas_version):
+            with recorder.time("step"):
+                proposals = step(fov, fov_origin, canvas_version)
+            counters["steps"] += 1
+            counters["proposals"] += len(proposals)
+            return proposals
+
+        def counted_evaluate(work):
+            # Staged mode never calls step(); count at the last stage instead.
+            proposals = evaluate(work)
+            counters["steps"] += 1
+            counters["proposals"] += len(proposals)
+            return proposals
+
+        if args.staged:
+            evaluate = agent.evaluate_stage
+            agent.evaluate_stage = counted_evaluate
+        else:
+            agent.step = counted_step
+        return agent
+
+    return factory
+
+
+def run_scenario(size: int, num_agents: int, args) -> dict:
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+
+    recorder = StageRecorder()
+    counters = {"steps": 0, "proposals": 0}
+
+    stages = resolution_stages(size, size, args.resolution_stages)
+    canvas = Canvas(*stages[0], seed=args.seed)
+    canvas.export = _timed(canvas.export, recorder, "export")
+    sync = Synchronizer(canvas, num_agents)
+    sync.max_age = args.max_age
+    sync.staged = args.staged
+    sync.adaptive_regions = args.adaptive_regions
+    sync.region_interval = args.region_interval
+    sync.budget_rate = args.budget
+    sync.budget_unit = args.budget_unit
+    sync.worker_sleep = args.worker_sleep
+    if len(stages) > 1:
+        sync.resolution_stages = stages
+        sync.stage_max_age = args.stage_max_age
+    if args.thread_budget:
+        sync.thread_budget = ThreadBudget.plan(
+            3 if args.staged else num_agents,
+            num_cores=args.cores,
+            intra_op=args.intra_op_threads,
+            pin=args.pin,
+        )
+        sync.thread_budget.apply()
+    if args.img2img:
+        sync.pipeline_options["diffusion_mode"] = "img2img"
+    sync.initialize_agents(agent_factory=make_agent_factory(args, recorder, counters))
+    for agent in sync.agents:
+        agent.state.top_x_proposals = args.top_x
+
+    with tempfile.TemporaryDirectory(prefix="plaice-bench-") as frames_dir:
+        sync.frames_dir = frames_dir
+        with RssSampler() as rss:
+            sync.start()
+            start_age = canvas.getAge()
+            start = time.perf_counter()
+            sync.start_run()
+            time.sleep(args.duration)
+            end_age = canvas.getAge()
+            elapsed = time.perf_counter() - start
+            utilization = sync.executor.utilization() if sync.executor is not None else None
+            changed = sync.metrics.counter("pixels_changed_total")
+            sync.shutdown(timeout=5.0)
+
+    merges = end_age - start_age
+    return {
+        "canvas_size": size,
+        "num_agents": num_agents,
+        "duration_s": elapsed,
+        "merges": merges,
+        "merges_per_s": merges / elapsed,
+        "steps": counters["steps"],
+        "steps_per_s": counters["steps"] / elapsed,
+        "proposals": counters["proposals"],
+        "proposals_per_s": counters["proposals"] / elapsed,
+        "pixels_changed": changed,
+        "pixels_changed_per_step": changed / max(1, counters["steps"]),
+        "peak_rss_mb": rss.peak / (1024 * 1024),
+        "stage_utilization": utilization,
+        # step/export from raw samples; Agent.step stages from its histograms.
+        "stages": {
+            **recorder.summary(),
+            **{stage: summarize(snap) for stage, snap in sync.stage_summary().items()},
+        },
+    }
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _print_scenario(result: dict):
+    print(
+        f"[bench] size={result['canvas_size']:>5} agents={result['num_agents']:>3} "
+        f"merges/s={result['merges_per_s']:8.2f} "
+        f"proposals/s={result['proposals_per_s']:10.1f} "
+        f"changed/step={result['pixels_changed_per_step']:8.1f} "
+        f"peak_rss={result['peak_rss_mb']:7.1f}MB"
+    )
+    for stage, s in result["stages"].items():
+        print(
+            f"          {stage:<10} n={s['count']:<6} p50={s['p50_ms']:8.2f}ms "
+            f"p90={s['p90_ms']:8.2f}ms p99={s['p99_ms']:8.2f}ms"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 128, 256])
+    parser.add_argument("--agents", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per scenario")
+    parser.add_argument("--classify-latency", type=float, default=0.005)
+    parser.add_argument("--diffuse-latency", type=float, default=0.02)
+    parser.add_argument("--busy", action="store_true", help="Burn CPU instead of sleeping for model latency")
+    parser.add_argument("--top-x", type=int, default=3000, help="Proposals per agent step")
+    parser.add_argument("--max-age", type=int, default=10**9)
+    parser.add_argument("--img2img", action="store_true", help="Run agents in img2img diffusion mode")
+    parser.add_argument("--backend", choices=("fake", "heuristic"), default="fake",
+                        help="Fake ViT/diffusion models, or the model-free heuristic agent")
+    parser.add_argument("--worker-sleep", type=float, default=0.01, help="Pause between agent steps")
+    parser.add_argument("--staged", action="store_true", help="Use the pipelined stage executor")
+    parser.add_argument("--adaptive-regions", action="store_true", help="Enable the region scheduler")
+    parser.add_argument("--region-interval", type=int, default=16)
+    parser.add_argument("--budget", type=float, default=0.0, help="Global step budget per second (0: free-running)")
+    parser.add_argument("--budget-unit", choices=("calls", "seconds"), default="calls")
+    parser.add_argument("--resolution-stages", type=int, default=1, help="Coarse-to-fine resolution stages")
+    parser.add_argument("--stage-max-age", type=int, default=16)
+    parser.add_argument("--replay", default=None, metavar="ARCHIVE",
+                        help="Serve model calls from a PLAiCE.py --record archive instead of the fakes")
+    parser.add_argument("--replay-latency", type=float, default=0.0,
+                        help="With --replay, sleep this multiple of each recorded diffusion time")
+    parser.add_argument("--thread-budget", action="store_true",
+                        help="Split cores between workers (see ThreadBudget.py)")
+    parser.add_argument("--cores", type=int, default=None)
+    parser.add_argument("--intra-op-threads", type=int, default=None)
+    parser.add_argument("--pin", choices=("threads", "process"), default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results/agent_loop.json")
+    args = parser.parse_args(argv)
+
+    scenarios = []
+    for size in args.sizes:
+        for num_agents in args.agents:
+            result = run_scenario(size, num_agents, args)
+            _print_scenario(result)
+            scenarios.append(result)
+
+    report = {
+        "benchmark": "agent_loop",
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "scenarios": scenarios,
+    }
+    out_dir = os.path.dirname(args.output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[bench] results written: {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Cost vs. quality of the diffusion profiles in `agents.pipeline`.
+
+Needs the real ViT + aMUSEd weights. For each profile, every FOV in a small
+fixed set is classified once and the resulting label is diffused `--repeats`
+times. Reported per profile:
+
+- sec_per_image:   wall time of DiffusionPromptPipeline.generate (after warmup)
+- label_fidelity:  fraction of generated images the ViT classifies back to
+                   the prompt label (does the image still "say" the prompt?)
+- proposal_delta:  mean RGB distance of the top-k proposals an agent would
+                   make from the image (how far a step moves the canvas)
+- sharpness:       mean gradient magnitude of the image at image_size
+
+Usage:
+    python -m bench.diffusion_profiles --device cpu --profiles draft balanced quality
+"""
+
+import argparse
+from dataclasses import asdict
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from agents.agent import Agent
+from agents.agent_state import AgentState
+from agents.pipeline import DIFFUSION_PROFILES, DiffusionPromptPipeline, PipelineConfig
+from agents.prompt_generator import PromptGenerator
+from bench.agent_loop import _git_commit
+
+
+def make_fovs(size: int, seed: int):
+    """Fixed FOVs: noise, a two-colour split and a smooth gradient."""
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    split = np.zeros((size, size, 3), dtype=np.uint8)
+    split[:, : size // 2] = (200, 40, 40)
+    split[:, size // 2:] = (30, 60, 200)
+    t = np.linspace(0, 255, size, dtype=np.float32)
+    gradient = np.stack(
+        [np.broadcast_to(t[None, :], (size, size)), np.broadcast_to(t[:, None], (size, size)),
+         np.full((size, size), 128.0)],
+        axis=2,
+    ).astype(np.uint8)
+    return {"noise": noise, "split": split, "gradient": gradient}
+
+
+def sharpness(arr: np.ndarray) -> float:
+    gray = arr.astype(np.float32).mean(axis=2)
+    gy, gx = np.gradient(gray)
+    return float(np.hypot(gx, gy).mean())
+
+
+def run_profile(name: str, fovs: dict, classifier: PromptGenerator, args) -> dict:
+    config = PipelineConfig(
+        image_size=args.image_size,
+        diffuser_device=args.device,
+        prompt_embedding_cache=args.embedding_cache,
+        profile=name,
+    )
+    pipeline = DiffusionPromptPipeline(config)
+    agent = Agent(
+        AgentState(
+            agent_id=0, temperature=0.0, bias_contrast=0.0, bias_smoothness=0.0, bias_edge=0.0,
+            slice_bounds=(0, 0, args.image_size, args.image_size), top_x_proposals=args.top_x,
+        ),
+        pipeline_config=config,
+        prompt_generator=classifier,
+        diffuser=pipeline,
+    )
+    # Warmup: model load, embedding cache fill, first-call allocations.
+    pipeline.generate(classifier.generate_prompt_from_image(Image.fromarray(fovs["split"])))
+
+    seconds, hits, deltas, sharp = [], 0, [], []
+    for fov in fovs.values():
+        label = classifier.generate_prompt_from_image(Image.fromarray(fov))
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            image = pipeline.generate(label)
+            seconds.append(time.perf_counter() - start)
+            gen = np.asarray(image.convert("RGB"))
+            hits += classifier.generate_prompt_from_image(image) == label
+            proposals = agent._diff_to_proposals(fov, gen, (0, 0), 0)
+            deltas.append(
+                float(np.mean([
+                    np.linalg.norm(np.subtract(p.rgb, fov[p.region_id[1], p.region_id[0]], dtype=np.float32))
+                    for p in proposals
+                ])) if proposals else 0.0
+            )
+            sharp.append(sharpness(gen))
+
+    n = len(seconds)
+    return {
+        "profile": name,
+        "settings": asdict(config.diffusion),
+        "images": n,
+        "sec_per_image": float(np.mean(seconds)),
+        "sec_per_image_p90": float(np.percentile(seconds, 90)),
+        "label_fidelity": hits / n,
+        "proposal_delta": float(np.mean(deltas)),
+        "sharpness": float(np.mean(sharp)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=list(DIFFUSION_PROFILES),
+                        choices=sorted(DIFFUSION_PROFILES))
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--image-size", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=3, help="Images per FOV and profile")
+    parser.add_argument("--top-x", type=int, default=256)
+    parser.add_argument("--embedding-cache", default="cache/prompt_embeds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results/diffusion_profiles.json")
+    args = parser.parse_args(argv)
+
+    classifier = PromptGenerator(device=args.device)
+    fovs = make_fovs(args.image_size, args.seed)
+    results = []
+    for name in args.profiles:
+        result = run_profile(name, fovs, classifier, args)
+        print(
+            f"[bench] {name:<9} {result['sec_per_image']:7.3f}s/image "
+            f"fidelity={result['label_fidelity']:.2f} "
+            f"delta={result['proposal_delta']:6.1f} sharpness={result['sharpness']:5.2f}"
+        )
+        results.append(result)
+
+    report = {
+        "benchmark": "diffusion_profiles",
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "profiles": results,
+    }
+    out_dir = os.path.dirname(args.output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[bench] results written: {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
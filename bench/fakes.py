@@ -0,0 +1,102 @@
+"""
+Deterministic stand-ins for the model backends used by `Agent`.
+
+Mirrors the fakes in agents/test_pipeline.py, with two additions:
+- a configurable latency per call, to emulate CPU/GPU model cost
+- outputs derived from the inputs (not random), so runs are repeatable
+"""
+
+import time
+import zlib
+from typing import Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+from agents.pipeline import PipelineConfig
+
+DEFAULT_LABELS = ("tabby cat", "seashore", "volcano", "daisy", "bagel", "lakeside")
+
+
+def _stable_hash(data: bytes) -> int:
+    # Python's hash() is salted per process; crc32 keeps runs comparable.
+    return zlib.crc32(data) & 0xFFFFFFFF
+
+
+def _simulate(latency: float, busy: bool):
+    """Spend `latency` seconds either sleeping (GIL released, like a GPU
+    kernel wait) or spinning in NumPy (CPU bound, like a CPU forward pass)."""
+    if latency <= 0:
+        return
+    if not busy:
+        time.sleep(latency)
+        return
+    deadline = time.perf_counter() + latency
+    a = np.ones((64, 64), dtype=np.float32)
+    while time.perf_counter() < deadline:
+        a = a @ a
+        a /= a.max()
+
+
+class FakePromptGenerator:
+    """Classifier stand-in: picks a label from a hash of the image bytes."""
+
+    def __init__(
+        self,
+        device: str = "cpu",
+        latency: float = 0.0,
+        busy: bool = False,
+        labels: Sequence[str] = DEFAULT_LABELS,
+    ):
+        self.device = device
+        self.latency = latency
+        self.busy = busy
+        self.labels = tuple(labels)
+        self.calls = 0
+
+    def generate_prompt_from_image(self, image: Image.Image) -> str:
+        self.calls += 1
+        _simulate(self.latency, self.busy)
+        # Hash a coarse thumbnail so small pixel changes keep the same label,
+        # like a real classifier would.
+        thumb = np.asarray(image.convert("RGB").resize((4, 4))) // 64
+        return self.labels[_stable_hash(thumb.tobytes()) % len(self.labels)]
+
+
+class FakeDiffuser:
+    """Diffuser stand-in: renders a smooth per-prompt gradient image."""
+
+    def __init__(
+        self,
+        config: Optional[PipelineConfig] = None,
+        latency: float = 0.0,
+        busy: bool = False,
+    ):
+        self.config = config or PipelineConfig()
+        self.latency = latency
+        self.busy = busy
+        self.calls = 0
+        self._cache = {}
+
+    def generate(self, prompt: str, init_image: Optional[Image.Image] = None) -> Image.Image:
+        self.calls += 1
+        _simulate(self.latency, self.busy)
+        image = self._cache.get(prompt)
+        if image is None:
+            image = self._render(prompt)
+            self._cache[prompt] = image
+        if init_image is not None:
+            # img2img: stay close to the input, like a partial re-masking.
+            init = init_image.convert("RGB").resize(image.size)
+            return Image.blend(init, image, alpha=self.config.img2img_strength)
+        return image.copy()
+
+    def _render(self, prompt: str) -> Image.Image:
+        size = self.config.image_size
+        rng = np.random.default_rng(_stable_hash(prompt.encode("utf-8")))
+        c0, c1, c2 = rng.integers(0, 256, size=(3, 3)).astype(np.float32)
+        t = np.linspace(0.0, 1.0, size, dtype=np.float32)
+        u = t[None, :, None]
+        v = t[:, None, None]
+        arr = c0 * (1 - u) * (1 - v) + c1 * u * (1 - v) + c2 * v
+        return Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8), mode="RGB")
@@ -0,0 +1,511 @@
+"""
+Microbenchmarks for hot functions, with stored baselines.
+
+Each case times one function on synthetic inputs of a given size (no model
+weights needed). Timing is timeit-style: the call count per repeat is
+calibrated so a repeat takes at least --min-time, and the best of --repeats
+is kept (the least noisy estimate of the function's own cost).
+
+Results are compared against a baseline file; a case slower than
+baseline * (1 + threshold) (--small-threshold for sub-millisecond cases)
+is timed again (--confirm times), and if it stays slow it is a
+regression and the process exits with status 1, so this can gate CI:
+
+    python -m bench.micro                      # compare against baselines
+    python -m bench.micro --update-baseline    # re-record baselines
+    python -m bench.micro --filter canvas --threshold 0.5
+
+Every case needs a stored baseline: a case that runs but has none fails
+the gate as "missing" (--allow-missing while adding a case). Cases needing
+torch (patchwise_similarity) are skipped when it is missing; record their
+baselines on a machine with torch.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "micro.json")
+DEFAULT_THRESHOLD = 0.25
+# A case over the threshold is timed again this many times (best time kept)
+# before it counts as a regression: one noisy run must not fail the gate.
+DEFAULT_CONFIRM = 3
+# Sub-millisecond cases swing more with cache and scheduler state; they get
+# this (wider) threshold.
+SMALL_CASE_SECONDS = 1e-3
+DEFAULT_SMALL_THRESHOLD = 0.5
+
+# name -> (sizes, setup(size) -> zero-arg callable)
+CASES: Dict[str, Tuple[Tuple[int, ...], Callable[[int], Callable[[], object]]]] = {}
+
+
+class Skip(Exception):
+    """Raised by a setup function when the case cannot run here."""
+
+
+def case(name: str, sizes: Tuple[int, ...]):
+    def register(setup):
+        CASES[name] = (sizes, setup)
+        return setup
+
+    return register
+
+
+# ---------------------------------------------------------------- cases
+
+
+def _canvas(size: int):
+    from Canvas import Canvas
+
+    return Canvas(size, size, seed=0)
+
+
+@case("canvas_read", (64, 256, 1024))
+def _canvas_read(size):
+    canvas = _canvas(size)
+    # An agent slice with 40% overlap on a 2x2 grid covers ~90% per axis.
+    span = max(1, int(size * 0.9))
+    return lambda: canvas.read(0, 0, span, span)
+
+
+@case("canvas_write", (64, 256, 1024))
+def _canvas_write(size):
+    canvas = _canvas(size)
+    rng = np.random.default_rng(0)
+    points = [(int(x), int(y)) for x, y in zip(*rng.integers(0, size, size=(2, 1000)))]
+
+    # Per-pixel writes (Canvas.write), as single proposals are applied.
+    def run():
+        for x, y in points:
+            canvas.write(x, y, (1, 2, 3))
+
+    return run
+
+
+@case("canvas_write_many", (64, 256, 1024))
+def _canvas_write_many(size):
+    canvas = _canvas(size)
+    rng = np.random.default_rng(0)
+    xs, ys = rng.integers(0, size, size=(2, 1000))
+    cols = [(1, 2, 3)] * 1000
+    # The merge loop's path: one write_many per batch into the back buffer.
+    return lambda: canvas.write_many(xs, ys, cols)
+
+
+@case("canvas_init", (256, 1024, 2048))
+def _canvas_init(size):
+    from Canvas import Canvas
+
+    return lambda: Canvas(size, size, seed=0)
+
+
+@case("canvas_export", (64, 256, 1024))
+def _canvas_export(size):
+    canvas = _canvas(size)
+    path = os.path.join(tempfile.mkdtemp(prefix="plaice-micro-"), "frame.png")
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            canvas.export(path)
+
+    return run
+
+
+def _mapped_canvas(size: int):
+    from Canvas import MappedCanvas
+
+    return MappedCanvas(size, size, seed=0)
+
+
+@case("mapped_canvas_read", (256, 1024, 4096))
+def _mapped_canvas_read(size):
+    canvas = _mapped_canvas(size)
+    # A fixed 256x256 agent FOV: cost should not grow with the canvas.
+    return lambda: canvas.read(size // 4, size // 4, 256, 256)
+
+
+@case("mapped_canvas_export", (256, 1024))
+def _mapped_canvas_export(size):
+    canvas = _mapped_canvas(size)
+    path = os.path.join(tempfile.mkdtemp(prefix="plaice-micro-"), "frame.png")
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            canvas.export(path)
+
+    return run
+
+
+@case("tile_export_dirty", (1024, 4096))
+def _tile_export_dirty(size):
+    """Incremental pyramid export after a merge touching one 64x64 block."""
+    from TilePyramid import TilePyramidExporter
+
+    canvas = _mapped_canvas(size)
+    exporter = TilePyramidExporter(tempfile.mkdtemp(prefix="plaice-micro-"))
+    exporter.export(canvas)
+    xs, ys = np.meshgrid(np.arange(64) + size // 2, np.arange(64) + size // 2)
+    xs, ys = xs.ravel(), ys.ravel()
+    cols = np.zeros((xs.size, 3), dtype=np.uint8)
+
+    def run():
+        np.add(cols, 1, out=cols)  # uint8, wraps
+        canvas.write_many(xs, ys, cols)
+        canvas.increment_age()
+        exporter.export(canvas)
+
+    return run
+
+
+@case("merge", (1000, 10000, 50000))
+def _merge(num_proposals):
+    """One batch through Synchronizer.run's accumulate + apply phases."""
+    from Synchronizer import Synchronizer
+    from agents.proposal import Proposal
+
+    size = 256
+    sync = Synchronizer(_canvas(size), 0)
+    rng = np.random.default_rng(0)
+    xy = rng.integers(0, size, size=(num_proposals, 2))
+    rgb = rng.integers(0, 256, size=(num_proposals, 3))
+    conf = rng.random(num_proposals)
+    batch = [
+        Proposal(
+            agent_id=i % 4,
+            region_id=(int(x), int(y)),
+            rgb=(int(r), int(g), int(b)),
+            confidence=float(c),
+            canvas_version=0,
+        )
+        for i, ((x, y), (r, g, b), c) in enumerate(zip(xy, rgb, conf))
+    ]
+
+    def run():
+        sync._apply_merge(sync._accumulate_batch(batch))
+
+    return run
+
+
+@case("merge_dense", (4, 16, 64))
+def _merge_dense(num_steps):
+    """Dense ProposalBatches (one per heuristic step) through accumulate + apply."""
+    from Synchronizer import Synchronizer
+    from agents.proposal import ProposalBatch
+
+    size = 256
+    sync = Synchronizer(_canvas(size), 0)
+    rng = np.random.default_rng(0)
+    ys, xs = np.mgrid[0:128, 0:128]
+    batch = [
+        ProposalBatch(
+            agent_id=i % 4,
+            xs=(xs.ravel() + 64 * (i % 3)).astype(np.int64),
+            ys=(ys.ravel() + 64 * (i % 2)).astype(np.int64),
+            rgb=rng.integers(0, 256, size=(xs.size, 3), dtype=np.uint8),
+            confidence=rng.random(xs.size, dtype=np.float32),
+            canvas_version=0,
+        )
+        for i in range(num_steps)
+    ]
+
+    def run():
+        sync._apply_merge(sync._accumulate_batch(batch))
+
+    return run
+
+
+@case("heuristic_step", (32, 64, 128))
+def _heuristic_step(size):
+    from agents.agent_state import AgentState
+    from agents.heuristic import HeuristicAgent
+
+    agent = HeuristicAgent(AgentState(0, 0.5, 0.5, 0.5, 0.5), seed=0)
+    fov = np.random.default_rng(0).integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    return lambda: agent.step(fov, (0, 0), 0)
+
+
+@case("diff_to_proposals", (64, 128, 256))
+def _diff_to_proposals(size):
+    from agents.agent import Agent
+    from agents.agent_state import AgentState
+    from bench.fakes import FakeDiffuser, FakePromptGenerator
+
+    agent = Agent(
+        AgentState(0, 0.5, 0.5, 0.5, 0.5),
+        prompt_generator=FakePromptGenerator(),
+        diffuser=FakeDiffuser(),
+    )
+    rng = np.random.default_rng(0)
+    fov = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    gen = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    return lambda: agent._diff_to_proposals(fov, gen, (0, 0), 0)
+
+
+@case("generate_proposals", (224, 448, 896))
+def _generate_proposals(size):
+    from agents.evaluator.proposals import generate_proposals
+
+    rng = np.random.default_rng(0)
+    num_patches = (size // 16) ** 2
+    scores = rng.random(num_patches)
+    current = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    generated = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    return lambda: generate_proposals(scores, current, generated, top_x=num_patches // 2)
+
+
+@case("dense_proposals", (224, 448, 896))
+def _dense_proposals(size):
+    from agents.evaluator.proposals import dense_proposals
+
+    rng = np.random.default_rng(0)
+    num_patches = (size // 16) ** 2
+    scores = rng.random(num_patches)
+    current = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    generated = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    return lambda: dense_proposals(scores, current, generated, top_x=num_patches // 2)
+
+
+@case("patchwise_similarity", (196, 784))
+def _patchwise_similarity(num_patches):
+    try:
+        import torch
+        from agents.classifier.similarity import patchwise_similarity
+    except ImportError as exc:
+        raise Skip(f"torch unavailable ({exc})")
+
+    gen = torch.Generator().manual_seed(0)
+    a = torch.randn(num_patches, 768, generator=gen)
+    b = torch.randn(num_patches, 768, generator=gen)
+    return lambda: patchwise_similarity(a, b)
+
+
+@case("expand_to_pixel_map", (224, 448, 896))
+def _expand_to_pixel_map(size):
+    from agents.classifier.saliency import expand_to_pixel_map
+
+    rng = np.random.default_rng(0)
+    scores = rng.random((size // 16) ** 2).tolist()
+    return lambda: expand_to_pixel_map(scores, image_shape=(size, size, 3))
+
+
+# ---------------------------------------------------------------- timing
+
+
+def measure(fn: Callable[[], object], repeats: int = 5, min_time: float = 0.05) -> dict:
+    """Best/median seconds per call over `repeats` calibrated repeats."""
+    fn()  # warm caches and lazy imports
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= max(2, min(10, int(min_time / max(elapsed, 1e-9)) + 1))
+    per_call = [elapsed / number]
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - start) / number)
+    per_call.sort()
+    return {"seconds": per_call[0], "median": per_call[len(per_call) // 2], "number": number}
+
+
+def case_keys(name_filter: Optional[str]) -> List[str]:
+    """Keys ("name[size]") of every case matching name_filter."""
+    return [
+        f"{name}[{size}]"
+        for name, (sizes, _) in CASES.items()
+        if not name_filter or name_filter in name
+        for size in sizes
+    ]
+
+
+def run_cases(name_filter: Optional[str], repeats: int, min_time: float, keys=None) -> Dict[str, dict]:
+    """Time every case matching name_filter (or only the given case keys)."""
+    results = {}
+    for name, (sizes, setup) in CASES.items():
+        if name_filter and name_filter not in name:
+            continue
+        for size in sizes:
+            key = f"{name}[{size}]"
+            if keys is not None and key not in keys:
+                continue
+            try:
+                fn = setup(size)
+            except Skip as exc:
+                print(f"[micro] {key:<32} skipped: {exc}")
+                continue
+            results[key] = measure(fn, repeats=repeats, min_time=min_time)
+    return results
+
+
+def confirm_regressions(
+    results: Dict[str, dict],
+    baseline: Dict[str, dict],
+    threshold: float,
+    small_threshold: Optional[float],
+    confirm: int,
+    repeats: int,
+    min_time: float,
+) -> Dict[str, dict]:
+    """Re-time cases over the threshold up to `confirm` more times (with
+    twice the repeats), keeping each case's best time."""
+    for _ in range(confirm):
+        rows = compare(results, baseline, threshold, small_threshold)
+        suspects = {row["key"] for row in rows if row["status"] == "regression"}
+        if not suspects:
+            break
+        print(f"[micro] re-timing {len(suspects)} case(s) over the threshold")
+        for key, result in run_cases(None, repeats * 2, min_time, keys=suspects).items():
+            if result["seconds"] < results[key]["seconds"]:
+                results[key] = result
+    return results
+
+
+# ---------------------------------------------------------------- baselines
+
+
+def load_baseline(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"results": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(
+    results: Dict[str, dict],
+    baseline: Dict[str, dict],
+    threshold: float,
+    small_threshold: Optional[float] = None,
+) -> List[dict]:
+    """Rows of {key, seconds, baseline, ratio, status}; status is one of
+    ok / faster / regression / missing (no baseline). Cases whose baseline is under
+    SMALL_CASE_SECONDS use max(threshold, small_threshold)."""
+    rows = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            rows.append({"key": key, "seconds": result["seconds"], "baseline": None, "ratio": None, "status": "missing"})
+            continue
+        ratio = result["seconds"] / base["seconds"] if base["seconds"] > 0 else float("inf")
+        limit = threshold
+        if small_threshold is not None and base["seconds"] < SMALL_CASE_SECONDS:
+            limit = max(threshold, small_threshold)
+        if ratio > 1.0 + limit:
+            status = "regression"
+        elif ratio < 1.0 / (1.0 + limit):
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append({"key": key, "seconds": result["seconds"], "baseline": base["seconds"], "ratio": ratio, "status": status})
+    return rows
+
+
+def _format_seconds(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:9.1f}us"
+    if seconds < 1.0:
+        return f"{seconds * 1e3:9.2f}ms"
+    return f"{seconds:9.3f}s "
+
+
+def _machine() -> dict:
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filter", default=None, help="Only run cases whose name contains this")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown vs. baseline before failing (0.25 = 25%%)")
+    parser.add_argument("--small-threshold", type=float, default=DEFAULT_SMALL_THRESHOLD,
+                        help="Allowed slowdown for cases whose baseline is under 1 ms")
+    parser.add_argument("--confirm", type=int, default=DEFAULT_CONFIRM,
+                        help="Re-time cases over the threshold this many times before failing")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per repeat")
+    parser.add_argument("--allow-missing", action="store_true",
+                        help="Do not fail on cases without a stored baseline")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store these results as the new baseline instead of comparing")
+    parser.add_argument("--output", default="bench_results/micro.json")
+    args = parser.parse_args(argv)
+
+    results = run_cases(args.filter, args.repeats, args.min_time)
+    stored = load_baseline(args.baseline)
+    if stored.get("machine", {}).get("platform") not in (None, platform.platform()):
+        print(f"[micro] note: baseline recorded on {stored['machine']['platform']}")
+
+    if not args.update_baseline:
+        results = confirm_regressions(
+            results, stored.get("results", {}), args.threshold, args.small_threshold,
+            args.confirm, args.repeats, args.min_time,
+        )
+    rows = compare(results, stored.get("results", {}), args.threshold, args.small_threshold)
+    for row in rows:
+        ratio = f"{row['ratio']:6.2f}x" if row["ratio"] is not None else "      -"
+        print(
+            f"[micro] {row['key']:<32} {_format_seconds(row['seconds'])} "
+            f"baseline={_format_seconds(row['baseline'])} {ratio}  {row['status']}"
+        )
+
+    out_dir = os.path.dirname(args.output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"machine": _machine(), "threshold": args.threshold, "rows": rows, "results": results}, f, indent=2)
+
+    if args.update_baseline:
+        merged = dict(stored.get("results", {}))
+        merged.update({key: {"seconds": r["seconds"]} for key, r in results.items()})
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": _machine(), "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "results": dict(sorted(merged.items()))}, f, indent=2)
+        print(f"[micro] baseline updated: {args.baseline}")
+        return 0
+
+    baseline_keys = stored.get("results", {})
+    unmeasured = [key for key in case_keys(args.filter) if key not in results and key not in baseline_keys]
+    if unmeasured:
+        print(f"[micro] warning: skipped here and no baseline stored: {', '.join(unmeasured)}")
+
+    failed = False
+    missing = [row["key"] for row in rows if row["status"] == "missing"]
+    if missing and not args.allow_missing:
+        print(f"[micro] {len(missing)} case(s) without a baseline (record with --update-baseline): "
+              + ", ".join(missing))
+        failed = True
+    regressions = [row for row in rows if row["status"] == "regression"]
+    if regressions:
+        print(f"[micro] {len(regressions)} regression(s) over {args.threshold:.0%}: "
+              + ", ".join(row["key"] for row in regressions))
+        failed = True
+    if failed:
+        return 1
+    print("[micro] no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Sweep agent count x threads per worker x pinning on this machine.
+
+Each configuration runs `bench.agent_loop` with CPU-bound (`--busy`) fakes in
+a fresh subprocess, because BLAS/OpenMP thread counts are fixed when those
+libraries load. The subprocess gets the ThreadBudget env vars and applies
+the same budget in-process, exactly like PLAiCE.py. Reports steps/sec and
+proposals/sec per configuration and the best one for the core count.
+
+Usage:
+    python -m bench.thread_sweep --agents 1 2 4 8 --threads 1 2 4 --duration 5
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from ThreadBudget import ThreadBudget, available_cores
+from bench.agent_loop import _git_commit
+
+
+def run_config(num_agents, intra_op, pin, args) -> dict:
+    budget = ThreadBudget.plan(num_agents, num_cores=args.cores, intra_op=intra_op, pin=pin)
+    with tempfile.TemporaryDirectory(prefix="plaice-sweep-") as tmp:
+        output = os.path.join(tmp, "result.json")
+        cmd = [
+            sys.executable, "-m", "bench.agent_loop",
+            "--sizes", str(args.size),
+            "--agents", str(num_agents),
+            "--duration", str(args.duration),
+            "--classify-latency", str(args.classify_latency),
+            "--diffuse-latency", str(args.diffuse_latency),
+            "--busy",
+            "--thread-budget",
+            "--intra-op-threads", str(budget.intra_op),
+            "--output", output,
+        ]
+        if args.cores is not None:
+            cmd += ["--cores", str(args.cores)]
+        if pin:
+            cmd += ["--pin", pin]
+        env = dict(os.environ, **budget.environ())
+        subprocess.run(cmd, env=env, check=True, stdout=subprocess.DEVNULL)
+        with open(output) as f:
+            scenario = json.load(f)["scenarios"][0]
+    return {
+        "num_agents": num_agents,
+        "intra_op": budget.intra_op,
+        "pin": pin,
+        "steps_per_s": scenario["steps_per_s"],
+        "proposals_per_s": scenario["proposals_per_s"],
+        "merges_per_s": scenario["merges_per_s"],
+        "peak_rss_mb": scenario["peak_rss_mb"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--agents", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads", type=int, nargs="+", default=None,
+                        help="Threads per worker to try (default: 1 and cores // agents)")
+    parser.add_argument("--pin", nargs="+", default=["none", "threads"], choices=("none", "threads"))
+    parser.add_argument("--cores", type=int, default=None, help="Restrict to the first N available cores")
+    parser.add_argument("--size", type=int, default=128)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--classify-latency", type=float, default=0.005)
+    parser.add_argument("--diffuse-latency", type=float, default=0.02)
+    parser.add_argument("--output", default="bench_results/thread_sweep.json")
+    args = parser.parse_args(argv)
+
+    num_cores = args.cores or len(available_cores())
+    results = []
+    for num_agents in args.agents:
+        threads = args.threads or sorted({1, max(1, num_cores // num_agents)})
+        for intra_op in threads:
+            for pin in args.pin:
+                result = run_config(num_agents, intra_op, None if pin == "none" else pin, args)
+                print(
+                    f"[sweep] agents={num_agents:<3} threads/worker={intra_op:<3} pin={pin:<8} "
+                    f"steps/s={result['steps_per_s']:8.2f} proposals/s={result['proposals_per_s']:10.1f}"
+                )
+                results.append(result)
+
+    best = max(results, key=lambda r: r["steps_per_s"])
+    print(
+        f"[sweep] best on {num_cores} cores: agents={best['num_agents']} "
+        f"threads/worker={best['intra_op']} pin={best['pin'] or 'none'} "
+        f"({best['steps_per_s']:.2f} steps/s)"
+    )
+
+    report = {
+        "benchmark": "thread_sweep",
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": num_cores,
+        "args": vars(args),
+        "results": results,
+        "best": best,
+    }
+    out_dir = os.path.dirname(args.output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[sweep] results written: {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@
 
 This module provides a small slideshow player that displays all images
 found in a hard-coded folder (`assets/images` under the repo root) and
-plays them sequentially.
+plays them sequentially. Deep Zoom pyramids (`.dzi`, written by
+`PLAiCE.py --export tiles`) are shown at the largest level that fits the
+screen, decoding only that level's tiles.
 """
 from pathlib import Path
 from typing import Callable
@@ -77,6 +79,22 @@ def _load_image(path: Path, max_w: int, max_h: int):
         return None
 
 
+def _load_dzi(path: Path, max_w: int, max_h: int):
+    """Load the largest level of a Deep Zoom pyramid that fits max_w x max_h.
+
+    Returns (PhotoImage, description) or None on failure.
+    """
+    try:
+        from PIL import ImageTk
+        from TilePyramid import load_level_image
+
+        im, level = load_level_image(str(path), max_w, max_h)
+        desc = f"{path.stem}: level {level} ({im.width}x{im.height})"
+        return (ImageTk.PhotoImage(im), desc)
+    except Exception:
+        return None
+
+
 def create_second_page(master: tk.Misc, on_back: Callable[[], None]) -> tk.Frame:
     """Create and return the second page frame with a simple slideshow.
 
@@ -153,12 +171,15 @@ def create_second_page(master: tk.Misc, on_back: Callable[[], None]) -> tk.Frame
     if IMAGE_DIR.exists() and IMAGE_DIR.is_dir():
         for fn in sorted(os.listdir(IMAGE_DIR)):
             p = IMAGE_DIR / fn
-            if p.is_file() and fn.lower().endswith((".png", ".jpg", ".jpeg", ".gif", ".bmp")):
+            if p.is_file() and fn.lower().endswith((".png", ".jpg", ".jpeg", ".gif", ".bmp", ".dzi")):
                 paths.append(p)
 
     images = []
     for p in paths:
-        res = _load_image(p, max_w, max_h)
+        if p.suffix.lower() == ".dzi":
+            res = _load_dzi(p, max_w, max_h)
+        else:
+            res = _load_image(p, max_w, max_h)
         if res is not None:
             images.append(res)  # (photo, description)
 
@@ -0,0 +1,228 @@
+"""Tests for the double-buffered Canvas, the memory-mapped backend and initializers."""
+import os
+import tempfile
+import threading
+
+import numpy as np
+from PIL import Image
+
+from Canvas import Canvas, MappedCanvas, resolution_stages
+
+
+def test_writes_are_invisible_until_published():
+    canvas = Canvas(8, 6)
+    before = canvas.snapshot()
+    original = before.pixels[2, 3].copy()
+
+    canvas.write(3, 2, (1, 2, 3))
+    canvas.write_many([0, 1], [0, 0], [(9, 9, 9), (8, 8, 8)])
+    assert np.array_equal(canvas.pixels[2, 3], original)
+    assert canvas.age == 0
+
+    canvas.increment_age()
+    after = canvas.snapshot()
+    assert after.age == 1
+    assert tuple(after.pixels[2, 3]) == (1, 2, 3)
+    assert tuple(after.pixels[0, 1]) == (8, 8, 8)
+    # The snapshot a reader already held is unchanged and read-only.
+    assert np.array_equal(before.pixels[2, 3], original)
+    assert not before.pixels.flags.writeable
+
+
+def test_read_is_clipped_view():
+    canvas = Canvas(10, 5)
+    region = canvas.read(-2, 3, 6, 10)
+    assert region.shape == (2, 4, 3)
+    assert np.array_equal(region, canvas.pixels[3:5, 0:4])
+    assert len(canvas.read(20, 0, 4, 4)) == 0
+
+
+def test_buffers_are_recycled_only_when_unreferenced():
+    canvas = Canvas(4, 4)
+    held = canvas.read(0, 0, 2, 2)  # view into the age-0 buffer
+    held_copy = held.copy()
+    for age in range(1, 6):
+        canvas.write(0, 0, (age, age, age))
+        canvas.increment_age()
+    assert np.array_equal(held, held_copy)
+
+    buffers = set()
+    for age in range(6, 12):
+        canvas.write(0, 0, (age, age, age))
+        canvas.increment_age()
+        buffers.add(id(canvas.pixels))
+    # Steady state alternates between a couple of recycled buffers.
+    assert len(buffers) <= 3
+
+
+def test_concurrent_readers_see_whole_merges():
+    canvas = Canvas(32, 32)
+    canvas.write_many(range(32), [0] * 32, [(0, 0, 0)] * 32)
+    canvas.increment_age()
+    torn = []
+    running = True
+
+    def reader():
+        while running:
+            snapshot = canvas.snapshot()
+            row = snapshot.read(0, 0, 32, 1)[0]
+            # Every merge paints the whole row with its age.
+            if not (row == row[0]).all():
+                torn.append(snapshot.age)
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for age in range(1, 300):
+        for x in range(32):
+            canvas.write(x, 0, (age % 256, 0, 0))
+        canvas.increment_age()
+    running = False
+    for thread in threads:
+        thread.join()
+    assert not torn, f"torn reads at ages {torn[:5]}"
+
+
+def test_age_assignment_and_load_array():
+    canvas = Canvas(3, 2)
+    canvas.age = 7
+    assert canvas.getAge() == 7
+    arr = np.arange(18, dtype=np.uint8).reshape(2, 3, 3)
+    canvas.load_array(arr, age=3)
+    assert canvas.age == 3
+    assert (canvas.width, canvas.height) == (3, 2)
+    assert np.array_equal(canvas.to_array(), arr)
+
+
+def test_mapped_canvas_reads_merges_and_exports():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "canvas.u8")
+    canvas = MappedCanvas(300, 200, path=path)
+    assert os.path.getsize(path) == 300 * 200 * 3
+    original = canvas.read(5, 7, 2, 1).copy()
+
+    canvas.write_many([5, 6], [7, 7], [(9, 9, 9), (8, 8, 8)])
+    region, age = canvas.read_versioned(5, 7, 2, 1)
+    assert np.array_equal(region, original) and age == 0
+    canvas.increment_age()
+    region, age = canvas.read_versioned(5, 7, 2, 1)
+    assert region.tolist() == [[[9, 9, 9], [8, 8, 8]]] and age == 1
+    assert canvas.read(290, 195, 50, 50).shape == (5, 10, 3)
+
+    png = os.path.join(directory, "out.png")
+    canvas.export(png)
+    assert np.array_equal(np.array(Image.open(png)), canvas.to_array())
+    canvas.close()
+
+    # Reopening the file without filling keeps the merged pixels.
+    reopened = MappedCanvas(300, 200, path=path, fill=False)
+    assert reopened.read(5, 7, 2, 1).tolist() == [[[9, 9, 9], [8, 8, 8]]]
+    reopened.close()
+
+    # A file of another size is refused, not truncated.
+    try:
+        MappedCanvas(200, 200, path=path, fill=False)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("mapped canvas of the wrong size opened")
+    assert os.path.getsize(path) == 300 * 200 * 3
+    assert MappedCanvas(300, 200, path=path, fill=False).read(5, 7, 2, 1).tolist() == [[[9, 9, 9], [8, 8, 8]]]
+
+
+def test_mapped_canvas_readers_see_whole_merges():
+    canvas = MappedCanvas(64, 8)
+    torn = []
+    running = True
+
+    def reader():
+        while running:
+            row, age = canvas.read_versioned(0, 0, 64, 1)
+            if not (row[0] == row[0][0]).all():
+                torn.append(age)
+
+    canvas.write_many(range(64), [0] * 64, [(0, 0, 0)] * 64)
+    canvas.increment_age()
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for age in range(1, 200):
+        for x in range(64):
+            canvas.write(x, 0, (age % 256, 1, 2))
+        canvas.increment_age()
+    running = False
+    for thread in threads:
+        thread.join()
+    assert not torn, f"torn reads at ages {torn[:5]}"
+    canvas.close()
+
+
+def test_seeded_initializers_are_reproducible_across_backends():
+    for init in ("noise", "value-noise", "gradient"):
+        a = Canvas(40, 300, init=init, seed=5).to_array()
+        b = Canvas(40, 300, init=init, seed=5).to_array()
+        mapped = MappedCanvas(40, 300, init=init, seed=5)
+        assert np.array_equal(a, b), init
+        assert np.array_equal(a, mapped.to_array()), init
+        mapped.close()
+    assert not np.array_equal(Canvas(16, 16, seed=1).to_array(), Canvas(16, 16, seed=2).to_array())
+
+    # Value noise and gradients are smooth: neighbours differ far less than noise.
+    for init in ("value-noise", "gradient"):
+        pixels = Canvas(64, 64, init=init, seed=0).to_array().astype(int)
+        assert np.abs(np.diff(pixels, axis=1)).mean() < 20, init
+
+
+def test_image_initializer():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "start.png")
+    Image.new("RGB", (10, 10), (12, 34, 56)).save(path)
+    canvas = Canvas(20, 8, init=f"image:{path}")
+    assert canvas.to_array().shape == (8, 20, 3)
+    assert (canvas.to_array() == (12, 34, 56)).all()
+    try:
+        Canvas(4, 4, init="plasma")
+    except ValueError as exc:
+        assert "plasma" in str(exc)
+    else:
+        raise AssertionError("unknown initializer accepted")
+
+
+def test_resize_and_resolution_stages():
+    assert resolution_stages(256, 200, 3) == [(64, 50), (128, 100), (256, 200)]
+    assert resolution_stages(40, 40, 4) == [(20, 20), (40, 40)], "never below min_side"
+    assert resolution_stages(40, 40, 1) == [(40, 40)]
+
+    canvas = Canvas(16, 8, init="gradient", seed=0)
+    canvas.write(0, 0, (1, 2, 3))
+    canvas.increment_age()
+    old = canvas.snapshot()
+    canvas.consume_dirty()
+    canvas.resize(32, 16)
+    assert (canvas.width, canvas.height, canvas.age) == (32, 16, 2), "published as a new age"
+    assert canvas.consume_dirty().all()
+    assert old.pixels.shape == (8, 16, 3), "readers keep the snapshot they hold"
+    # Smooth content survives upsampling.
+    assert np.abs(canvas.to_array()[::2, ::2].astype(int) - old.pixels.astype(int))[1:-1, 1:-1].mean() < 8
+
+    mapped = MappedCanvas(8, 8)
+    try:
+        mapped.resize(16, 16)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("mapped canvas resized")
+    mapped.close()
+
+
+def test_writes_mark_dirty_blocks():
+    for canvas in (Canvas(200, 130, seed=0), MappedCanvas(200, 130, seed=0)):
+        assert canvas.consume_dirty().shape == (3, 4)
+        canvas.write_many([0, 199, 70], [0, 129, 64], [(1, 2, 3)] * 3)
+        canvas.write(130, 10, (4, 5, 6))
+        expected = np.zeros((3, 4), dtype=bool)
+        expected[[0, 2, 1, 0], [0, 3, 1, 2]] = True
+        assert np.array_equal(canvas.consume_dirty(), expected)
+        assert not canvas.consume_dirty().any()
+        if isinstance(canvas, MappedCanvas):
+            canvas.close()
@@ -0,0 +1,150 @@
+"""Round-trip tests for run checkpoints."""
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+import Checkpoint
+from Canvas import Canvas, MappedCanvas
+from Synchronizer import Synchronizer
+from agents.agent_state import AgentState
+
+
+class StubAgent:
+    def __init__(self, state):
+        self.state = state
+
+
+PLAICE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "PLAiCE.py")
+
+
+def _make_sync(width=12, height=8, num_agents=2, canvas=None):
+    sync = Synchronizer(canvas if canvas is not None else Canvas(width, height), num_agents)
+    sync.agents = [
+        StubAgent(AgentState(i, 0.5, 0.1 * i, 0.2, 0.3)) for i in range(num_agents)
+    ]
+    return sync
+
+
+def test_checkpoint_round_trip():
+    directory = tempfile.mkdtemp()
+    sync = _make_sync()
+    sync.canvas.age = 42
+    sync.agents[1].state.last_guess = Image.new("RGB", (5, 4), (1, 2, 3))
+    sync.agents[1].state.slice_bounds = (0, 6, 0, 8)
+
+    random.seed(7)
+    np.random.seed(7)
+    state = Checkpoint.capture_state(sync)
+    expected_py, expected_np = random.random(), np.random.random()
+    path = Checkpoint.write_checkpoint(directory, state)
+    assert Checkpoint.latest_checkpoint(directory) == path
+
+    random.seed(0)
+    np.random.seed(0)
+    restored = _make_sync()
+    restored.restore_checkpoint(path)
+
+    assert restored.canvas.age == 42
+    assert np.array_equal(restored.canvas.to_array(), sync.canvas.to_array())
+    assert restored.agents[0].state.last_guess is None
+    assert restored.agents[1].state.last_guess.getpixel((0, 0)) == (1, 2, 3)
+    assert restored.agents[1].state.slice_bounds == (0, 6, 0, 8)
+    assert restored.agents[1].state.bias_contrast == 0.1
+    assert random.random() == expected_py
+    assert np.random.random() == expected_np
+
+
+def test_writer_keeps_latest_and_prunes():
+    directory = tempfile.mkdtemp()
+    sync = _make_sync()
+    writer = Checkpoint.CheckpointWriter(directory, keep=2)
+    for age in (1, 2, 3):
+        sync.canvas.age = age
+        writer.submit(Checkpoint.capture_state(sync))
+        writer.flush()
+    writer.close()
+
+    names = [os.path.basename(p) for p in Checkpoint.list_checkpoints(directory)]
+    assert names == ["ckpt_000002.npz", "ckpt_000003.npz"]
+    assert not [n for n in os.listdir(directory) if ".tmp." in n]
+
+
+def test_checkpoint_counter_is_described():
+    sync = _make_sync()
+    sync.checkpoint_dir = tempfile.mkdtemp()
+    sync.checkpoint()
+    sync._checkpoint_writer.close()
+    assert sync.metrics.counter("checkpoints_total") == 1
+    assert "# HELP plaice_checkpoints_total " in sync.metrics.format_prometheus()
+
+
+def test_mapped_canvas_is_flushed_not_copied():
+    directory = tempfile.mkdtemp()
+    canvas_file = os.path.join(directory, "canvas.u8")
+    sync = _make_sync(canvas=MappedCanvas(12, 8, path=canvas_file, seed=0))
+    sync.canvas.write(3, 2, (9, 8, 7))
+    sync.canvas.increment_age()
+    state = Checkpoint.capture_state(sync)
+    assert "canvas" not in state["arrays"]
+    assert state["meta"]["canvas_file"] == canvas_file
+    path = Checkpoint.write_checkpoint(directory, state)
+    expected = sync.canvas.to_array()
+    sync.canvas.close()
+
+    loaded = Checkpoint.load_checkpoint(path)
+    assert Checkpoint.canvas_size(loaded) == (12, 8)
+    restored = _make_sync(canvas=MappedCanvas(12, 8, path=canvas_file, fill=False))
+    restored.restore_checkpoint(path, state=loaded)
+    assert restored.canvas.age == 1
+    assert np.array_equal(restored.canvas.to_array(), expected)
+    restored.canvas.close()
+
+    try:
+        _make_sync().restore_checkpoint(path, state=loaded)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("mapped checkpoint restored into an in-memory canvas")
+
+
+def _run_plaice(cwd, *args):
+    result = subprocess.run(
+        [sys.executable, PLAICE, "--backend", "heuristic", "--worker-sleep", "0",
+         "--checkpoint-dir", "ck", "--checkpoint-interval", "30", *args],
+        cwd=cwd, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stdout[-2000:] + result.stderr[-2000:]
+    return result.stdout
+
+
+def test_plaice_resume_end_to_end():
+    for extra in ((), ("--canvas-file", "canvas.u8")):
+        cwd = tempfile.mkdtemp()
+        _run_plaice(cwd, "--canvas-size", "40x32", "--agents", "2", "--seed", "1", "--max-age", "4", *extra)
+        first = Checkpoint.load_checkpoint(Checkpoint.latest_checkpoint(os.path.join(cwd, "ck")))
+        assert first["meta"]["age"] >= 4
+        assert ("canvas_file" in first["meta"]) == bool(extra)
+
+        # Size and agent count come from the checkpoint, not the flags.
+        out = _run_plaice(cwd, "--resume", "--canvas-size", "8x8", "--agents", "1", "--max-age", "8")
+        assert f"at age {first['meta']['age']}" in out, out[-2000:]
+        second = Checkpoint.load_checkpoint(Checkpoint.latest_checkpoint(os.path.join(cwd, "ck")))
+        assert second["meta"]["age"] >= 8
+        assert second["meta"]["num_agents"] == 2
+        assert Checkpoint.canvas_size(second) == (40, 32)
+        with Image.open(os.path.join(cwd, "output.png")) as image:
+            assert image.size == (40, 32)
+
+
+if __name__ == "__main__":
+    test_checkpoint_round_trip()
+    test_writer_keeps_latest_and_prunes()
+    test_checkpoint_counter_is_described()
+    test_mapped_canvas_is_flushed_not_copied()
+    test_plaice_resume_end_to_end()
+    print("✓ All tests passed!")
@@ -0,0 +1,93 @@
+"""Tests for run-level metrics and the metrics HTTP endpoint."""
+import http.client
+import json
+import os
+import socket
+import tempfile
+import time
+
+from Metrics import Metrics, MetricsServer
+
+
+def _build_metrics():
+    metrics = Metrics()
+    metrics.describe("merges_total", "Merge batches applied.")
+    metrics.inc("merges_total")
+    metrics.inc("merges_total", 2)
+    metrics.inc("proposals_dropped_total", 5, reason="shutdown")
+    metrics.register_gauge("queue_depth", lambda: 7)
+    metrics.register_gauge("agent_step_rate", lambda: {0: 1.5, 1: 2.0}, label="agent")
+    return metrics
+
+
+def test_snapshot_and_prometheus_text():
+    metrics = _build_metrics()
+    snap = metrics.snapshot()
+    assert snap["counters"]["merges_total"] == 3.0
+    assert snap["counters"]["proposals_dropped_total"] == {"reason=shutdown": 5.0}
+    assert snap["gauges"]["queue_depth"] == 7.0
+    assert snap["gauges"]["agent_step_rate"] == {"agent=0": 1.5, "agent=1": 2.0}
+
+    text = metrics.format_prometheus()
+    assert "# TYPE plaice_merges_total counter" in text
+    assert "plaice_merges_total 3.0" in text
+    assert 'plaice_agent_step_rate{agent="1"} 2.0' in text
+
+
+def test_tcp_endpoint():
+    metrics = _build_metrics()
+    server = MetricsServer(metrics.format_prometheus, metrics.snapshot, port=0).start()
+    try:
+        host, port = server.server.server_address[:2]
+        conn = http.client.HTTPConnection(host, port, timeout=5)
+        conn.request("GET", "/metrics.json")
+        resp = conn.getresponse()
+        assert resp.status == 200
+        assert json.loads(resp.read())["counters"]["merges_total"] == 3.0
+        conn.request("GET", "/nope")
+        assert conn.getresponse().status == 404
+    finally:
+        server.stop()
+
+
+def test_unix_socket_endpoint():
+    metrics = _build_metrics()
+    path = os.path.join(tempfile.mkdtemp(), "metrics.sock")
+    server = MetricsServer(metrics.format_prometheus, metrics.snapshot, unix_socket=path).start()
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        sock.sendall(b"GET /metrics HTTP/1.0\r\n\r\n")
+        data = b""
+        while chunk := sock.recv(65536):
+            data += chunk
+        sock.close()
+        assert data.startswith(b"HTTP/1.0 200")
+        assert b"plaice_queue_depth 7.0" in data
+    finally:
+        server.stop()
+    assert not os.path.exists(path)
+
+
+def test_agent_step_rate_counts_wall_time():
+    from Canvas import Canvas
+    from Synchronizer import Synchronizer
+
+    sync = Synchronizer(Canvas(8, 8, seed=0), 1)
+    for _ in range(4):
+        sync._record_step(0, 1)  # near-instant steps ...
+        time.sleep(0.05)  # ... separated by sleeps
+    rate = sync.metrics.snapshot()["gauges"]["agent_step_rate"]["agent=0"]
+    assert 1.0 < rate <= 20.0, rate
+    assert sync.metrics.counter("agent_steps_total", agent=0) == 4
+    # An idle agent's rate decays.
+    time.sleep(0.3)
+    assert sync._agent_step_rates()[0] <= 1.0 / 0.3
+
+
+if __name__ == "__main__":
+    test_snapshot_and_prometheus_text()
+    test_tcp_endpoint()
+    test_unix_socket_endpoint()
+    test_agent_step_rate_counts_wall_time()
+    print("✓ All tests passed!")
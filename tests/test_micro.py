@@ -0,0 +1,60 @@
+"""Tests for the microbenchmark runner's timing and regression check."""
+import json
+import os
+import tempfile
+
+from bench.micro import CASES, case_keys, compare, confirm_regressions, main, measure
+
+
+def test_compare_flags_regressions_only_past_threshold():
+    results = {
+        "a[1]": {"seconds": 1.2},
+        "b[1]": {"seconds": 1.3},
+        "c[1]": {"seconds": 0.5},
+        "d[1]": {"seconds": 1.0},
+    }
+    baseline = {"a[1]": {"seconds": 1.0}, "b[1]": {"seconds": 1.0}, "c[1]": {"seconds": 1.0}}
+    status = {row["key"]: row["status"] for row in compare(results, baseline, threshold=0.25)}
+    assert status == {"a[1]": "ok", "b[1]": "regression", "c[1]": "faster", "d[1]": "missing"}
+
+
+def test_small_cases_get_the_wider_threshold():
+    results = {"tiny[1]": {"seconds": 1.4e-4}, "big[1]": {"seconds": 1.4}}
+    baseline = {"tiny[1]": {"seconds": 1e-4}, "big[1]": {"seconds": 1.0}}
+    status = {row["key"]: row["status"] for row in compare(results, baseline, 0.25, small_threshold=0.5)}
+    assert status == {"tiny[1]": "ok", "big[1]": "regression"}
+
+
+def test_confirm_retimes_only_suspects():
+    key = "expand_to_pixel_map[224]"
+    results = {key: {"seconds": 10.0}, "other[1]": {"seconds": 1.0}}
+    baseline = {key: {"seconds": 1.0}, "other[1]": {"seconds": 1.0}}
+    confirmed = confirm_regressions(results, baseline, 0.25, None, confirm=1, repeats=1, min_time=0.001)
+    assert confirmed[key]["seconds"] < 1.0, "a noisy first timing is replaced by the re-timed one"
+    assert confirmed["other[1]"] == {"seconds": 1.0}
+
+
+def test_measure_and_cases_run_without_weights():
+    timing = measure(lambda: sum(range(100)), repeats=3, min_time=0.001)
+    assert 0 < timing["seconds"] <= timing["median"]
+    assert timing["number"] >= 1
+
+    sizes, setup = CASES["expand_to_pixel_map"]
+    setup(sizes[0])()
+    sizes, setup = CASES["diff_to_proposals"]
+    assert len(setup(sizes[0])()) > 0
+
+
+def test_missing_baseline_fails_the_gate():
+    directory = tempfile.mkdtemp()
+    baseline = os.path.join(directory, "baseline.json")
+    output = os.path.join(directory, "out.json")
+    args = ["--filter", "expand_to_pixel_map", "--repeats", "1", "--min-time", "0.001",
+            "--confirm", "0", "--baseline", baseline, "--output", output]
+    assert main(args) == 1, "no baseline stored"
+    assert main(args + ["--allow-missing"]) == 0
+    assert main(args + ["--update-baseline"]) == 0
+    with open(baseline) as f:
+        assert sorted(json.load(f)["results"]) == sorted(case_keys("expand_to_pixel_map"))
+    # Generous threshold: only the missing-baseline check is under test.
+    assert main(args + ["--threshold", "100", "--small-threshold", "100"]) == 0
@@ -0,0 +1,74 @@
+"""Tests for the sampling profiler's stack folding and summary table."""
+import threading
+import time
+
+from Profiler import SamplingProfiler, thread_role
+from agents.timing import StageTimings
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def _busy(stop):
+    with StageTimings("3").time("classify"):
+        _spin(stop)
+
+
+def test_thread_role():
+    assert thread_role("agent-1") == "agent"
+    assert thread_role("agent-10") == "agent"
+    assert thread_role("stage-classify") == "stage"
+    assert thread_role("stage-feed") == "stage-feed"
+    assert thread_role("merge") == "merge"
+    # Unknown threads are not merged by their numeric suffix.
+    assert thread_role("worker-1") == "worker-1"
+    assert thread_role("worker-10") == "worker-10"
+    assert thread_role("agentx") == "agentx"
+
+
+def test_profiles_busy_thread():
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=_busy, args=(stop,), name="agent-3", daemon=True),
+        threading.Thread(target=_spin, args=(stop,), name="agent-10", daemon=True),
+    ]
+    for t in threads:
+        t.start()
+    profiler = SamplingProfiler(interval=0.002)
+    profiler.start()
+    deadline = time.perf_counter() + 5.0
+    while time.perf_counter() < deadline and not (
+        any(k.startswith("agent-3;[classify];") for k in profiler.stacks)
+        and any(k.startswith("agent-10;") for k in profiler.stacks)
+    ):
+        time.sleep(0.05)
+    profiler.stop()
+    stop.set()
+    for t in threads:
+        t.join(timeout=2.0)
+
+    assert profiler.samples > 0
+    lines = profiler.collapsed().splitlines()
+    staged = [line for line in lines if line.startswith("agent-3;[classify];")]
+    assert staged, lines
+    stack, count = staged[0].rsplit(" ", 1)
+    assert int(count) > 0
+    frames = stack.split(";")
+    assert "test_profiler.py:_busy" in frames
+    assert frames.index("test_profiler.py:_busy") < frames.index("test_profiler.py:_spin")
+    # agent-10 runs outside any stage: no [stage] frame.
+    assert any(line.startswith("agent-10;") and ";test_profiler.py:_spin" in line for line in lines)
+    assert not any(line.startswith("agent-10;[") for line in lines)
+
+    table = profiler.top_table()
+    assert "agent [classify]" in table
+    assert "agent-3 [classify]" not in table
+    assert "test_profiler.py:_spin" in table.split("top self:")[1]
+
+
+if __name__ == "__main__":
+    test_thread_role()
+    test_profiles_busy_thread()
+    print("✓ All tests passed!")
@@ -0,0 +1,47 @@
+"""Tests for CPU thread budgeting and agent-count autotuning."""
+import subprocess
+import sys
+
+from ThreadBudget import BLAS_ENV_VARS, ThreadBudget, autotune_agents
+
+
+def test_budget_splits_cores_between_workers():
+    budget = ThreadBudget(workers=4, cores=list(range(8)))
+    assert budget.intra_op == 2
+    assert budget.blas == 2
+    assert budget.environ() == {name: "2" for name in BLAS_ENV_VARS}
+    assert [budget.core_slice(i) for i in range(4)] == [[0, 1], [2, 3], [4, 5], [6, 7]]
+
+    # More workers than cores: one thread each, cores shared round-robin.
+    crowded = ThreadBudget(workers=6, cores=[0, 1, 2, 3])
+    assert crowded.intra_op == 1
+    assert crowded.core_slice(5) == [1]
+
+    try:
+        ThreadBudget(workers=1, pin="everything")
+        assert False, "unknown pin modes should be rejected"
+    except ValueError:
+        pass
+
+
+def test_apply_does_not_import_torch():
+    code = (
+        "import sys; from ThreadBudget import ThreadBudget; "
+        "ThreadBudget(workers=2).apply(); print('torch' in sys.modules)"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == "False"
+
+
+def test_autotune_prefers_fewest_agents_near_peak():
+    rates = {1: 10.0, 2: 19.0, 4: 20.0, 8: 12.0, 16: 5.0}
+    measured = []
+
+    def measure(n):
+        measured.append(n)
+        return rates[n]
+
+    best, seen = autotune_agents(measure, [16, 8, 4, 2, 1], tolerance=0.1)
+    assert best == 2
+    assert 16 not in measured, "should stop once throughput clearly drops"
+    assert seen == {n: rates[n] for n in measured}
@@ -0,0 +1,68 @@
+"""Tests for incremental Deep Zoom tile-pyramid export."""
+import os
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from Canvas import Canvas, MappedCanvas
+from TilePyramid import TilePyramidExporter, load_level_image, num_levels, read_dzi
+
+
+def _stitch(exporter, level, width, height):
+    ts = exporter.tile_size
+    rows = []
+    for row in range(-(-height // ts)):
+        cols = []
+        for col in range(-(-width // ts)):
+            with Image.open(exporter.tile_path(level, col, row)) as tile:
+                cols.append(np.asarray(tile.convert("RGB")))
+        rows.append(np.concatenate(cols, axis=1))
+    return np.concatenate(rows, axis=0)
+
+
+def test_full_then_incremental_export():
+    canvas = Canvas(300, 200)
+    exporter = TilePyramidExporter(tempfile.mkdtemp(), tile_size=64)
+    levels = num_levels(300, 200)
+    assert levels == 10
+
+    stats = exporter.export(canvas)
+    assert stats["full_res_tiles"] == 5 * 4
+    info = read_dzi(exporter.dzi_path)
+    assert (info["width"], info["height"], info["tile_size"]) == (300, 200, 64)
+    assert np.array_equal(_stitch(exporter, levels - 1, 300, 200), canvas.to_array())
+    assert os.path.exists(exporter.tile_path(0, 0, 0))
+
+    # Nothing changed: nothing is re-encoded.
+    canvas.increment_age()
+    assert exporter.export(canvas)["tiles_written"] == 0
+
+    # One pixel: one tile per level.
+    canvas.write(130, 70, (255, 0, 0))
+    canvas.increment_age()
+    stats = exporter.export(canvas)
+    assert stats["full_res_tiles"] == 1
+    assert stats["tiles_written"] == levels
+    assert np.array_equal(_stitch(exporter, levels - 1, 300, 200), canvas.to_array())
+
+    # Half resolution matches a 2x2 box filter of the canvas.
+    half = _stitch(exporter, levels - 2, 150, 100).astype(int)
+    expected = canvas.to_array().reshape(100, 2, 150, 2, 3).astype(int).mean(axis=(1, 3))
+    assert np.abs(half - expected).max() <= 1
+
+
+def test_load_level_image_picks_fitting_level():
+    canvas = MappedCanvas(512, 256)
+    directory = tempfile.mkdtemp()
+    exporter = TilePyramidExporter(directory, tile_size=128)
+    exporter.export(canvas)
+
+    image, level = load_level_image(exporter.dzi_path, 200, 200)
+    assert image.size == (128, 64)
+    assert level == num_levels(512, 256) - 3
+
+    image, level = load_level_image(exporter.dzi_path, 0, 0)
+    assert image.size == (512, 256)
+    assert np.array_equal(np.asarray(image), canvas.to_array())
+    canvas.close()